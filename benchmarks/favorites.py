@@ -0,0 +1,95 @@
+"""
+Seeds about 1M favorites and reports p50/p99 latency of the favorites endpoints.
+
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmarks/favorites.py
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmarks/favorites.py --without-indexes
+
+Run it once with --without-indexes and once without to compare before/after
+the favorite indexes. --without-indexes also drops the unique constraints on
+(user_id, target), since their indexes serve the same lookups.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from seed import seed
+from sqlalchemy import Column, ForeignKey, MetaData, Table, UniqueConstraint, insert, select, text
+from app import create_app
+from models import db, Favorite
+
+app = create_app()
+
+def drop_favorite_indexes():
+    """Takes the favorite table back to the schema it had before its indexes."""
+    table = Favorite.__table__
+    if db.engine.dialect.name == 'sqlite':
+        # SQLite cannot drop a constraint, so the rows move to a copy of the
+        # table that keeps only its columns and foreign keys
+        bare = Table(f'{table.name}_bare', MetaData(), *(
+            Column(column.name, column.type,
+                   *(ForeignKey(key.column, ondelete=key.ondelete) for key in column.foreign_keys),
+                   primary_key=column.primary_key, nullable=column.nullable)
+            for column in table.columns
+        ))
+        bare.create(db.session.connection())
+        db.session.execute(insert(bare).from_select(list(table.columns.keys()), select(table)))
+        db.session.execute(text(f'DROP TABLE {table.name}'))
+        db.session.execute(text(f'ALTER TABLE {bare.name} RENAME TO {table.name}'))
+    else:
+        for index in table.indexes:
+            db.session.execute(text(f'DROP INDEX IF EXISTS {index.name}'))
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                db.session.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT IF EXISTS {constraint.name}'))
+    db.session.commit()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[int(round(pct / 100 * (len(ordered) - 1)))]
+
+def measure(client, urls):
+    samples = []
+    for url in urls:
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    return {"p50_ms": round(percentile(samples, 50), 3), "p99_ms": round(percentile(samples, 99), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--favorites-per-user', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--without-indexes', action='store_true', help='drop the favorite indexes and unique constraints before measuring')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the data from a previous run')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if not args.skip_seed:
+            started = time.perf_counter()
+            seed(users=args.users, favorites_per_user=args.favorites_per_user)
+            print(f"seeded {args.users * args.favorites_per_user} favorites in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+        if args.without_indexes:
+            drop_favorite_indexes()
+
+    rng = random.Random(7)
+    user_ids = [rng.randint(1, args.users) for _ in range(args.requests)]
+    client = app.test_client()
+    client.get('/users/1/favorites')
+
+    print(json.dumps({
+        "indexes": not args.without_indexes,
+        "favorites": args.users * args.favorites_per_user,
+        "/users/<id>/favorites": measure(client, [f'/users/{user_id}/favorites' for user_id in user_ids]),
+        "/users/favorites": measure(client, [f'/users/favorites?user_id={user_id}' for user_id in user_ids])
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Compares favorites/sec of the batch endpoint (POST/DELETE
+/users/<id>/favorites:batch) against one request per favorite on the
+/favorite/<type>/<id> endpoints.
+
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmarks/favorites_batch.py --users 200 --batch 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from seed import seed
+from app import create_app
+
+app = create_app()
+
+PER_ITEM_URLS = {"people": "/favorite/people/{}", "planets": "/favorite/planet/{}", "vehicles": "/favorite/vehicles/{}"}
+KINDS = list(PER_ITEM_URLS)
+
+def items_for(batch):
+    return [{"type": KINDS[i % 3], "id": i // 3 + 1} for i in range(batch)]
+
+def per_item(client, user_ids, items, method):
+    for user_id in user_ids:
+        for item in items:
+            response = client.open(PER_ITEM_URLS[item["type"]].format(item["id"]), method=method, json={"user_id": user_id})
+            assert response.status_code in (200, 201), response.get_json()
+
+def batched(client, user_ids, items, method):
+    for user_id in user_ids:
+        response = client.open(f'/users/{user_id}/favorites:batch', method=method, json={"items": items})
+        assert response.status_code == 200, response.get_json()
+
+def rate(run, client, user_ids, items, method):
+    start = time.perf_counter()
+    run(client, user_ids, items, method)
+    return round(len(user_ids) * len(items) / (time.perf_counter() - start))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--batch', type=int, default=100, help='favorites per user and per batch request')
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(characters=args.batch, planets=args.batch, vehicles=args.batch, users=args.users * 2, favorites_per_user=0)
+
+    client = app.test_client()
+    items = items_for(args.batch)
+    first, second = list(range(1, args.users + 1)), list(range(args.users + 1, args.users * 2 + 1))
+    print(json.dumps({
+        "favorites": args.users * args.batch,
+        "add": {
+            "per_item_per_sec": rate(per_item, client, first, items, "POST"),
+            "batch_per_sec": rate(batched, client, second, items, "POST")
+        },
+        "remove": {
+            "per_item_per_sec": rate(per_item, client, first, items, "DELETE"),
+            "batch_per_sec": rate(batched, client, second, items, "DELETE")
+        }
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
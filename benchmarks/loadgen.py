@@ -0,0 +1,135 @@
+"""
+Concurrent HTTP/1.1 load generator shared by the benchmarks. Each client
+holds a keep-alive connection (reopened when the server closes it) and runs
+scenario steps back to back until the deadline. A scenario is a function
+of a random.Random that returns a list of (endpoint, method, path, body)
+steps, run in order, so a write can be paired with the request that undoes
+it.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+def server_command(kind, port, workers=1, threads=8, preload=False):
+    if kind == 'sync':
+        return [sys.executable, '-m', 'gunicorn', 'wsgi', '--chdir', SRC, '--workers', str(workers),
+                '--threads', str(threads), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning',
+                *(['--preload'] if preload else [])]
+    return [sys.executable, '-m', 'uvicorn', 'asgi:application', '--app-dir', SRC, '--workers', str(workers),
+            '--port', str(port), '--log-level', 'warning', '--no-access-log']
+
+def start_server(kind, port, env, workers=1, threads=8):
+    server = subprocess.Popen(server_command(kind, port, workers, threads), env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f'Server on port {port} did not start')
+
+def encode_request(method, path, body=None):
+    head = f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n'
+    payload = b''
+    if body is not None:
+        payload = json.dumps(body).encode('utf-8')
+        head += f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n'
+    return (head + '\r\n').encode('ascii') + payload
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length, chunked, close = 0, False, False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding' and value.strip().lower().endswith(b'chunked'):
+            chunked = True
+        elif name == b'connection' and value.strip().lower() == b'close':
+            close = True
+    body = await read_chunked(reader) if chunked else await reader.readexactly(length)
+    return status, body, close
+
+async def read_chunked(reader):
+    """The body of a streamed response, timed to its last chunk."""
+    chunks = []
+    while True:
+        size = int((await reader.readuntil(b'\r\n')).split(b';', 1)[0], 16)
+        if size == 0:
+            break
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+    # Trailers, if any, then the empty line that ends the message
+    while await reader.readuntil(b'\r\n') != b'\r\n':
+        pass
+    return b''.join(chunks)
+
+async def request(port, method, path, body=None):
+    """One request on its own connection, for scrapes between load runs."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(encode_request(method, path, body))
+        return (await read_response(reader))[:2]
+    finally:
+        writer.close()
+
+async def client(port, scenario, rng, deadline, samples):
+    reader = writer = None
+    try:
+        while time.monotonic() < deadline:
+            for endpoint, method, path, body in scenario(rng):
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                start = time.perf_counter()
+                writer.write(encode_request(method, path, body))
+                status, _, close = await read_response(reader)
+                samples.append((endpoint, status, time.perf_counter() - start))
+                if close:
+                    writer.close()
+                    reader = writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+async def run_load(port, scenario, concurrency, duration, seed=42):
+    """Returns ([(endpoint, status, seconds), ...], elapsed seconds)."""
+    rng = random.Random(seed)
+    samples = []
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(port, scenario, random.Random(rng.random()), deadline, samples)
+        for _ in range(concurrency)
+    ))
+    return samples, time.perf_counter() - start
+
+def percentile(ordered, pct):
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 2)
+
+def summarize(samples, elapsed):
+    latencies = sorted(seconds for _, _, seconds in samples)
+    if not latencies:
+        return {"requests": 0}
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "errors": sum(count for status, count in statuses.items() if status.startswith('5')),
+        "statuses": statuses,
+    }
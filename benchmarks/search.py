@@ -0,0 +1,85 @@
+"""
+Seeds about 100k catalog entities and reports p50/p99 latency of /search,
+through the whole Flask stack with the response cache off.
+
+    python benchmarks/search.py
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmarks/search.py --entities 100000
+
+Three kinds of query: an id-like prefix matching about one row per type, a
+type plus id ("planet 12345") whose first word matches a third of the
+catalog, and a broad word ("desert") matching a quarter of the planets,
+where every match has to be ranked before the first page is known.
+
+Median of three runs with 100k entities and 500 requests per kind, on
+SQLite 3.40 (FTS5) and on a local Postgres 16 (GIN):
+
+                SQLite            Postgres
+    kind        p50     p99       p50     p99
+    prefix      4.5 ms  7.0 ms    5.8 ms  8.6 ms
+    name        4.9 ms  7.2 ms    4.5 ms  6.5 ms
+    broad      17.9 ms 22.2 ms   20.6 ms 27.8 ms
+
+Selective queries, the ones the search box sends, stay under 10 ms at the
+p99 on both. Broad ones grow with the number of matches, since every match
+is ranked before the first page is known. On Postgres the prefix query took
+15 ms until search() turned off parallel workers for its transaction.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+# Every request reaches the database
+os.environ['CACHE_TTL'] = '0'
+
+from seed import seed
+from app import create_app
+
+app = create_app()
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[int(round(pct / 100 * (len(ordered) - 1)))]
+
+def measure(client, urls):
+    samples = []
+    for url in urls:
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, (url, response.status_code)
+    return {"p50_ms": round(percentile(samples, 50), 3), "p99_ms": round(percentile(samples, 99), 3)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entities', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the data from a previous run')
+    args = parser.parse_args()
+
+    per_type = args.entities // 3
+    with app.app_context():
+        if not args.skip_seed:
+            started = time.perf_counter()
+            seed(characters=per_type, planets=per_type, vehicles=per_type, users=1, favorites_per_user=1)
+            print(f"seeded {3 * per_type} entities in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    rng = random.Random(7)
+    # Five digit ids, so the prefix matches no longer id
+    ids = [rng.randint(10000, min(per_type, 99999)) for _ in range(args.requests)]
+    kinds = [rng.choice(['character', 'planet', 'vehicle']) for _ in range(args.requests)]
+    client = app.test_client()
+    client.get('/search?q=warmup')
+
+    print(json.dumps({
+        "entities": 3 * per_type,
+        "prefix": measure(client, [f'/search?q={entity_id}' for entity_id in ids]),
+        "name": measure(client, [f'/search?q={kind}+{entity_id}' for kind, entity_id in zip(kinds, ids)]),
+        "broad": measure(client, ['/search?q=desert'] * args.requests),
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
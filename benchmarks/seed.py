@@ -0,0 +1,102 @@
+"""
+Seeds a synthetic Star Wars catalog, users and favorites for the benchmark
+scripts in this folder. Seeding drops and recreates every table, so the
+benchmarks never use DATABASE_URL: point BENCHMARK_DATABASE_URL at a scratch
+database instead (defaults to sqlite:////tmp/benchmark.db). On Postgres the
+rows are streamed in with COPY.
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+os.environ['DATABASE_URL'] = os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:////tmp/benchmark.db')
+
+from itertools import chain
+from sqlalchemy import insert
+from loader import copy_rows, sync_id_sequence
+from models import db, parse_number, User, Character, Planet, Vehicle, Favorite
+
+BATCH_SIZE = 10000
+
+def copy_batches(model, rows):
+    # Rows of one model share their keys, except favorites with one target column each
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    table = model.__table__
+    names = [column.name for column in table.columns if column.name != 'id' or 'id' in first]
+    connection = db.session.connection()
+    copy_rows(connection, table, names, (tuple(row.get(name) for name in names) for row in chain([first], rows)))
+    sync_id_sequence(connection, table)
+    db.session.commit()
+
+def insert_batches(model, rows):
+    if db.session.connection().dialect.name == 'postgresql':
+        return copy_batches(model, rows)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            db.session.execute(insert(model), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(model), batch)
+    db.session.commit()
+
+def with_numbers(model, rows):
+    # Core inserts skip the model validators, fill the shadow columns here
+    for row in rows:
+        for name in model.NUMERIC_FIELDS:
+            row[f"{name}_num"] = parse_number(row.get(name))
+        yield row
+
+def seed(characters=1000, planets=1000, vehicles=1000, users=20000, favorites_per_user=50, seed_value=42):
+    rng = random.Random(seed_value)
+    db.drop_all()
+    db.create_all()
+
+    insert_batches(Character, with_numbers(Character, ({
+        "id": i,
+        "name": f"Character {i}",
+        "height": str(rng.randint(60, 250)),
+        "mass": rng.choice([str(rng.randint(20, 200)), "unknown"]),
+        "gender": rng.choice(["male", "female", "n/a"]),
+        "description": f"Character {i} " + "lorem ipsum " * 40
+    } for i in range(1, characters + 1))))
+    insert_batches(Planet, with_numbers(Planet, ({
+        "id": i,
+        "name": f"Planet {i}",
+        "population": str(rng.randint(0, 10 ** 9)),
+        "climate": rng.choice(["arid", "temperate", "frozen", "murky"]),
+        "terrain": rng.choice(["desert", "grasslands", "tundra", "swamp"]),
+        "description": f"Planet {i} " + "lorem ipsum " * 40
+    } for i in range(1, planets + 1))))
+    insert_batches(Vehicle, with_numbers(Vehicle, ({
+        "id": i,
+        "model": f"Vehicle {i}",
+        "vehicle_class": rng.choice(["wheeled", "repulsorcraft", "starfighter"]),
+        "manufacturer": rng.choice(["Corellia Mining Corporation", "Incom Corporation", "Kuat Drive Yards"]),
+        "cost_in_credits": str(rng.randint(1000, 10 ** 6))
+    } for i in range(1, vehicles + 1))))
+    insert_batches(User, ({
+        "id": i,
+        "username": f"user{i}",
+        "email": f"user{i}@example.com",
+        "password": "benchmark",
+        "is_active": True
+    } for i in range(1, users + 1)))
+
+    targets = [("character_id", characters), ("planet_id", planets), ("vehicle_id", vehicles)]
+
+    def favorites():
+        for user_id in range(1, users + 1):
+            picked = set()
+            while len(picked) < favorites_per_user:
+                column, count = rng.choice(targets)
+                picked.add((column, rng.randint(1, count)))
+            for column, target_id in picked:
+                yield {"user_id": user_id, column: target_id}
+
+    insert_batches(Favorite, favorites())
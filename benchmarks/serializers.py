@@ -0,0 +1,64 @@
+"""
+Compares rows/sec of the column-projection serializers against the
+Model.query + serialize() + jsonify path they replaced.
+
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmarks/serializers.py --rows 100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from seed import seed
+from flask import jsonify
+from app import create_app
+from models import db, Character, Planet, Vehicle
+from serializers import get_serializer
+
+app = create_app()
+
+def orm_path(model):
+    rows = model.query.order_by(model.id).all()
+    return jsonify(list(map(lambda x: x.serialize(), rows))).get_data()
+
+def serializer_path(model):
+    serializer = get_serializer(model)
+    rows = db.session.execute(serializer.select().order_by(model.id)).all()
+    encode_row = serializer.encode_row
+    return ('[%s]\n' % ','.join([encode_row(row) for row in rows])).encode('ascii')
+
+def rows_per_second(path, model, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        path(model)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(rows / best)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the data from a previous run')
+    args = parser.parse_args()
+
+    report = {}
+    with app.test_request_context():
+        if not args.skip_seed:
+            seed(characters=args.rows, planets=args.rows, vehicles=args.rows, users=1, favorites_per_user=1)
+        for model in (Character, Planet, Vehicle):
+            assert orm_path(model) == serializer_path(model), f'{model.__name__} output differs'
+            report[model.__tablename__] = {
+                "rows": args.rows,
+                "orm_rows_per_sec": rows_per_second(orm_path, model, args.rows, args.repeat),
+                "serializer_rows_per_sec": rows_per_second(serializer_path, model, args.rows, args.repeat)
+            }
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Startup cost of the app. In fresh interpreters it times `import app`,
+create_app() and the first request through the test client, and lists the
+slowest imports; then it starts gunicorn with and without --preload and
+times launch to the first answered request, and reports the workers'
+combined PSS once they are all serving:
+
+    DATABASE_URL=sqlite:////tmp/test.db python benchmarks/startup.py --repeat 5 --workers 4
+    ADMIN_ENABLED=0 python benchmarks/startup.py --output after.json
+
+Point DATABASE_URL at a migrated database; nothing is seeded. Each run is a
+new process, so only the OS page cache is warm. Times are the median of
+--repeat runs, with the slowest run next to it. PSS is read from
+/proc/<pid>/smaps_rollup and left out where that does not exist.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from loadgen import SRC, request, server_command
+
+# Runs in the child interpreter, from src/
+IMPORT_PROBE = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get(%r)
+answered = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (answered - created) * 1000,
+    "status": response.status_code,
+}))
+'''
+
+def probe_import(path):
+    output = subprocess.run([sys.executable, '-c', IMPORT_PROBE % path], cwd=SRC,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(count):
+    """The modules app imports directly, by cumulative import time."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=SRC,
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # One space after the bar and two of indent: imported by app itself
+        if len(name) - len(name.lstrip()) != 3:
+            continue
+        imports.append((int(cumulative), name.strip()))
+    return [{"module": name, "ms": round(micros / 1000, 1)} for micros, name in sorted(imports, reverse=True)[:count]]
+
+def worker_pss_mb(master):
+    children = f'/proc/{master.pid}/task/{master.pid}/children'
+    if not os.path.exists(children):
+        return None
+    with open(children) as pids:
+        workers = pids.read().split()
+    total = 0
+    for pid in workers:
+        with open(f'/proc/{pid}/smaps_rollup') as rollup:
+            total += sum(int(line.split()[1]) for line in rollup if line.startswith('Pss:'))
+    return round(total / 1024, 1)
+
+def probe_server(args, preload, env):
+    start = time.perf_counter()
+    server = subprocess.Popen(server_command('sync', args.port, args.workers, args.threads, preload), env=env)
+    try:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                status, _ = asyncio.run(request(args.port, 'GET', args.path))
+                break
+            except OSError:
+                time.sleep(0.01)
+        else:
+            raise RuntimeError(f'gunicorn on port {args.port} did not answer')
+        first_response = (time.perf_counter() - start) * 1000
+        # Every worker has to be up before the memory it takes means anything
+        time.sleep(args.settle)
+        return {"first_response_ms": first_response, "status": status, "workers_pss_mb": worker_pss_mb(server)}
+    finally:
+        server.terminate()
+        server.wait()
+
+def summarize(runs):
+    summary = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        if key == 'status' or values[0] is None:
+            summary[key] = values[-1]
+        elif key.endswith('_ms'):
+            summary[key] = {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+        else:
+            summary[key] = round(statistics.median(values), 1)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker')
+    parser.add_argument('--path', default='/people?limit=1', help='the first request')
+    parser.add_argument('--port', type=int, default=8820)
+    parser.add_argument('--settle', type=float, default=2, help='seconds for the workers to boot before PSS is read')
+    parser.add_argument('--imports', type=int, default=10, help='slowest imports to list')
+    parser.add_argument('--output', help='write the report here instead of stdout')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    report = {
+        "config": {name: value for name, value in vars(args).items() if name != 'output'},
+        "admin_enabled": env.get('ADMIN_ENABLED', '1'),
+        "in_process": summarize([probe_import(args.path) for _ in range(args.repeat)]),
+        "slowest_imports": slowest_imports(args.imports),
+        "gunicorn": {
+            mode: summarize([probe_server(args, preload, env) for _ in range(args.repeat)])
+            for mode, preload in (('fork_then_import', False), ('preload', True))
+        },
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as out:
+            out.write(output + '\n')
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
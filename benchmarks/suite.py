@@ -0,0 +1,258 @@
+"""
+Load test of every route in src/app.py. Seeds a dataset, starts the server,
+runs each scenario under concurrent load in turn and writes a JSON report
+with throughput, p50/p95/p99 latency, SQL queries per request (read from the
+server's /metrics) and the server's peak RSS:
+
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmarks/suite.py run --output after.json
+    python benchmarks/suite.py run --users 2000 --favorites-per-user 500 --duration 10 --output after.json
+    python benchmarks/suite.py compare before.json after.json --threshold 10
+
+compare flags a route as a regression when its throughput drops, or its
+p95/p99 rise, by more than --threshold percent, when it makes more queries
+per request, or when it starts failing. It exits with status 1 if anything
+regressed, so it can gate CI.
+
+The defaults seed 1M favorites (20000 users x 50). The response cache is off
+unless --cache is given. Writes run as add/remove pairs so the dataset stays
+the same size; a pair that races another client gets a 4xx, which is counted
+in "statuses" but not as an error.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from seed import seed
+from app import create_app
+from loadgen import request, run_load, start_server, summarize
+
+app = create_app()
+
+QUERIES = re.compile(r'^db_queries_per_request_(sum|count)\{endpoint="([^"]+)"\} (\S+)$', re.MULTILINE)
+FAVORITE_URLS = {
+    "person": ("people", "/favorite/people/{}", "characters"),
+    "planet": ("planets", "/favorite/planet/{}", "planets"),
+    "vehicle": ("vehicles", "/favorite/vehicles/{}", "vehicles"),
+}
+
+def scenarios(args):
+    """Scenario name -> steps(rng), together covering every route."""
+    sizes = {"characters": args.characters, "planets": args.planets, "vehicles": args.vehicles}
+    user = lambda rng: rng.randint(1, args.users)
+    get = lambda endpoint, path: [(endpoint, 'GET', path, None)]
+
+    def collection(endpoint, path, variants):
+        return lambda rng: get(endpoint, path + rng.choice(variants))
+
+    def single(endpoint, path, size):
+        # A few ids past the end, so the 404 path is measured too
+        return lambda rng: get(endpoint, f'{path}/{rng.randint(1, int(size * 1.02) + 1)}')
+
+    def favorite_pair(kind):
+        _, url, size = FAVORITE_URLS[kind]
+        def steps(rng):
+            user_id, target_id = user(rng), rng.randint(1, sizes[size])
+            return [
+                (f'add_favorite_{kind}', 'POST', url.format(target_id), {"user_id": user_id}),
+                (f'remove_favorite_{kind}', 'DELETE', url.format(target_id), {"user_id": user_id}),
+            ]
+        return steps
+
+    def batch_pair(rng):
+        user_id = user(rng)
+        items = []
+        for _ in range(args.batch):
+            kind = rng.choice(list(FAVORITE_URLS))
+            plural, _, size = FAVORITE_URLS[kind]
+            items.append({"type": plural, "id": rng.randint(1, sizes[size])})
+        path = f'/users/{user_id}/favorites:batch'
+        return [
+            ('add_favorites_batch', 'POST', path, {"items": items}),
+            ('remove_favorites_batch', 'DELETE', path, {"items": items}),
+        ]
+
+    return {
+        "sitemap": lambda rng: get('sitemap', '/'),
+        "internal_cache": lambda rng: get('get_cache_stats', '/internal/cache'),
+        "internal_pool": lambda rng: get('get_pool_stats', '/internal/pool'),
+        "internal_snapshot": lambda rng: get('get_snapshot_stats', '/internal/snapshot'),
+        "internal_slow_queries": lambda rng: get('get_slow_queries', '/internal/slow-queries'),
+        "metrics": lambda rng: get('get_metrics', '/metrics'),
+        "people": collection('get_all_people', '/people', [
+            '', '?limit=100', '?gender=female', '?name_prefix=character%201', '?sort=-height', '?fields=id,name',
+        ]),
+        # Streamed as chunked NDJSON, timed until the last row arrives
+        "people_stream": collection('get_all_people', '/people', ['?stream=1', '?stream=1&gender=female']),
+        "person": single('get_single_person', '/people', args.characters),
+        "planets": collection('get_all_planets', '/planets', [
+            '', '?limit=100', '?climate=arid&climate=murky', '?sort=population', '?min_population=1000000',
+        ]),
+        "planets_stream": collection('get_all_planets', '/planets', ['?stream=1', '?stream=1&sort=population']),
+        "planet": single('get_single_planet', '/planets', args.planets),
+        "vehicles": collection('get_all_vehicles', '/vehicles', [
+            '', '?limit=100', '?vehicle_class=wheeled', '?model_prefix=vehicle%202', '?sort=-cost_in_credits',
+        ]),
+        "vehicles_stream": collection('get_all_vehicles', '/vehicles', ['?stream=1', '?stream=1&vehicle_class=wheeled']),
+        "vehicle": single('get_single_vehicle', '/vehicles', args.vehicles),
+        "search": collection('search_catalog', '/search', [
+            '?q=character%2012', '?q=lorem&type=planets', '?q=kuat&fields=id,model', '?q=arid&limit=100',
+        ]),
+        "users": collection('get_all_users', '/users', ['', '?limit=100']),
+        "current_user_favorites": lambda rng: get('get_current_user_favorites', f'/users/favorites?user_id={user(rng)}'),
+        "user_favorites": lambda rng: get('get_single_user_favorites', f'/users/{user(rng)}/favorites'),
+        "favorite_person": favorite_pair('person'),
+        "favorite_planet": favorite_pair('planet'),
+        "favorite_vehicle": favorite_pair('vehicle'),
+        "favorites_batch": batch_pair,
+    }
+
+def query_counts(port):
+    _, body = asyncio.run(request(port, 'GET', '/metrics'))
+    counts = {}
+    for kind, endpoint, value in QUERIES.findall(body.decode('utf-8')):
+        counts.setdefault(endpoint, {"sum": 0.0, "count": 0.0})[kind] = float(value)
+    return counts
+
+def queries_per_request(before, after, endpoint):
+    old, new = before.get(endpoint, {"sum": 0, "count": 0}), after.get(endpoint, {"sum": 0, "count": 0})
+    count = new["count"] - old["count"]
+    return round((new["sum"] - old["sum"]) / count, 2) if count else None
+
+def check_coverage(names):
+    # A new route without a scenario should not go unnoticed
+    routed = {rule.endpoint for rule in app.url_map.iter_rules() if '.' not in rule.endpoint and rule.endpoint != 'static'}
+    covered = set()
+    for steps in names.values():
+        covered.update(endpoint for endpoint, _, _, _ in steps(random.Random(0)))
+    return sorted(routed - covered)
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def run(args):
+    if not args.skip_seed:
+        with app.app_context():
+            seed(characters=args.characters, planets=args.planets, vehicles=args.vehicles,
+                 users=args.users, favorites_per_user=args.favorites_per_user)
+
+    plan = scenarios(args)
+    if args.only:
+        plan = {name: steps for name, steps in plan.items() if name in args.only}
+    env = dict(os.environ, METRICS_DIR=tempfile.mkdtemp(prefix='benchmark-metrics-'))
+    if not args.cache:
+        env['CACHE_TTL'] = '0'
+
+    routes = {}
+    server = start_server(args.server, args.port, env, args.workers, args.threads)
+    try:
+        for name, steps in plan.items():
+            before = query_counts(args.port)
+            samples, elapsed = asyncio.run(run_load(args.port, steps, args.concurrency, args.duration, args.seed))
+            after = query_counts(args.port)
+            for endpoint in sorted({endpoint for endpoint, _, _ in samples}):
+                result = summarize([sample for sample in samples if sample[0] == endpoint], elapsed)
+                result["queries_per_request"] = queries_per_request(before, after, endpoint)
+                routes[endpoint] = result
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "config": {name: value for name, value in vars(args).items() if name not in ('command', 'output', 'func')},
+        "uncovered_routes": check_coverage(scenarios(args)),
+        "peak_rss_mb": peak_rss_mb(),
+        "routes": routes,
+    }
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
+
+def compare(args):
+    with open(args.before) as before_file, open(args.after) as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+
+    threshold = args.threshold
+    # metric -> is this change (in percent, or absolute for queries) a regression?
+    rules = {
+        "requests_per_sec": lambda pct, old, new: pct is not None and pct < -threshold,
+        "p95_ms": lambda pct, old, new: pct is not None and pct > threshold,
+        "p99_ms": lambda pct, old, new: pct is not None and pct > threshold,
+        "queries_per_request": lambda pct, old, new: old is not None and new is not None and new > old + 0.01,
+        "errors": lambda pct, old, new: (new or 0) > (old or 0),
+    }
+    routes, regressions = {}, []
+    for endpoint in sorted(set(before["routes"]) | set(after["routes"])):
+        old, new = before["routes"].get(endpoint, {}), after["routes"].get(endpoint, {})
+        routes[endpoint] = {}
+        for metric, regressed in rules.items():
+            pct = change(old.get(metric), new.get(metric))
+            flagged = regressed(pct, old.get(metric), new.get(metric))
+            routes[endpoint][metric] = {"before": old.get(metric), "after": new.get(metric), "change_pct": pct, "regression": flagged}
+            if flagged:
+                regressions.append(f'{endpoint} {metric}: {old.get(metric)} -> {new.get(metric)}')
+
+    rss = change(before.get("peak_rss_mb"), after.get("peak_rss_mb"))
+    if rss is not None and rss > threshold:
+        regressions.append(f'peak_rss_mb: {before["peak_rss_mb"]} -> {after["peak_rss_mb"]}')
+    return {
+        "threshold_pct": threshold,
+        "peak_rss_mb": {"before": before.get("peak_rss_mb"), "after": after.get("peak_rss_mb"), "change_pct": rss},
+        "regressions": regressions,
+        "routes": routes,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='seed, load every route and report')
+    run_parser.add_argument('--characters', type=int, default=1000)
+    run_parser.add_argument('--planets', type=int, default=1000)
+    run_parser.add_argument('--vehicles', type=int, default=1000)
+    run_parser.add_argument('--users', type=int, default=20000)
+    run_parser.add_argument('--favorites-per-user', type=int, default=50)
+    run_parser.add_argument('--batch', type=int, default=20, help='items per favorites:batch request')
+    run_parser.add_argument('--skip-seed', action='store_true', help='reuse the data already in the database')
+    run_parser.add_argument('--server', choices=['sync', 'async'], default='sync')
+    run_parser.add_argument('--workers', type=int, default=2)
+    run_parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker')
+    run_parser.add_argument('--concurrency', type=int, default=32)
+    run_parser.add_argument('--duration', type=float, default=5, help='seconds of load per scenario')
+    run_parser.add_argument('--only', nargs='*', help='scenario names to run')
+    run_parser.add_argument('--port', type=int, default=8810)
+    run_parser.add_argument('--cache', action='store_true', help='leave the response cache on')
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', help='write the report here instead of stdout')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two reports')
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=10, help='allowed change in percent')
+    compare_parser.add_argument('--output')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    report = json.dumps(args.func(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+    if args.command == 'compare' and json.loads(report)["regressions"]:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -90,9 +90,22 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # The full-text search objects (see src/search.py) are not part of the
+    # models, keep autogenerate from dropping them
+    def include_object(object, name, type_, reflected, compare_to):
+        if type_ == 'table' and reflected and compare_to is None and '_search' in name:
+            return False
+        if type_ == 'column' and name == 'search_vector':
+            return False
+        if type_ == 'index' and name.endswith('_search_vector'):
+            return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,38 @@
+"""unique favorite per user and target
+
+Revision ID: 8d5802aea1b4
+Revises: e59bb5f6fe65
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d5802aea1b4'
+down_revision = 'e59bb5f6fe65'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Drop duplicates left behind by the old check-then-insert handlers,
+    # keeping the oldest favorite of each pair
+    for column in ('character_id', 'planet_id', 'vehicle_id'):
+        op.execute(
+            f'DELETE FROM favorite WHERE {column} IS NOT NULL AND id NOT IN '
+            f'(SELECT MIN(id) FROM favorite WHERE {column} IS NOT NULL GROUP BY user_id, {column})'
+        )
+
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_favorite_user_character', ['user_id', 'character_id'])
+        batch_op.create_unique_constraint('uq_favorite_user_planet', ['user_id', 'planet_id'])
+        batch_op.create_unique_constraint('uq_favorite_user_vehicle', ['user_id', 'vehicle_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_favorite_user_vehicle', type_='unique')
+        batch_op.drop_constraint('uq_favorite_user_planet', type_='unique')
+        batch_op.drop_constraint('uq_favorite_user_character', type_='unique')
@@ -0,0 +1,101 @@
+"""full-text search indexes
+
+Revision ID: a7d2e4b9c16f
+Revises: f3a8c5d1e294
+Create Date: 2026-10-17 23:05:12.839201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d2e4b9c16f'
+down_revision = 'f3a8c5d1e294'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of search.SEARCH_FIELDS, migrations must not import the app
+SEARCH_FIELDS = {
+    'character': (('name', 'A'), ('description', 'B'), ('gender', 'C'), ('hair_color', 'C'),
+                  ('skin_color', 'C'), ('eye_color', 'C')),
+    'planet': (('name', 'A'), ('description', 'B'), ('climate', 'C'), ('terrain', 'C')),
+    'vehicle': (('model', 'A'), ('manufacturer', 'B'), ('vehicle_class', 'B')),
+}
+
+
+def postgres_upgrade(table, fields):
+    quoted = f'"{table}"'
+
+    def vector(row):
+        return ' || '.join(
+            f"setweight(to_tsvector('english', coalesce({row}{name}, '')), '{weight}')"
+            for name, weight in fields
+        )
+
+    columns = ', '.join(name for name, _ in fields)
+    op.execute(f'ALTER TABLE {quoted} ADD COLUMN search_vector tsvector')
+    op.execute(
+        f'CREATE OR REPLACE FUNCTION {table}_search_vector() RETURNS trigger AS $$ '
+        f'BEGIN NEW.search_vector := {vector("NEW.")}; RETURN NEW; END $$ LANGUAGE plpgsql'
+    )
+    op.execute(
+        f'CREATE TRIGGER {table}_search_vector BEFORE INSERT OR UPDATE OF {columns} ON {quoted} '
+        f'FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()'
+    )
+    op.execute(f'UPDATE {quoted} SET search_vector = {vector("")}')
+    op.execute(f'CREATE INDEX ix_{table}_search_vector ON {quoted} USING gin (search_vector)')
+
+
+def postgres_downgrade(table):
+    quoted = f'"{table}"'
+    op.execute(f'DROP INDEX IF EXISTS ix_{table}_search_vector')
+    op.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector ON {quoted}')
+    op.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector()')
+    op.execute(f'ALTER TABLE {quoted} DROP COLUMN search_vector')
+
+
+def sqlite_upgrade(table, fields):
+    search = f'{table}_search'
+    names = [name for name, _ in fields]
+    columns = ', '.join(names)
+    new = ', '.join(f'new.{name}' for name in names)
+    old = ', '.join(f'old.{name}' for name in names)
+    insert_new = f'INSERT INTO {search}(rowid, {columns}) VALUES (new.id, {new});'
+    delete_old = f"INSERT INTO {search}({search}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    op.execute(
+        f"CREATE VIRTUAL TABLE {search} USING fts5({columns}, "
+        f"content='{table}', content_rowid='id', tokenize='porter unicode61')"
+    )
+    op.execute(f'CREATE TRIGGER {search}_insert AFTER INSERT ON "{table}" BEGIN {insert_new} END')
+    op.execute(f'CREATE TRIGGER {search}_delete AFTER DELETE ON "{table}" BEGIN {delete_old} END')
+    op.execute(
+        f'CREATE TRIGGER {search}_update AFTER UPDATE OF {columns} ON "{table}" '
+        f'BEGIN {delete_old} {insert_new} END'
+    )
+    op.execute(f"INSERT INTO {search}({search}) VALUES ('rebuild')")
+
+
+def sqlite_downgrade(table):
+    search = f'{table}_search'
+    for trigger in ('insert', 'delete', 'update'):
+        op.execute(f'DROP TRIGGER IF EXISTS {search}_{trigger}')
+    op.execute(f'DROP TABLE IF EXISTS {search}')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, fields in SEARCH_FIELDS.items():
+        if dialect == 'postgresql':
+            postgres_upgrade(table, fields)
+        elif dialect == 'sqlite':
+            sqlite_upgrade(table, fields)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table in SEARCH_FIELDS:
+        if dialect == 'postgresql':
+            postgres_downgrade(table)
+        elif dialect == 'sqlite':
+            sqlite_downgrade(table)
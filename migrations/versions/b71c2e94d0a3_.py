@@ -0,0 +1,33 @@
+"""favorite indexes
+
+Revision ID: b71c2e94d0a3
+Revises: 8d5802aea1b4
+Create Date: 2026-10-17 10:03:27.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71c2e94d0a3'
+down_revision = '8d5802aea1b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.create_index('ix_favorite_user_id_id', ['user_id', 'id'], unique=False)
+        for column in ('character_id', 'planet_id', 'vehicle_id'):
+            batch_op.create_index(f'ix_favorite_{column}', [column], unique=False,
+                                  postgresql_where=sa.text(f'{column} IS NOT NULL'),
+                                  sqlite_where=sa.text(f'{column} IS NOT NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('favorite', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorite_vehicle_id')
+        batch_op.drop_index('ix_favorite_planet_id')
+        batch_op.drop_index('ix_favorite_character_id')
+        batch_op.drop_index('ix_favorite_user_id_id')
@@ -0,0 +1,50 @@
+"""catalog filter indexes
+
+Revision ID: c4e9a1f7b2d5
+Revises: b71c2e94d0a3
+Create Date: 2026-10-17 11:47:05.902316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e9a1f7b2d5'
+down_revision = 'b71c2e94d0a3'
+branch_labels = None
+depends_on = None
+
+FILTER_INDEXES = [
+    ('ix_character_gender_id', 'character', 'gender'),
+    ('ix_planet_climate_id', 'planet', 'climate'),
+    ('ix_planet_terrain_id', 'planet', 'terrain'),
+    ('ix_vehicle_vehicle_class_id', 'vehicle', 'vehicle_class'),
+    ('ix_vehicle_manufacturer_id', 'vehicle', 'manufacturer'),
+]
+
+PREFIX_INDEXES = [
+    ('ix_character_name_lower', 'character', 'name'),
+    ('ix_planet_name_lower', 'planet', 'name'),
+    ('ix_vehicle_model_lower', 'vehicle', 'model'),
+]
+
+
+def upgrade():
+    for name, table, column in FILTER_INDEXES:
+        op.create_index(name, table, [column, 'id'], unique=False)
+
+    # Postgres needs text_pattern_ops to serve LIKE 'abc%' from the index under
+    # a non-C collation, SQLite gets a plain expression index instead and the
+    # prefix filter turns into a range on it
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    for name, table, column in PREFIX_INDEXES:
+        expression = f'lower({column}) text_pattern_ops' if postgres else f'lower({column})'
+        op.create_index(name, table, [sa.text(expression)], unique=False)
+
+
+def downgrade():
+    for name, table, column in reversed(PREFIX_INDEXES):
+        op.drop_index(name, table_name=table)
+    for name, table, column in reversed(FILTER_INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,99 @@
+"""numeric shadow columns
+
+Revision ID: d93f6b2a8e17
+Revises: c4e9a1f7b2d5
+Create Date: 2026-10-17 13:02:41.518734
+
+"""
+import math
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93f6b2a8e17'
+down_revision = 'c4e9a1f7b2d5'
+branch_labels = None
+depends_on = None
+
+NUMERIC_FIELDS = {
+    'character': ('height', 'mass'),
+    'planet': ('diameter', 'rotation_period', 'population'),
+    'vehicle': ('cost_in_credits', 'length', 'crew'),
+}
+
+# Frozen copy of c4e9a1f7b2d5.PREFIX_INDEXES, the lower() expression indexes
+# SQLite loses when batch mode copies a table
+PREFIX_INDEXES = {
+    'character': ('ix_character_name_lower', 'name'),
+    'planet': ('ix_planet_name_lower', 'name'),
+    'vehicle': ('ix_vehicle_model_lower', 'model'),
+}
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def parse_number(value):
+    # Frozen copy of models.parse_number, migrations must not import the app
+    if value is None:
+        return None
+    try:
+        number = float(str(value).replace(',', '').strip())
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
+
+
+def backfill(table, fields):
+    bind = op.get_bind()
+    source = sa.table(table, sa.column('id'), *(sa.column(name) for name in fields))
+    target = sa.table(table, sa.column('id'), *(sa.column(f'{name}_num') for name in fields))
+    update = target.update().where(target.c.id == sa.bindparam('row_id')).values(
+        {f'{name}_num': sa.bindparam(f'{name}_value') for name in fields}
+    )
+
+    # Walk the table by id so every batch is one indexed range read and one
+    # executemany, however big the table is
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(source).where(source.c.id > last_id).order_by(source.c.id).limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(update, [
+            {'row_id': row.id, **{f'{name}_value': parse_number(getattr(row, name)) for name in fields}}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    for table, fields in NUMERIC_FIELDS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in fields:
+                batch_op.add_column(sa.Column(f'{name}_num', sa.Float(), nullable=True))
+
+        backfill(table, fields)
+
+        for name in fields:
+            op.create_index(f'ix_{table}_{name}_num_id', table, [f'{name}_num', 'id'], unique=False)
+
+
+def downgrade():
+    # Dropping a column on SQLite rebuilds the table from its reflection, which
+    # skips expression indexes, so those are dropped first and built again after
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for table, fields in NUMERIC_FIELDS.items():
+        for name in fields:
+            op.drop_index(f'ix_{table}_{name}_num_id', table_name=table)
+        if sqlite:
+            index, column = PREFIX_INDEXES[table]
+            op.drop_index(index, table_name=table)
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for name in fields:
+                batch_op.drop_column(f'{name}_num')
+
+        if sqlite:
+            op.create_index(index, table, [sa.text(f'lower({column})')], unique=False)
@@ -46,7 +46,7 @@ def upgrade():
 
     with op.batch_alter_table('favorite', schema=None) as batch_op:
         batch_op.add_column(sa.Column('vehicle_id', sa.Integer(), nullable=True))
-        batch_op.create_foreign_key(None, 'vehicle', ['vehicle_id'], ['id'])
+        batch_op.create_foreign_key('favorite_vehicle_id_fkey', 'vehicle', ['vehicle_id'], ['id'])
 
     with op.batch_alter_table('planet', schema=None) as batch_op:
         batch_op.add_column(sa.Column('rotation_period', sa.String(length=120), nullable=True))
@@ -86,7 +86,7 @@ def downgrade():
         batch_op.drop_column('rotation_period')
 
     with op.batch_alter_table('favorite', schema=None) as batch_op:
-        batch_op.drop_constraint(None, type_='foreignkey')
+        batch_op.drop_constraint('favorite_vehicle_id_fkey', type_='foreignkey')
         batch_op.drop_column('vehicle_id')
 
     with op.batch_alter_table('character', schema=None) as batch_op:
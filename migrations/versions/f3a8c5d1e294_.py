@@ -0,0 +1,28 @@
+"""natural key indexes for the bulk loader
+
+Revision ID: f3a8c5d1e294
+Revises: d93f6b2a8e17
+Create Date: 2026-10-17 22:31:07.204815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c5d1e294'
+down_revision = 'd93f6b2a8e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_character_name', 'character', ['name'], unique=False)
+    op.create_index('ix_planet_name', 'planet', ['name'], unique=False)
+    op.create_index('ix_vehicle_model', 'vehicle', ['model'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_vehicle_model', table_name='vehicle')
+    op.drop_index('ix_planet_name', table_name='planet')
+    op.drop_index('ix_character_name', table_name='character')
@@ -1,9 +1,17 @@
 import os
-from flask_admin import Admin
 from models import db, User, Character, Planet, Favorite
-from flask_admin.contrib.sqla import ModelView
 
 def setup_admin(app):
+    # Imported here, so an app without the admin panel never loads Flask-Admin
+    from flask_admin import Admin
+    from flask_admin.contrib.sqla import ModelView
+
+    def catalog_view(model):
+        # The *_num columns are parsed from their text column, not edited
+        excluded = [f'{name}_num' for name in model.NUMERIC_FIELDS]
+        view = type(f'{model.__name__}View', (ModelView,), {"form_excluded_columns": excluded})
+        return view(model, db.session)
+
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
@@ -11,8 +19,8 @@ def setup_admin(app):
     
     # Add your models here, for example this is how we add a the User model to the admin
     admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(Character, db.session))
-    admin.add_view(ModelView(Planet, db.session))
+    admin.add_view(catalog_view(Character))
+    admin.add_view(catalog_view(Planet))
     admin.add_view(ModelView(Favorite, db.session))
 
     # You can duplicate that line to add mew models
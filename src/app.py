@@ -1,278 +1,494 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
+
+create_app() builds the app. wsgi.py and asgi.py call it, and so does
+`flask` with FLASK_APP=app.py. Everything it sets up survives a fork, so
+gunicorn can build the app once in the master and fork its workers from it:
+
+    gunicorn wsgi --preload --chdir ./src/
+
+    ADMIN_ENABLED=0    skip the Flask-Admin panel at /admin/, and its imports
+
+Flask-Migrate and alembic are only imported when a `flask db` command runs.
 """
 import os
-from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
+import click
+from flask import Flask, current_app, request, jsonify, url_for
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from utils import APIException, Int64Converter, generate_sitemap, json_response, parse_integer, wants_stream
 from admin import setup_admin
+from cache import bump_version, cached_response, invalidate_on_change, response_cache
+from compression import compress_response
+from loader import load_swapi_command
+from metrics import render as render_metrics, setup_metrics
+from pool import engine_options, env_flag, pool_stats, setup_engine
+from replicas import replica_router
+from search import search
+from slow_queries import setup_slow_queries, slow_query_report
+from snapshot import build_snapshot_command, catalog_snapshot, collection_from_snapshot, entity_from_snapshot, setup_snapshot
 from models import db, User, Character, Planet, Vehicle, Favorite
+from filters import apply_filters, get_sort
+from serializers import get_fields, get_serializer, serializer_from_args
+
+ADMIN_ENABLED = env_flag('ADMIN_ENABLED', True)
+
+# Handlers are collected here and added to every app create_app() builds,
+# with their function names as endpoints
+ROUTES = []
+
+def route(rule, **options):
+    def register(view):
+        ROUTES.append((rule, view, options))
+        return view
+    return register
+
+
+class MigrateGroup(click.Group):
+    """`flask db`, importing Flask-Migrate and alembic only once it is run."""
+
+    def __init__(self, app):
+        super().__init__('db', help='Perform database migrations.')
+        self.app = app
+
+    def migrate_group(self):
+        if 'migrate' not in self.app.extensions:
+            from flask_migrate import Migrate
+            # Puts Flask-Migrate's own group on app.cli in place of this one
+            Migrate(self.app, db)
+        return self.app.cli.commands['db']
+
+    def list_commands(self, ctx):
+        return self.migrate_group().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self.migrate_group().get_command(ctx, name)
+
+
+for catalog_model in (Character, Planet, Vehicle):
+    invalidate_on_change(catalog_model)
+invalidate_on_change(Favorite, lambda favorite: f'favorites:{favorite.user_id}')
+invalidate_on_change(User, lambda user: f'favorites:{user.id}')
+
+def create_app(pooled=True):
+    """
+    pooled=False leaves db.engine without a connection pool, for asgi.py,
+    whose requests run on the asyncio engine's pool; db.engine then only
+    serves work outside a request, such as snapshot rebuilds.
+    """
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    app.url_map.converters['int'] = Int64Converter
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], pooled)
+
+    db.init_app(app)
+    with app.app_context():
+        setup_engine(db.engine)
+        setup_slow_queries(db.engine)
+    replica_router.configure(os.getenv("DATABASE_REPLICA_URLS"))
+    for replica_engine in replica_router.engines:
+        setup_slow_queries(replica_engine)
+    CORS(app)
+    if ADMIN_ENABLED:
+        setup_admin(app)
+    # Registered first so its after_request runs last and sees the compressed body
+    setup_metrics(app)
+    app.after_request(compress_response)
+    app.register_error_handler(APIException, handle_invalid_usage)
+    for rule, view, options in ROUTES:
+        app.add_url_rule(rule, view_func=view, **options)
+    app.cli.add_command(MigrateGroup(app))
+    app.cli.add_command(load_swapi_command)
+    app.cli.add_command(build_snapshot_command)
+    setup_snapshot(app)
+    return app
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
-
-@app.errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
-@app.route('/')
+@route('/')
 def sitemap():
-    return generate_sitemap(app)
+    return generate_sitemap(current_app)
 
-@app.route('/people', methods=["GET"])
-def get_all_people():
-    response_body = Character.query.all()
-    response_body = list(map(lambda x: x.serialize(), response_body))
-    return jsonify(response_body), 200
+@route('/internal/cache', methods=["GET"])
+def get_cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+@route('/internal/pool', methods=["GET"])
+def get_pool_stats():
+    # Per worker: each gunicorn process has its own engine and pool
+    stats = pool_stats(db.engine)
+    stats["replicas"] = [dict(replica, **pool_stats(engine))
+                         for replica, engine in zip(replica_router.stats(), replica_router.engines)]
+    return jsonify(stats), 200
+
+@route('/internal/snapshot', methods=["GET"])
+def get_snapshot_stats():
+    return jsonify(catalog_snapshot.stats()), 200
+
+@route('/internal/slow-queries', methods=["GET"])
+def get_slow_queries():
+    return jsonify(slow_query_report()), 200
+
+@route('/metrics', methods=["GET"])
+def get_metrics():
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
-@app.route('/people/<int:people_id>', methods=["GET"])
+def collection_key(args):
+    return tuple(sorted(args.items(multi=True)))
+
+def favorites_response(user_id):
+    # Favorites carry the name of their target, so a catalog change
+    # invalidates them as well as a change to the user's own favorites
+    namespaces = [f'favorites:{user_id}', Character.__tablename__, Planet.__tablename__, Vehicle.__tablename__]
+
+    def build():
+        user = User.query.get(user_id)
+        if user is None:
+            raise APIException(f'User ID {user_id} not found.', status_code=404)
+
+        favorites = Favorite.query_for_user(user_id).all()
+        return list(map(lambda x: x.serialize(), favorites))
+
+    return cached_response(namespaces, user_id, build, shared_only=True)
+
+@route('/people', methods=["GET"])
+def get_all_people():
+    response = collection_from_snapshot(Character, request.args)
+    if response is not None:
+        return response
+    serializer = serializer_from_args(Character, request.args)
+    statement = apply_filters(Character, serializer.select(), request.args)
+    sort = get_sort(Character, request.args)
+    if wants_stream(request):
+        return serializer.stream(statement, sort)
+    return cached_response([Character.__tablename__], collection_key(request.args),
+                           lambda: serializer.page(request.args, statement, sort))
+
+@route('/people/<int:people_id>', methods=["GET"])
 def get_single_person(people_id):
-    single_person = Character.query.get(people_id)
-    if single_person is None:
-        raise APIException(f'Person ID {people_id} not found.', status_code=404)
-    return jsonify(single_person.serialize()), 200
+    response = entity_from_snapshot(Character, people_id, request.args, 'Person')
+    if response is not None:
+        return response
+    fields = get_fields(Character, request.args)
 
-@app.route('/planets', methods=["GET"])
-def get_all_planets():
-    response_body = Planet.query.all()
-    response_body = list(map(lambda x: x.serialize(), response_body))
-    return jsonify(response_body), 200
+    def build():
+        single_person = get_serializer(Character, fields).one(people_id)
+        if single_person is None:
+            raise APIException(f'Person ID {people_id} not found.', status_code=404)
+        return single_person
+
+    return cached_response([Character.__tablename__], (people_id, fields), build)
 
-@app.route('/planets/<int:planet_id>', methods=["GET"])
+@route('/planets', methods=["GET"])
+def get_all_planets():
+    response = collection_from_snapshot(Planet, request.args)
+    if response is not None:
+        return response
+    serializer = serializer_from_args(Planet, request.args)
+    statement = apply_filters(Planet, serializer.select(), request.args)
+    sort = get_sort(Planet, request.args)
+    if wants_stream(request):
+        return serializer.stream(statement, sort)
+    return cached_response([Planet.__tablename__], collection_key(request.args),
+                           lambda: serializer.page(request.args, statement, sort))
+
+@route('/planets/<int:planet_id>', methods=["GET"])
 def get_single_planet(planet_id):
-    single_planet = Planet.query.get(planet_id)
-    if single_planet is None:
-        raise APIException(f'Planet ID {planet_id} not found.', status_code=404)
-    return jsonify(single_planet.serialize()), 200
+    response = entity_from_snapshot(Planet, planet_id, request.args, 'Planet')
+    if response is not None:
+        return response
+    fields = get_fields(Planet, request.args)
 
-@app.route('/vehicles', methods=["GET"])
-def get_all_vehicles():
-    response_body = Vehicle.query.all()
-    response_body = list(map(lambda x: x.serialize(), response_body))
-    return jsonify(response_body), 200
+    def build():
+        single_planet = get_serializer(Planet, fields).one(planet_id)
+        if single_planet is None:
+            raise APIException(f'Planet ID {planet_id} not found.', status_code=404)
+        return single_planet
+
+    return cached_response([Planet.__tablename__], (planet_id, fields), build)
 
-@app.route('/vehicles/<int:vehicle_id>', methods=["GET"])
+@route('/vehicles', methods=["GET"])
+def get_all_vehicles():
+    response = collection_from_snapshot(Vehicle, request.args)
+    if response is not None:
+        return response
+    serializer = serializer_from_args(Vehicle, request.args)
+    statement = apply_filters(Vehicle, serializer.select(), request.args)
+    sort = get_sort(Vehicle, request.args)
+    if wants_stream(request):
+        return serializer.stream(statement, sort)
+    return cached_response([Vehicle.__tablename__], collection_key(request.args),
+                           lambda: serializer.page(request.args, statement, sort))
+
+@route('/vehicles/<int:vehicle_id>', methods=["GET"])
 def get_single_vehicle(vehicle_id):
-    single_vehicle = Vehicle.query.get(vehicle_id)
-    if single_vehicle is None:
-        raise APIException(f'Vehicle ID {vehicle_id} not found.', status_code=404)
-    return jsonify(single_vehicle.serialize()), 200
+    response = entity_from_snapshot(Vehicle, vehicle_id, request.args, 'Vehicle')
+    if response is not None:
+        return response
+    fields = get_fields(Vehicle, request.args)
 
-@app.route('/users', methods=["GET"])
+    def build():
+        single_vehicle = get_serializer(Vehicle, fields).one(vehicle_id)
+        if single_vehicle is None:
+            raise APIException(f'Vehicle ID {vehicle_id} not found.', status_code=404)
+        return single_vehicle
+
+    return cached_response([Vehicle.__tablename__], (vehicle_id, fields), build)
+
+@route('/search', methods=["GET"])
+def search_catalog():
+    namespaces = [Character.__tablename__, Planet.__tablename__, Vehicle.__tablename__]
+    return cached_response(namespaces, ('search', collection_key(request.args)), lambda: search(request.args))
+
+@route('/users', methods=["GET"])
 def get_all_users():
-    response_body = User.query.all()
-    response_body = list(map(lambda x: x.serialize(), response_body))
-    return jsonify(response_body), 200
+    response_body = get_serializer(User).page(request.args)
+    return json_response(response_body), 200
 
-@app.route('/users/favorites', methods=["GET"])
+@route('/users/favorites', methods=["GET"])
 def get_current_user_favorites():
     user_id = request.args.get('user_id')
     
     if not user_id:
         data = request.get_json(silent=True)
-        if data:
+        if isinstance(data, dict):
             user_id = data.get('user_id')
     
     if not user_id:
         raise APIException('user_id is required as query parameter (?user_id=1) or in request body.', status_code=400)
     
-    try:
-        user_id = int(user_id)
-    except ValueError:
+    user_id = parse_integer(user_id)
+    if user_id is None:
         raise APIException('user_id must be a valid integer.', status_code=400)
     
-    user = User.query.get(user_id)
-    if user is None:
-        raise APIException(f'User ID {user_id} not found.', status_code=404)
-    
-    favorites = Favorite.query.filter_by(user_id=user_id).all()
-    favorites_list = list(map(lambda x: x.serialize(), favorites))
-    
-    return jsonify(favorites_list), 200
+    return favorites_response(user_id)
 
-@app.route('/users/<int:user_id>/favorites', methods=["GET"])
+@route('/users/<int:user_id>/favorites', methods=["GET"])
 def get_single_user_favorites(user_id):
-    user = User.query.get(user_id)
-    if user is None:
-        raise APIException(f'User ID {user_id} not found.', status_code=404)
-    
-    favorites = Favorite.query.filter_by(user_id=user_id).all()
-    favorites_list = list(map(lambda x: x.serialize(), favorites))
-    return jsonify(favorites_list), 200
+    return favorites_response(user_id)
+
+def add_favorite(user_id, model, label, **target):
+    """
+    Inserts the favorite in a single statement and lets the database reject
+    duplicates and unknown ids. Only when the insert fails do we look up which
+    check failed, so the happy path never loads the user or the target row.
+    The response is built from the inserted row, with the target's name read
+    by a subquery in the same RETURNING clause.
+    """
+    (target_column, target_id), = target.items()
+    name = model.model if model is Vehicle else model.name
+    try:
+        favorite = db.session.execute(
+            insert(Favorite).values(user_id=user_id, **target).returning(
+                Favorite.id, select(name).where(model.id == target_id).scalar_subquery().label('name')
+            )
+        ).one()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        if db.session.get(User, user_id) is None:
+            raise APIException(f'User ID {user_id} not found.', status_code=404)
+        if db.session.get(model, target_id) is None:
+            raise APIException(f'{label} ID {target_id} not found.', status_code=404)
+        raise APIException(f'This {label.lower()} is already in favorites.', status_code=400)
+
+    bump_version(f'favorites:{user_id}')
+    # Same keys as Favorite.serialize()
+    return {
+        "id": favorite.id,
+        "user_id": user_id,
+        target_column: target_id,
+        f'{target_column.removesuffix("_id")}_{name.key}': favorite.name,
+    }
+
+def remove_favorite(user_id, **target):
+    deleted = db.session.execute(
+        delete(Favorite).filter_by(user_id=user_id, **target).returning(Favorite.id)
+    ).first()
+    db.session.commit()
+    if deleted is None:
+        return False
 
-@app.route('/favorite/people/<int:people_id>', methods=["POST"])
-def add_favorite_person(people_id):
-    data = request.get_json()
-    
-    if not data or "user_id" not in data:
-        raise APIException('user_id is required in request body.', status_code=400)
-    
-    user_id = data["user_id"]
+    bump_version(f'favorites:{user_id}')
+    return True
 
-    user = User.query.get(user_id)
-    if user is None:
-        raise APIException(f'User ID {user_id} not found.', status_code=404)
+def get_favorite_user_id(data):
+    if not isinstance(data, dict) or "user_id" not in data:
+        raise APIException('user_id is required in request body.', status_code=400)
 
-    character = Character.query.get(people_id)
-    if character is None:
-        raise APIException(f'Person ID {people_id} not found.', status_code=404)
+    user_id = parse_integer(data["user_id"])
+    if user_id is None:
+        raise APIException('user_id must be a valid integer.', status_code=400)
+    return user_id
 
-    existing_favorite = Favorite.query.filter_by(
-        user_id=user_id, 
-        character_id=people_id
-    ).first()
-    
-    if existing_favorite:
-        raise APIException('This person is already in favorites.', status_code=400)
+@route('/favorite/people/<int:people_id>', methods=["POST"])
+def add_favorite_person(people_id):
+    user_id = get_favorite_user_id(request.get_json())
 
-    new_favorite_person = Favorite(user_id=user_id, character_id=people_id)
-    db.session.add(new_favorite_person)
-    db.session.commit()
+    new_favorite_person = add_favorite(user_id, Character, 'Person', character_id=people_id)
     
-    return jsonify(new_favorite_person.serialize()), 201
+    return jsonify(new_favorite_person), 201
 
-@app.route('/favorite/people/<int:people_id>', methods=["DELETE"])
+@route('/favorite/people/<int:people_id>', methods=["DELETE"])
 def remove_favorite_person(people_id):
-    data = request.get_json()
-    
-    if not data or "user_id" not in data:
-        raise APIException('user_id is required in request body.', status_code=400)
-    
-    user_id = data["user_id"]
+    user_id = get_favorite_user_id(request.get_json())
 
-    favorite = Favorite.query.filter_by(
-        user_id=user_id, 
-        character_id=people_id
-    ).first()
-    
-    if favorite is None:
+    if not remove_favorite(user_id, character_id=people_id):
         raise APIException('Favorite person not found.', status_code=404)
     
-    db.session.delete(favorite)
-    db.session.commit()
-    
     return jsonify({"message": "Favorite person removed successfully"}), 200
 
-@app.route('/favorite/planet/<int:planet_id>', methods=["POST"])
+@route('/favorite/planet/<int:planet_id>', methods=["POST"])
 def add_favorite_planet(planet_id):
-    data = request.get_json()
-    
-    if not data or "user_id" not in data:
-        raise APIException('user_id is required in request body.', status_code=400)
-    
-    user_id = data["user_id"]
+    user_id = get_favorite_user_id(request.get_json())
 
-    user = User.query.get(user_id)
-    if user is None:
-        raise APIException(f'User ID {user_id} not found.', status_code=404)
-
-    planet = Planet.query.get(planet_id)
-    if planet is None:
-        raise APIException(f'Planet ID {planet_id} not found.', status_code=404)
-    
-    existing_favorite = Favorite.query.filter_by(
-        user_id=user_id, 
-        planet_id=planet_id
-    ).first()
-    
-    if existing_favorite:
-        raise APIException('This planet is already in favorites.', status_code=400)
-    
-    new_favorite_planet = Favorite(user_id=user_id, planet_id=planet_id)
-    db.session.add(new_favorite_planet)
-    db.session.commit()
+    new_favorite_planet = add_favorite(user_id, Planet, 'Planet', planet_id=planet_id)
     
-    return jsonify(new_favorite_planet.serialize()), 201
+    return jsonify(new_favorite_planet), 201
 
-@app.route('/favorite/planet/<int:planet_id>', methods=["DELETE"])
+@route('/favorite/planet/<int:planet_id>', methods=["DELETE"])
 def remove_favorite_planet(planet_id):
-    data = request.get_json()
-    
-    if not data or "user_id" not in data:
-        raise APIException('user_id is required in request body.', status_code=400)
-    
-    user_id = data["user_id"]
-    
-    favorite = Favorite.query.filter_by(
-        user_id=user_id, 
-        planet_id=planet_id
-    ).first()
-    
-    if favorite is None:
+    user_id = get_favorite_user_id(request.get_json())
+
+    if not remove_favorite(user_id, planet_id=planet_id):
         raise APIException('Favorite planet not found.', status_code=404)
     
-    db.session.delete(favorite)
-    db.session.commit()
-    
     return jsonify({"message": "Favorite planet removed successfully"}), 200
 
-@app.route('/favorite/vehicles/<int:vehicle_id>', methods=["POST"])
+@route('/favorite/vehicles/<int:vehicle_id>', methods=["POST"])
 def add_favorite_vehicle(vehicle_id):
-    data = request.get_json()
-    
-    if not data or "user_id" not in data:
-        raise APIException('user_id is required in request body.', status_code=400)
-    
-    user_id = data["user_id"]
-
-    user = User.query.get(user_id)
-    if user is None:
-        raise APIException(f'User ID {user_id} not found.', status_code=404)
+    user_id = get_favorite_user_id(request.get_json())
 
-    vehicle = Vehicle.query.get(vehicle_id)
-    if vehicle is None:
-        raise APIException(f'Vehicle ID {vehicle_id} not found.', status_code=404)
-
-    existing_favorite = Favorite.query.filter_by(
-        user_id=user_id, 
-        vehicle_id=vehicle_id
-    ).first()
-    
-    if existing_favorite:
-        raise APIException('This vehicle is already in favorites.', status_code=400)
-
-    new_favorite_vehicle = Favorite(user_id=user_id, vehicle_id=vehicle_id)
-    db.session.add(new_favorite_vehicle)
-    db.session.commit()
+    new_favorite_vehicle = add_favorite(user_id, Vehicle, 'Vehicle', vehicle_id=vehicle_id)
     
-    return jsonify(new_favorite_vehicle.serialize()), 201
+    return jsonify(new_favorite_vehicle), 201
 
-@app.route('/favorite/vehicles/<int:vehicle_id>', methods=["DELETE"])
+@route('/favorite/vehicles/<int:vehicle_id>', methods=["DELETE"])
 def remove_favorite_vehicle(vehicle_id):
-    data = request.get_json()
-    
-    if not data or "user_id" not in data:
-        raise APIException('user_id is required in request body.', status_code=400)
-    
-    user_id = data["user_id"]
-    
-    favorite = Favorite.query.filter_by(
-        user_id=user_id, 
-        vehicle_id=vehicle_id
-    ).first()
-    
-    if favorite is None:
+    user_id = get_favorite_user_id(request.get_json())
+
+    if not remove_favorite(user_id, vehicle_id=vehicle_id):
         raise APIException('Favorite vehicle not found.', status_code=404)
     
-    db.session.delete(favorite)
-    db.session.commit()
-    
     return jsonify({"message": "Favorite vehicle removed successfully"}), 200
 
+FAVORITE_TYPES = {
+    "people": (Character, "character_id"),
+    "planets": (Planet, "planet_id"),
+    "vehicles": (Vehicle, "vehicle_id")
+}
+MAX_FAVORITES_BATCH = 500
+
+def get_favorite_items(data):
+    """
+    Reads {"items": [{"type": "people"|"planets"|"vehicles", "id": <int>}, ...]}.
+    Returns one (type, id) pair per item, None for malformed items.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+        raise APIException('items is required in request body as a list of {"type", "id"} objects.', status_code=400)
+    if len(data["items"]) > MAX_FAVORITES_BATCH:
+        raise APIException(f'A batch can hold at most {MAX_FAVORITES_BATCH} items.', status_code=400)
+
+    items = []
+    for item in data["items"]:
+        if (isinstance(item, dict) and item.get("type") in FAVORITE_TYPES
+                and isinstance(item.get("id"), int) and not isinstance(item.get("id"), bool)):
+            items.append((item["type"], item["id"]))
+        else:
+            items.append(None)
+    return items
+
+def batch_results(data, items, statuses):
+    return [
+        {"type": item[0], "id": item[1], "status": statuses[item]} if item is not None
+        else {"item": raw, "status": "invalid"}
+        for raw, item in zip(data["items"], items)
+    ]
+
+def favorite_filter(user_id, ids_by_type):
+    return and_(Favorite.user_id == user_id, or_(*[
+        getattr(Favorite, FAVORITE_TYPES[kind][1]).in_(ids) for kind, ids in ids_by_type.items()
+    ]))
+
+def favorite_key(row):
+    for kind, (model, column) in FAVORITE_TYPES.items():
+        if getattr(row, column) is not None:
+            return kind, getattr(row, column)
+
+@route('/users/<int:user_id>/favorites:batch', methods=["POST"])
+def add_favorites_batch(user_id):
+    data = request.get_json(silent=True)
+    items = get_favorite_items(data)
+
+    if db.session.get(User, user_id) is None:
+        raise APIException(f'User ID {user_id} not found.', status_code=404)
+
+    ids_by_type = {}
+    for item in filter(None, items):
+        ids_by_type.setdefault(item[0], set()).add(item[1])
+
+    # One IN (...) query per target table and one for the existing favorites
+    statuses = {}
+    if ids_by_type:
+        for kind, ids in ids_by_type.items():
+            model = FAVORITE_TYPES[kind][0]
+            found = set(db.session.scalars(select(model.id).where(model.id.in_(ids))))
+            statuses.update({(kind, target_id): "not_found" for target_id in ids - found})
+        existing = db.session.execute(
+            select(Favorite.character_id, Favorite.planet_id, Favorite.vehicle_id)
+            .where(favorite_filter(user_id, ids_by_type))
+        )
+        statuses.update({favorite_key(row): "already_exists" for row in existing})
+
+    rows = []
+    for item in filter(None, items):
+        if item not in statuses:
+            statuses[item] = "created"
+            rows.append({"user_id": user_id, "character_id": None, "planet_id": None, "vehicle_id": None,
+                         FAVORITE_TYPES[item[0]][1]: item[1]})
+
+    if rows:
+        try:
+            db.session.execute(insert(Favorite).values(rows))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            raise APIException('Favorites changed while the batch was applied, please retry.', status_code=409)
+        bump_version(f'favorites:{user_id}')
+
+    return jsonify({"results": batch_results(data, items, statuses)}), 200
+
+@route('/users/<int:user_id>/favorites:batch', methods=["DELETE"])
+def remove_favorites_batch(user_id):
+    data = request.get_json(silent=True)
+    items = get_favorite_items(data)
+
+    ids_by_type = {}
+    for item in filter(None, items):
+        ids_by_type.setdefault(item[0], set()).add(item[1])
+
+    statuses = {item: "not_found" for item in filter(None, items)}
+    if ids_by_type:
+        deleted = db.session.execute(
+            delete(Favorite).where(favorite_filter(user_id, ids_by_type))
+            .returning(Favorite.character_id, Favorite.planet_id, Favorite.vehicle_id)
+        ).all()
+        db.session.commit()
+        if deleted:
+            bump_version(f'favorites:{user_id}')
+        statuses.update({favorite_key(row): "deleted" for row in deleted})
+
+    return jsonify({"results": batch_results(data, items, statuses)}), 200
+
 if __name__ == '__main__':
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+ASGI entry point, next to wsgi.py. It serves the same Flask app, so the same
+routes, APIException handler and request hooks, but every database round
+trip goes through SQLAlchemy's asyncio engine (asyncpg for Postgres,
+aiosqlite for SQLite). Requests waiting on the database no longer hold a
+thread each, but the Flask code around every query still runs on the event
+loop's one thread, and in benchmarks/serving.py it serves about as many
+requests per second as gunicorn's threaded workers, with a worse p99:
+
+    uvicorn asgi:application --app-dir ./src/
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker --chdir ./src/
+
+Each request gets an AsyncSession and the Flask request runs inside
+AsyncSession.run_sync, with db.session pointing at that session's sync
+facade. Handlers stay ordinary Flask code; their queries are awaited on the
+event loop. ASYNC_DATABASE_URL overrides the async URL derived from
+DATABASE_URL. Reads are not routed to DATABASE_REPLICA_URLS in this mode.
+
+The asyncio engine holds the worker's only connection pool. The app's own
+db.engine is created without one: the asyncio engine cannot be driven from
+outside the event loop, so snapshot rebuild threads and CLI commands open a
+connection of their own for as long as they need it.
+"""
+import io
+import itertools
+import os
+import sys
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app import create_app
+from models import db
+from pool import engine_options, setup_engine
+
+app = create_app(pooled=False)
+
+ASYNC_DRIVERS = {'postgresql': 'asyncpg', 'sqlite': 'aiosqlite'}
+# Body chunks of a streamed response read per trip into the session's greenlet
+STREAM_CHUNKS = 64
+
+def async_database_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+database_url = make_url(os.getenv('ASYNC_DATABASE_URL') or async_database_url(app.config['SQLALCHEMY_DATABASE_URI']))
+async_engine = create_async_engine(database_url, **engine_options(database_url))
+setup_engine(async_engine.sync_engine)
+
+if async_engine.dialect.name == 'sqlite':
+    # models.enable_sqlite_foreign_keys only sees plain sqlite3 connections
+    @event.listens_for(async_engine.sync_engine, 'connect')
+    def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+def build_environ(scope, body):
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+class Exchange:
+    """
+    One request through the Flask app, the way Flask.wsgi_app runs it. Every
+    method is called through AsyncSession.run_sync, so the request context
+    and any query the view makes live inside the session's greenlet.
+    """
+
+    def __init__(self, environ):
+        self.environ = environ
+        self.ctx = app.request_context(environ)
+        self.error = None
+        self.pushed = False
+        self.app_iter = None
+        self.body = iter(())
+
+    def start(self, session):
+        self.ctx.push()
+        self.pushed = True
+        db.session.registry.set(session)
+        try:
+            response = app.full_dispatch_request()
+        except Exception as error:
+            self.error = error
+            response = app.handle_exception(error)
+        # Drops the body of HEAD requests and 304s like a WSGI server would
+        self.app_iter, status, headers = response.get_wsgi_response(self.environ)
+        self.body = iter(self.app_iter)
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        return int(status.split(' ', 1)[0]), headers, self.read(session)
+
+    def read(self, session):
+        chunks = list(itertools.islice(self.body, STREAM_CHUNKS))
+        return b''.join(chunks), len(chunks) == STREAM_CHUNKS
+
+    def close(self, session):
+        if hasattr(self.app_iter, 'close'):
+            self.app_iter.close()
+        if self.pushed:
+            error = self.error
+            if error is not None and app.should_ignore_error(error):
+                error = None
+            # Tears down db.session too, which closes the sync facade
+            self.ctx.pop(error)
+
+
+async def handle_http(scope, receive, send):
+    exchange = Exchange(build_environ(scope, await read_body(receive)))
+    async with AsyncSession(async_engine) as session:
+        try:
+            status, headers, (body, more) = await session.run_sync(exchange.start)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            while more:
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                body, more = await session.run_sync(exchange.read)
+            await send({'type': 'http.response.body', 'body': body})
+        finally:
+            await session.run_sync(exchange.close)
+
+async def handle_lifespan(scope, receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http':
+        await handle_http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(scope, receive, send)
+    else:
+        raise NotImplementedError(f"Unsupported ASGI scope type: {scope['type']}")
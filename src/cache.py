@@ -0,0 +1,583 @@
+"""
+Read-through cache for the catalog and favorites endpoints. Responses are
+cached as the encoded JSON body, keyed on a version counter per namespace
+(a table, or one user's favorites). Writes bump the counter instead of
+deleting entries, so every process sharing the backend stops serving the
+old entries at once and the stale ones simply age out. The same counters
+give every response an ETag and, once the second of the last write is
+over, a Last-Modified date, so conditional requests are answered with a
+304 before any row is loaded.
+
+The backend is picked with CACHE_URL:
+
+    memory://                 per-process LRU (default)
+    mmap:///tmp/cache.mmap    fixed size table in a shared memory-mapped file
+    redis://host:6379/0       any server speaking the Redis protocol
+
+With memory:// each worker keeps its own counters and only sees its own
+writes, so with several workers (WEB_CONCURRENCY) a catalog change can take
+up to CACHE_TTL to reach the others. A user's favorites are not cached at
+all in that case, a client reading back its own write must see it.
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.parse import unquote, urlparse
+from flask import current_app, request
+from werkzeug.http import is_resource_modified
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from compression import COMPRESS_MIN_SIZE, accepted_encoding, compress, encoding_etag, set_encoding
+from replicas import REPLICA_STICKY_SECONDS, pin_to_primary
+from utils import encode_body, json_response
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL = float(os.getenv('CACHE_TTL', 300))
+# Worker processes serving the app: gunicorn and uvicorn read it when
+# --workers is not given, so set it rather than pass --workers
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ttl seconds."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class CacheBackend:
+    """
+    Storage used by cached_response(). Keys are str, values are bytes and
+    counters are ints that start at 0 and never expire. A backend that cannot
+    reach its storage returns None from get() and get_counters() so callers
+    fall back to the database instead of failing the request.
+
+    epoch() returns a (token, created_at) pair that changes whenever the
+    counters start over, so version numbers are never reused for ETags. It
+    is the epoch the counters last read by get_counters() in this thread
+    belong to.
+    shared is True when every process using the same URL sees the same
+    counters.
+    """
+    shared = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl):
+        raise NotImplementedError()
+
+    def get_counters(self, keys):
+        raise NotImplementedError()
+
+    def incr(self, key):
+        raise NotImplementedError()
+
+    def set_counter(self, key, value):
+        raise NotImplementedError()
+
+    def epoch(self):
+        raise NotImplementedError()
+
+    def stats(self):
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+class MemoryBackend(CacheBackend):
+
+    def __init__(self, maxsize=1024, ttl=CACHE_TTL):
+        super().__init__()
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._epoch = (os.urandom(8).hex(), time.time())
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl)
+
+    def get_counters(self, keys):
+        with self._lock:
+            return [self._counters.get(key, 0) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def set_counter(self, key, value):
+        with self._lock:
+            self._counters[key] = value
+
+    def epoch(self):
+        return self._epoch
+
+    def stats(self):
+        stats = self._cache.stats()
+        stats["backend"] = type(self).__name__
+        return stats
+
+
+class MmapBackend(CacheBackend):
+    """
+    Direct-mapped hash table in a memory-mapped file, shared by every process
+    on the host that opens the same path. Each key hashes to exactly one slot,
+    a colliding key simply replaces it. Counters live in their own region so a
+    version counter is never evicted; two namespaces that share a counter slot
+    only cause extra invalidations.
+    """
+    shared = True
+    MAGIC = b'SWCACHE1'
+    HEADER = struct.Struct('<8sII')
+    EPOCH = struct.Struct('<8sd')
+    COUNTER = struct.Struct('<Q')
+    SLOT = struct.Struct('<QdII')
+    COUNTERS = 1024
+
+    def __init__(self, path, slots=1024, slot_size=65536):
+        super().__init__()
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self._counters_offset = self.HEADER.size + self.EPOCH.size
+        self._slots_offset = self._counters_offset + self.COUNTERS * self.COUNTER.size
+        self._size = self._slots_offset + slots * slot_size
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        # flock() locks are shared by forked children that inherit the file
+        # descriptor, so every worker process opens the file on its own
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            self._map.close()
+            os.close(self._fd)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != self._size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self._size)
+            self._map = mmap.mmap(fd, self._size)
+            if self._map[:self.HEADER.size] != self.HEADER.pack(self.MAGIC, self.slots, self.slot_size):
+                self._map[:self._slots_offset] = bytes(self._slots_offset)
+                self.HEADER.pack_into(self._map, 0, self.MAGIC, self.slots, self.slot_size)
+                self.EPOCH.pack_into(self._map, self.HEADER.size, os.urandom(8), time.time())
+            token, created_at = self.EPOCH.unpack_from(self._map, self.HEADER.size)
+            self._epoch = (token.hex(), created_at)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self, operation):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, operation)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _hash(self, key):
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def get(self, key):
+        key_hash = self._hash(key)
+        offset = self._slots_offset + (key_hash % self.slots) * self.slot_size
+        encoded = key.encode('utf-8')
+        with self._locked(fcntl.LOCK_SH) as data:
+            stored_hash, expires_at, key_len, value_len = self.SLOT.unpack_from(data, offset)
+            start = offset + self.SLOT.size
+            if (stored_hash != key_hash or expires_at < time.time()
+                    or data[start:start + key_len] != encoded):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return data[start + key_len:start + key_len + value_len]
+
+    def set(self, key, value, ttl):
+        key_hash = self._hash(key)
+        offset = self._slots_offset + (key_hash % self.slots) * self.slot_size
+        encoded = key.encode('utf-8')
+        if self.SLOT.size + len(encoded) + len(value) > self.slot_size:
+            return
+        with self._locked(fcntl.LOCK_EX) as data:
+            stored_hash, expires_at, _, _ = self.SLOT.unpack_from(data, offset)
+            if stored_hash not in (0, key_hash) and expires_at >= time.time():
+                self.evictions += 1
+            start = offset + self.SLOT.size
+            data[start:start + len(encoded)] = encoded
+            data[start + len(encoded):start + len(encoded) + len(value)] = value
+            self.SLOT.pack_into(data, offset, key_hash, time.time() + ttl, len(encoded), len(value))
+
+    def _counter_offset(self, key):
+        return self._counters_offset + (self._hash(key) % self.COUNTERS) * self.COUNTER.size
+
+    def get_counters(self, keys):
+        offsets = [self._counter_offset(key) for key in keys]
+        with self._locked(fcntl.LOCK_SH) as data:
+            return [self.COUNTER.unpack_from(data, offset)[0] for offset in offsets]
+
+    def incr(self, key):
+        offset = self._counter_offset(key)
+        with self._locked(fcntl.LOCK_EX) as data:
+            value = self.COUNTER.unpack_from(data, offset)[0] + 1
+            self.COUNTER.pack_into(data, offset, value)
+            return value
+
+    def set_counter(self, key, value):
+        offset = self._counter_offset(key)
+        with self._locked(fcntl.LOCK_EX) as data:
+            self.COUNTER.pack_into(data, offset, value)
+
+    def epoch(self):
+        with self._locked(fcntl.LOCK_SH):
+            return self._epoch
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"path": self.path, "slots": self.slots, "slot_size": self.slot_size})
+        return stats
+
+
+class RedisError(Exception):
+    pass
+
+
+class RedisBackend(CacheBackend):
+    """
+    Minimal client for the Redis protocol (RESP2), enough for GET, SET PX,
+    MGET and INCR. It speaks to Redis, Valkey, KeyDB or any local stand-in
+    implementing those commands, with one connection per thread.
+    """
+    shared = True
+    EPOCH_KEY = 'cache:epoch'
+
+    def __init__(self, url, timeout=0.5):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.database = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and conn[0] == os.getpid():
+            return conn[1]
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        reader = sock.makefile('rb')
+        self._local.conn = (os.getpid(), (sock, reader))
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.database:
+            self._call('SELECT', self.database)
+        return sock, reader
+
+    def _disconnect(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1][0].close()
+
+    def _read(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('connection closed by server')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest
+        if kind == b'-':
+            raise RedisError(rest.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read(reader) for _ in range(length)]
+        raise RedisError(f'unexpected reply {line!r}')
+
+    def _call(self, *args):
+        sock, reader = self._connection()
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        sock.sendall(b''.join(parts))
+        return self._read(reader)
+
+    def _execute(self, *args):
+        try:
+            return self._call(*args)
+        except (OSError, RedisError) as error:
+            logger.warning('cache backend unavailable: %s', error)
+            self._disconnect()
+            raise RedisError(str(error))
+
+    def get(self, key):
+        try:
+            value = self._execute('GET', key)
+        except RedisError:
+            return None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl):
+        try:
+            self._execute('SET', key, value, 'PX', int(ttl * 1000))
+        except RedisError:
+            pass
+
+    def get_counters(self, keys):
+        # The epoch comes in the same MGET: after a FLUSH or a restart the
+        # counters start over, and so must the epoch the ETags are built on
+        self._local.epoch = None
+        try:
+            epoch, *values = self._execute('MGET', self.EPOCH_KEY, *keys)
+            if epoch is None:
+                epoch = self._claim_epoch()
+        except RedisError:
+            return None
+        token, created_at = epoch.decode('ascii').split(':')
+        self._local.epoch = (token, float(created_at))
+        return [int(value or 0) for value in values]
+
+    def incr(self, key):
+        try:
+            return self._execute('INCR', key)
+        except RedisError:
+            return None
+
+    def set_counter(self, key, value):
+        try:
+            self._execute('SET', key, value)
+        except RedisError:
+            pass
+
+    def _claim_epoch(self):
+        # The first process to find no epoch claims one, the rest read it
+        epoch = f'{os.urandom(8).hex()}:{time.time()}'.encode('ascii')
+        if self._execute('SET', self.EPOCH_KEY, epoch, 'NX') is None:
+            epoch = self._execute('GET', self.EPOCH_KEY)
+            if epoch is None:
+                # Evicted again between the SET and the GET
+                raise RedisError('cache epoch could not be claimed')
+        return epoch
+
+    def epoch(self):
+        if getattr(self._local, 'epoch', None) is None and self.get_counters([]) is None:
+            raise RedisError('cache backend unavailable')
+        return self._local.epoch
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({"host": self.host, "port": self.port, "database": self.database})
+        return stats
+
+
+def create_backend(url):
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        return MemoryBackend(maxsize=int(os.getenv('CACHE_MAX_ENTRIES', 1024)))
+    if parsed.scheme == 'mmap':
+        return MmapBackend(
+            parsed.path,
+            slots=int(os.getenv('CACHE_MMAP_SLOTS', 1024)),
+            slot_size=int(os.getenv('CACHE_MMAP_SLOT_SIZE', 65536))
+        )
+    if parsed.scheme in ('redis', 'valkey'):
+        return RedisBackend(url)
+    raise ValueError(f'Unsupported CACHE_URL scheme: {parsed.scheme}')
+
+response_cache = create_backend(os.getenv('CACHE_URL', 'memory://'))
+
+def bump_version(namespace):
+    response_cache.incr(f'version:{namespace}')
+    response_cache.set_counter(f'modified:{namespace}', int(time.time()))
+
+def counters_shared():
+    """True when every worker sees the writes counted here: a shared backend, or a single worker."""
+    return response_cache.shared or WEB_CONCURRENCY == 1
+
+def cached_response(namespaces, key, build, shared_only=False):
+    """
+    Returns the cached JSON body for key under the current versions of
+    namespaces, calling build() and caching its encoded result on a miss.
+    A request whose If-None-Match or If-Modified-Since still matches gets a
+    304 without build() being called.
+
+    shared_only=True is for data a client reads back right after writing
+    it: unless counters_shared(), build() runs uncached on the primary, as
+    another worker's write would not bump this worker's counters.
+    """
+    if shared_only and not counters_shared():
+        pin_to_primary()
+        return json_response(build())
+    counters = response_cache.get_counters(
+        [f'version:{namespace}' for namespace in namespaces] + [f'modified:{namespace}' for namespace in namespaces]
+    )
+    if counters is None:
+        # Without the write times a replica could be behind, read the primary
+        pin_to_primary()
+        return json_response(build())
+    try:
+        token, created_at = response_cache.epoch()
+    except RedisError:
+        pin_to_primary()
+        return json_response(build())
+
+    versions, modified = counters[:len(namespaces)], counters[len(namespaces):]
+    if time.time() - max(modified) < REPLICA_STICKY_SECONDS:
+        pin_to_primary()
+    cache_key = ','.join(f'{namespace}@{version}' for namespace, version in zip(namespaces, versions)) + f'|{key!r}'
+    etag = hashlib.blake2b(f'{token}|{cache_key}'.encode('utf-8'), digest_size=12).hexdigest()
+    # Tagged with the encoding negotiated, the one the body is cached and sent in
+    etag = encoding_etag(etag, accepted_encoding())
+    # Nothing changed since the counters started unless a write says otherwise.
+    # Last-Modified only has whole seconds, and until the second of the last
+    # write is over another write can land in it under the same date, so
+    # until then only the ETag validates
+    last_write = int(max([created_at] + modified))
+    last_modified = datetime.fromtimestamp(last_write, timezone.utc) if time.time() >= last_write + 1 else None
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = cached_body(cache_key, build)
+
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+def cached_body(cache_key, build):
+    # A compressed hit is served as it is, without reading the plain body
+    encoding = accepted_encoding()
+    if encoding is not None:
+        compressed = response_cache.get(f'{cache_key}|{encoding}')
+        if compressed is not None:
+            response = current_app.response_class(compressed, mimetype='application/json')
+            set_encoding(response, encoding)
+            return response
+
+    body = response_cache.get(cache_key)
+    if body is None:
+        body = encode_body(build())
+        response_cache.set(cache_key, body, CACHE_TTL)
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return current_app.response_class(body, mimetype='application/json')
+
+    compressed = compress(body, encoding)
+    response_cache.set(f'{cache_key}|{encoding}', compressed, CACHE_TTL)
+    response = current_app.response_class(compressed, mimetype='application/json')
+    set_encoding(response, encoding)
+    return response
+
+def _mark_changed(namespace):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault('changed_namespaces', set()).add(namespace(target))
+    return listener
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    # Bumping after the commit, not at flush time, keeps a concurrent request
+    # from caching the old rows under the new version
+    for namespace in session.info.pop('changed_namespaces', ()):
+        bump_version(namespace)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('changed_namespaces', None)
+
+def invalidate_on_change(model, namespace=None):
+    """
+    Bumps the version of a model's namespace on every ORM insert, update or
+    delete, wherever it comes from (API handlers or the Flask-Admin views).
+    namespace(target) defaults to the model's table name.
+    """
+    if namespace is None:
+        namespace = lambda target: model.__tablename__
+    listener = _mark_changed(namespace)
+    for name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(model, name, listener)
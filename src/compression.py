@@ -0,0 +1,103 @@
+"""
+Response compression negotiated from Accept-Encoding. JSON and NDJSON bodies
+of at least COMPRESS_MIN_SIZE bytes go out as brotli when the client accepts
+it and the brotli package is installed, otherwise as gzip:
+
+    COMPRESS_MIN_SIZE=1024        smaller bodies are sent as they are
+    COMPRESS_GZIP_LEVEL=6
+    COMPRESS_BROTLI_QUALITY=5
+
+Streamed responses are compressed chunk by chunk and flushed every
+STREAM_FLUSH_SIZE bytes of input, so clients keep receiving rows instead of
+waiting for the compressor's buffer to fill. cached_response() keeps the
+compressed bytes in the cache next to the plain ones, a hit is never
+compressed again.
+"""
+import gzip
+import os
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson')
+STREAM_FLUSH_SIZE = 64 * 1024
+ENCODINGS = ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def accepted_encoding():
+    """The encoding to send this request's response in, or None for identity."""
+    if 'Accept-Encoding' not in request.headers:
+        return None
+    return request.accept_encodings.best_match(ENCODINGS)
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    # mtime=0 keeps the output, and so the cached bytes, deterministic
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+def compress_stream(chunks, encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    pending = 0
+    for chunk in chunks:
+        data = process(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_SIZE:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
+
+def compressible(response):
+    return (
+        200 <= response.status_code < 300 and response.status_code != 204
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+        and not response.direct_passthrough
+        and 'Content-Encoding' not in response.headers
+    )
+
+def encoding_etag(etag, encoding):
+    """The strong ETag of the body sent in encoding, each encoding's bytes differ."""
+    return etag if encoding is None else f'{etag}-{encoding}'
+
+def set_encoding(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    etag, weak = response.get_etag()
+    if etag and not etag.endswith(f'-{encoding}'):
+        response.set_etag(encoding_etag(etag, encoding), weak)
+
+def compress_response(response):
+    """after_request hook for every response cached_response() did not compress."""
+    if not compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+    set_encoding(response, encoding)
+    return response
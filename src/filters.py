@@ -0,0 +1,117 @@
+"""
+Query-string filters for the catalog collections. Every filter maps to a SQL
+WHERE clause backed by an index, so a filtered page costs about as much as
+the rows it matches:
+
+    ?gender=female                 equality
+    ?climate=arid&climate=murky    IN (...), by repeating the parameter
+    ?name_prefix=lu                case-insensitive prefix (model_prefix on /vehicles)
+    ?min_height=150&max_mass=80    numeric range, inclusive
+    ?sort=-population              order by a numeric field, - for descending
+
+Values are never split on commas, SWAPI values like "temperate, tropical"
+contain them. Ranges and sorting use the parsed <field>_num columns, rows
+where the value is "unknown" never match a range and sort last.
+
+On SQLite, whose lower() only folds A-Z, prefixes are case-insensitive for
+ASCII letters only: ?name_prefix=émile matches "Émile" on Postgres but not
+on SQLite.
+"""
+import math
+import sys
+from sqlalchemy import and_, func
+from models import db, Character, Planet, Vehicle
+from utils import APIException
+
+FILTERS = {
+    Character: ('gender',),
+    Planet: ('climate', 'terrain'),
+    Vehicle: ('vehicle_class', 'manufacturer'),
+}
+
+PREFIX_FILTERS = {
+    Character: 'name',
+    Planet: 'name',
+    Vehicle: 'model',
+}
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def prefix_upper_bound(prefix):
+    """The smallest string above every string starting with prefix, None if there is none."""
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    following = ord(prefix[-1]) + 1
+    if 0xD800 <= following <= 0xDFFF:
+        # Surrogates cannot be encoded, and no text holds them
+        following = 0xE000
+    return prefix[:-1] + chr(following)
+
+def prefix_predicate(column, prefix):
+    expression = func.lower(column)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # Served by the lower(...) text_pattern_ops index
+        return expression.like(escape_like(prefix.lower()) + '%', escape='\\')
+    # SQLite only uses the lower(...) index for a range, not for LIKE, and
+    # its lower() leaves everything but A-Z alone, so fold the same way here
+    prefix = prefix.translate(ASCII_LOWER)
+    upper_bound = prefix_upper_bound(prefix)
+    if upper_bound is None:
+        return expression >= prefix
+    return and_(expression >= prefix, expression < upper_bound)
+
+def get_number(args, name):
+    value = args.get(name)
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        number = math.nan
+    if not math.isfinite(number):
+        raise APIException(f'{name} must be a valid number.', status_code=400)
+    return number
+
+def get_sort(model, args):
+    """
+    Reads ?sort=<field> or ?sort=-<field>. Returns (column, descending), or
+    None for the default id order.
+    """
+    sort = args.get('sort')
+    if not sort:
+        return None
+    name = sort[1:] if sort.startswith('-') else sort
+    if name not in model.NUMERIC_FIELDS:
+        raise APIException(
+            f'Cannot sort by {name}. Sortable fields: {", ".join(model.NUMERIC_FIELDS)}.',
+            status_code=400
+        )
+    return getattr(model, f'{name}_num'), sort.startswith('-')
+
+def apply_filters(model, statement, args):
+    for name in FILTERS.get(model, ()):
+        values = args.getlist(name)
+        column = getattr(model, name)
+        if len(values) == 1:
+            statement = statement.where(column == values[0])
+        elif values:
+            statement = statement.where(column.in_(values))
+
+    prefix_field = PREFIX_FILTERS.get(model)
+    prefix = args.get(f'{prefix_field}_prefix') if prefix_field else None
+    if prefix:
+        statement = statement.where(prefix_predicate(getattr(model, prefix_field), prefix))
+
+    for name in getattr(model, 'NUMERIC_FIELDS', ()):
+        column = getattr(model, f'{name}_num')
+        low = get_number(args, f'min_{name}')
+        high = get_number(args, f'max_{name}')
+        if low is not None:
+            statement = statement.where(column >= low)
+        if high is not None:
+            statement = statement.where(column <= high)
+    return statement
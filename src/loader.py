@@ -0,0 +1,281 @@
+"""
+Bulk loader for SWAPI-shaped dumps, registered on the app as a flask command:
+
+    flask load-swapi people.json planets.csv vehicles.jsonl
+    flask load-swapi dump.json --kind vehicles --batch-size 20000
+
+Files may be a JSON array of records, a SWAPI page ({"results": [...]}), a
+swapi.tech or Django fixture dump (records nested under "properties" or
+"fields"), JSON lines (.jsonl, .ndjson) or CSV with a header row. The kind
+is guessed from the file name unless --kind is given.
+
+Records are upserted on their natural key, name for people and planets and
+model for vehicles: they are first streamed into a temporary staging table,
+with COPY FROM STDIN on Postgres and batched executemany elsewhere, then
+merged into the catalog with one UPDATE and one INSERT. Files are read
+incrementally, so memory stays flat however large the dump is. When a key
+appears more than once in a file the last record wins.
+"""
+import csv
+import io
+import json
+import os
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, Integer, MetaData, Table, exists, func, insert, select, update
+from cache import bump_version
+from models import db, parse_number, Character, Planet, Vehicle
+
+KINDS = {'people': Character, 'planets': Planet, 'vehicles': Vehicle}
+FILE_NAME_HINTS = {'people': 'people', 'character': 'people', 'planet': 'planets', 'vehicle': 'vehicles'}
+NATURAL_KEYS = {Character: 'name', Planet: 'name', Vehicle: 'model'}
+# SWAPI field read when a column's own field is missing from a record
+FALLBACK_FIELDS = {'model': 'name'}
+READ_SIZE = 1 << 16
+
+def iter_json_array(stream):
+    """
+    Records of the first JSON array in a text stream, decoded one at a time.
+    Skipping to the first '[' also finds the records inside a SWAPI page.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, started, eof = '', 0, False, False
+    while True:
+        if not started:
+            position = buffer.find('[') + 1
+            started = position > 0
+            if started:
+                continue
+        else:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            if position < len(buffer):
+                try:
+                    record, position = decoder.raw_decode(buffer, position)
+                    yield record
+                    continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+        if eof:
+            if not started:
+                raise click.ClickException('No JSON array found')
+            raise click.ClickException('Unexpected end of JSON array')
+        chunk = stream.read(READ_SIZE)
+        eof = not chunk
+        if started:
+            buffer, position = buffer[position:], 0
+        else:
+            buffer, position = '', 0
+        buffer += chunk
+
+def read_records(path):
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as stream:
+        if extension == '.csv':
+            yield from csv.DictReader(stream)
+        elif extension in ('.jsonl', '.ndjson'):
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(stream)
+
+def flatten(record):
+    # Django fixtures nest the columns under "fields", swapi.tech under "properties"
+    nested = [record[name] for name in ('fields', 'properties') if isinstance(record.get(name), dict)]
+    if not nested:
+        return record
+    flat = dict(record)
+    for values in nested:
+        flat.update(values)
+    return flat
+
+def text_value(value):
+    if value is None or value == '':
+        return None
+    return value if isinstance(value, str) else str(value)
+
+def text_columns(model):
+    return [column.name for column in model.__table__.columns
+            if column.name != 'id' and not column.name.endswith('_num')]
+
+def load_columns(model):
+    """Text columns first, then their parsed shadow columns."""
+    return text_columns(model) + [f'{name}_num' for name in model.NUMERIC_FIELDS]
+
+def to_rows(model, records):
+    """Column tuples in load_columns order, shadow numbers included."""
+    names = text_columns(model)
+    key = names.index(NATURAL_KEYS[model])
+    fallbacks = [(names.index(name), field) for name, field in FALLBACK_FIELDS.items() if name in names]
+    numeric = [names.index(name) for name in model.NUMERIC_FIELDS]
+    for record in records:
+        record = flatten(record)
+        values = [text_value(record.get(name)) for name in names]
+        for index, field in fallbacks:
+            if values[index] is None:
+                values[index] = text_value(record.get(field))
+        if values[key] is None:
+            continue
+        yield (*values, *(parse_number(values[index]) for index in numeric))
+
+def staging_table(model):
+    target = model.__table__
+    return Table(
+        f'load_{target.name}', MetaData(),
+        Column('seq', Integer, nullable=False),
+        *(Column(name, target.c[name].type) for name in load_columns(model)),
+        prefixes=['TEMPORARY']
+    )
+
+class CsvStream:
+    """Rows as CSV text behind a read(size) file interface, for psycopg2's copy_expert."""
+
+    def __init__(self, rows):
+        self._rows = iter(rows)
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+
+    def read(self, size=-1):
+        while size < 0 or self._buffer.tell() < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._writer.writerow(row)
+        data = self._buffer.getvalue()
+        chunk, rest = (data, '') if size < 0 else (data[:size], data[size:])
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._buffer.write(rest)
+        return chunk
+
+def copy_rows(connection, table, names, rows):
+    """Streams tuples into a Postgres table with COPY FROM STDIN."""
+    preparer = connection.dialect.identifier_preparer
+    columns = ', '.join(preparer.quote(name) for name in names)
+    statement = f'COPY {preparer.format_table(table)} ({columns}) FROM STDIN'
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy'):
+            # psycopg 3
+            with cursor.copy(statement) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            # psycopg2; unquoted empty fields are NULL in the CSV format
+            cursor.copy_expert(f'{statement} WITH (FORMAT csv)', CsvStream(rows))
+    finally:
+        cursor.close()
+
+def insert_rows(connection, table, names, rows, batch_size):
+    """Batched executemany of plain tuples, skipping per-row parameter processing."""
+    compiled = insert(table).compile(dialect=connection.dialect, column_keys=names)
+    if compiled.positional:
+        order = [names.index(name) for name in compiled.positiontup]
+        if order == list(range(len(names))):
+            prepare = lambda row: row
+        else:
+            prepare = lambda row: tuple(row[index] for index in order)
+    else:
+        prepare = lambda row: dict(zip(names, row))
+    batch = []
+    for row in rows:
+        batch.append(prepare(row))
+        if len(batch) == batch_size:
+            connection.exec_driver_sql(str(compiled), batch)
+            batch = []
+    if batch:
+        connection.exec_driver_sql(str(compiled), batch)
+
+def sync_id_sequence(connection, table):
+    # Rows inserted with explicit ids leave a Postgres serial behind, move it past max(id)
+    if connection.dialect.name == 'postgresql':
+        quoted = connection.dialect.identifier_preparer.format_table(table)
+        connection.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{quoted}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {quoted}"
+        )
+
+def merge(connection, model, staging):
+    """Upserts the staging rows into the model's table, returns (updated, inserted)."""
+    target = model.__table__
+    names = load_columns(model)
+    key = NATURAL_KEYS[model]
+    latest = select(func.max(staging.c.seq)).group_by(staging.c[key])
+    source = select(*(staging.c[name] for name in names)).where(staging.c.seq.in_(latest)).subquery('source')
+    updated = connection.execute(
+        update(target)
+        .where(target.c[key] == source.c[key])
+        .values({name: source.c[name] for name in names if name != key})
+    ).rowcount
+    sync_id_sequence(connection, target)
+    inserted = connection.execute(
+        insert(target).from_select(
+            names,
+            select(*(source.c[name] for name in names)).where(~exists().where(target.c[key] == source.c[key]))
+        )
+    ).rowcount
+    return updated, inserted
+
+def load_file(path, model, batch_size=5000, use_copy=True):
+    start = time.perf_counter()
+    staging = staging_table(model)
+    names = [column.name for column in staging.columns]
+    count = 0
+
+    def numbered(rows):
+        nonlocal count
+        for count, row in enumerate(rows, 1):
+            yield (count,) + row
+
+    rows = numbered(to_rows(model, read_records(path)))
+    with db.engine.begin() as connection:
+        # A failed load on SQLite can leave the table behind on a pooled connection
+        staging.drop(connection, checkfirst=True)
+        staging.create(connection)
+        if use_copy and connection.dialect.name == 'postgresql':
+            copy_rows(connection, staging, names, rows)
+            connection.exec_driver_sql(f'ANALYZE {staging.name}')
+        else:
+            insert_rows(connection, staging, names, rows, batch_size)
+        updated, inserted = merge(connection, model, staging)
+        staging.drop(connection)
+    bump_version(model.__tablename__)
+
+    seconds = time.perf_counter() - start
+    return {
+        "file": path,
+        "table": model.__tablename__,
+        "rows": count,
+        "updated": updated,
+        "inserted": inserted,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(count / seconds) if seconds else None,
+    }
+
+def guess_kind(path):
+    name = os.path.basename(path).lower()
+    for hint, kind in FILE_NAME_HINTS.items():
+        if hint in name:
+            return kind
+    raise click.BadParameter(f'Cannot tell what {path} holds, pass --kind', param_hint='PATHS')
+
+@click.command('load-swapi')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--kind', type=click.Choice(sorted(KINDS)), help='What the files hold, guessed from their names by default.')
+@click.option('--batch-size', default=5000, show_default=True, help='Rows per executemany when COPY is not used.')
+@click.option('--no-copy', is_flag=True, help='Use executemany on Postgres too.')
+@with_appcontext
+def load_swapi_command(paths, kind, batch_size, no_copy):
+    """Upsert SWAPI JSON or CSV dumps into the catalog."""
+    for path in paths:
+        model = KINDS[kind or guess_kind(path)]
+        report = load_file(path, model, batch_size=batch_size, use_copy=not no_copy)
+        click.echo(
+            f'{report["file"]}: {report["rows"]} rows into {report["table"]} '
+            f'({report["inserted"]} inserted, {report["updated"]} updated) '
+            f'in {report["seconds"]:.2f}s, {report["rows_per_sec"]} rows/sec'
+        )
@@ -0,0 +1,249 @@
+"""
+Per-request instrumentation, exposed in the Prometheus text format at
+/metrics:
+
+    http_request_duration_seconds   histogram per endpoint, method and status
+    http_response_bytes             histogram of body sizes as sent
+    db_queries_per_request          histogram of SQL statements per request
+    db_query_duration_seconds_total time spent in the database, per endpoint
+    serialization_seconds_total     time spent encoding JSON, per endpoint
+
+Set METRICS_DIR to a directory shared by the gunicorn workers. Each worker
+then writes its own memory-mapped file there and /metrics sums all of them,
+so any worker answers the scrape with totals for the whole server. Clear the
+directory when the server starts; a worker whose pid was used by an earlier
+one adds to that file rather than starting it over. Without METRICS_DIR every
+worker only reports its own requests.
+
+With SERVER_TIMING=1, or in debug mode, responses also carry a
+Server-Timing header with the db, serialize and total times of the request.
+"""
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+HELP = {
+    'http_request_duration_seconds': ('histogram', 'Time from the start of a request to the end of its response body.'),
+    'http_response_bytes': ('histogram', 'Response body size as sent, after compression.'),
+    'db_queries_per_request': ('histogram', 'SQL statements executed per request.'),
+    'db_query_duration_seconds_total': ('counter', 'Time spent executing SQL statements.'),
+    'serialization_seconds_total': ('counter', 'Time spent encoding response bodies.'),
+}
+
+class MemoryStore:
+    """Counters of this process only."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class MmapStore:
+    """
+    One append-only file of (key, float64) entries per process. Only the
+    owning process writes its file, so no cross-process locking is needed;
+    collect() reads every file in the directory and adds them up. A file is
+    written entry first and used size second, so a reader never sees a
+    half-written entry.
+    """
+    USED = struct.Struct('<Q')
+    KEY_LENGTH = struct.Struct('<I')
+    VALUE = struct.Struct('<d')
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        # Forked workers must not share the parent's file
+        if self._pid == os.getpid():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        # A pid the OS reused carries on from the counts of the worker that
+        # had it before, instead of truncating them out of the totals
+        path = os.path.join(self.directory, f'metrics_{os.getpid()}.db')
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < self.INITIAL_SIZE:
+            self._file.truncate(self.INITIAL_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), max(size, self.INITIAL_SIZE))
+        self._offsets = dict(self._entries(self._map))
+        self._used = max(self.USED.unpack_from(self._map, 0)[0], self.USED.size)
+        self.USED.pack_into(self._map, 0, self._used)
+        self._pid = os.getpid()
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padded = len(encoded) + (-(self.KEY_LENGTH.size + len(encoded)) % 8)
+        size = self.KEY_LENGTH.size + padded + self.VALUE.size
+        if self._used + size > len(self._map):
+            new_size = max(len(self._map) * 2, self._used + size)
+            self._file.truncate(new_size)
+            self._map.resize(new_size)
+        self.KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        start = self._used + self.KEY_LENGTH.size
+        self._map[start:start + len(encoded)] = encoded
+        offset = start + padded
+        self.VALUE.pack_into(self._map, offset, 0.0)
+        self._used += size
+        self.USED.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._open()
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._append(key)
+            self.VALUE.pack_into(self._map, offset, self.VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def collect(self):
+        values = {}
+        for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+            with open(path, 'rb') as metrics_file:
+                data = metrics_file.read()
+            if len(data) < self.USED.size:
+                continue
+            for key, offset in self._entries(data):
+                values[key] = values.get(key, 0.0) + self.VALUE.unpack_from(data, offset)[0]
+        return values
+
+    def _entries(self, data):
+        """(key, offset of its value) for each entry within data's used size."""
+        used = min(self.USED.unpack_from(data, 0)[0], len(data))
+        position = self.USED.size
+        while position + self.KEY_LENGTH.size <= used:
+            length = self.KEY_LENGTH.unpack_from(data, position)[0]
+            start = position + self.KEY_LENGTH.size
+            offset = start + length + (-(self.KEY_LENGTH.size + length) % 8)
+            yield data[start:start + length].decode('utf-8'), offset
+            position = offset + self.VALUE.size
+
+
+store = MmapStore(os.environ['METRICS_DIR']) if os.getenv('METRICS_DIR') else MemoryStore()
+
+def labels(**values):
+    return ','.join(f'{name}="{value}"' for name, value in values.items())
+
+def observe(name, value, buckets, label_text):
+    # Every bucket is written, so each series exposes the full set of bounds
+    for bound in buckets:
+        store.inc(f'{name}_bucket{{{label_text},le="{bound}"}}', 1 if value <= bound else 0)
+    store.inc(f'{name}_bucket{{{label_text},le="+Inf"}}', 1)
+    store.inc(f'{name}_sum{{{label_text}}}', value)
+    store.inc(f'{name}_count{{{label_text}}}', 1)
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.bytes = 0
+
+def current():
+    return g.get('request_metrics') if has_request_context() else None
+
+@contextmanager
+def timed_serialization():
+    metrics = current()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.serialize_time += time.perf_counter() - start
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _end_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    metrics = current()
+    if metrics is not None:
+        metrics.queries += 1
+        metrics.db_time += elapsed
+
+def count_bytes(chunks, metrics):
+    for chunk in chunks:
+        metrics.bytes += len(chunk)
+        yield chunk
+
+def start_request():
+    g.request_metrics = RequestMetrics()
+
+def finish_request(response):
+    metrics = current()
+    if metrics is None:
+        return response
+
+    if response.is_streamed:
+        response.response = count_bytes(response.iter_encoded(), metrics)
+    else:
+        metrics.bytes = response.content_length or 0
+    if current_app.debug or os.getenv('SERVER_TIMING') in ('1', 'true'):
+        response.headers['Server-Timing'] = (
+            f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries", '
+            f'serialize;dur={metrics.serialize_time * 1000:.2f}, '
+            f'total;dur={(time.perf_counter() - metrics.start) * 1000:.2f}'
+        )
+
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    status = response.status_code
+
+    def record():
+        # On close, so a streamed body is measured to its last byte
+        endpoint_labels = labels(endpoint=endpoint)
+        observe('http_request_duration_seconds', time.perf_counter() - metrics.start, LATENCY_BUCKETS,
+                labels(endpoint=endpoint, method=method, status=status))
+        observe('http_response_bytes', metrics.bytes, BYTES_BUCKETS, endpoint_labels)
+        observe('db_queries_per_request', metrics.queries, QUERY_BUCKETS, endpoint_labels)
+        store.inc(f'db_query_duration_seconds_total{{{endpoint_labels}}}', metrics.db_time)
+        store.inc(f'serialization_seconds_total{{{endpoint_labels}}}', metrics.serialize_time)
+
+    response.call_on_close(record)
+    return response
+
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    values = store.collect()
+    lines = []
+    for name, (kind, description) in HELP.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        # Insertion order keeps each histogram's buckets in ascending order
+        for key, value in values.items():
+            if key.split('{', 1)[0] in (name, f'{name}_bucket', f'{name}_sum', f'{name}_count'):
+                lines.append(f'{key} {value:.17g}')
+    return '\n'.join(lines) + '\n'
+
+def setup_metrics(app):
+    app.before_request(start_request)
+    app.after_request(finish_request)
@@ -1,9 +1,32 @@
+import math
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, ForeignKey, Text
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, Float, ForeignKey, Index, Text, UniqueConstraint, event, func, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapped, joinedload, mapped_column, relationship, validates
 from typing import List, Optional
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys unless asked, the favorite inserts rely on them
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+def parse_number(value):
+    # SWAPI stores numbers as strings like "1,000" or "0.5", with "unknown",
+    # "n/a" and friends for missing values, which become NULL
+    if value is None:
+        return None
+    try:
+        number = float(str(value).replace(',', '').strip())
+    except ValueError:
+        return None
+    return number if math.isfinite(number) else None
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -35,6 +58,13 @@ class User(db.Model):
 
 class Character(db.Model):
     __tablename__ = 'character'
+    __table_args__ = (
+        # Natural key the bulk loader upserts on
+        Index('ix_character_name', 'name'),
+        Index('ix_character_gender_id', 'gender', 'id'),
+        Index('ix_character_height_num_id', 'height_num', 'id'),
+        Index('ix_character_mass_num_id', 'mass_num', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
@@ -45,12 +75,22 @@ class Character(db.Model):
     eye_color: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     gender: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Parsed copies of the numeric strings above, for sorting and range filters
+    NUMERIC_FIELDS = ('height', 'mass')
+    height_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    mass_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     
     # Relationships
     favorites: Mapped[List["Favorite"]] = relationship(
         back_populates="character",
         lazy='select'
     )
+
+    @validates('height', 'mass')
+    def fill_numeric(self, key, value):
+        setattr(self, f'{key}_num', parse_number(value))
+        return value
     
     def serialize(self):
         return {
@@ -71,6 +111,14 @@ class Character(db.Model):
 
 class Planet(db.Model):
     __tablename__ = 'planet'
+    __table_args__ = (
+        Index('ix_planet_name', 'name'),
+        Index('ix_planet_climate_id', 'climate', 'id'),
+        Index('ix_planet_terrain_id', 'terrain', 'id'),
+        Index('ix_planet_diameter_num_id', 'diameter_num', 'id'),
+        Index('ix_planet_rotation_period_num_id', 'rotation_period_num', 'id'),
+        Index('ix_planet_population_num_id', 'population_num', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
@@ -82,12 +130,23 @@ class Planet(db.Model):
     climate: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     terrain: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Parsed copies of the numeric strings above, for sorting and range filters
+    NUMERIC_FIELDS = ('diameter', 'rotation_period', 'population')
+    diameter_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    rotation_period_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    population_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     
     # Relationships
     favorites: Mapped[List["Favorite"]] = relationship(
         back_populates="planet",
         lazy='select'
     )
+
+    @validates('diameter', 'rotation_period', 'population')
+    def fill_numeric(self, key, value):
+        setattr(self, f'{key}_num', parse_number(value))
+        return value
     
     def serialize(self):
         return {
@@ -109,6 +168,14 @@ class Planet(db.Model):
 
 class Vehicle(db.Model):
     __tablename__ = 'vehicle'
+    __table_args__ = (
+        Index('ix_vehicle_model', 'model'),
+        Index('ix_vehicle_vehicle_class_id', 'vehicle_class', 'id'),
+        Index('ix_vehicle_manufacturer_id', 'manufacturer', 'id'),
+        Index('ix_vehicle_cost_in_credits_num_id', 'cost_in_credits_num', 'id'),
+        Index('ix_vehicle_length_num_id', 'length_num', 'id'),
+        Index('ix_vehicle_crew_num_id', 'crew_num', 'id'),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     model: Mapped[str] = mapped_column(String(120), nullable=False)
@@ -118,12 +185,23 @@ class Vehicle(db.Model):
     length: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     crew: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
     passengers: Mapped[Optional[str]] = mapped_column(String(120), nullable=True)
+
+    # Parsed copies of the numeric strings above, for sorting and range filters
+    NUMERIC_FIELDS = ('cost_in_credits', 'length', 'crew')
+    cost_in_credits_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    length_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    crew_num: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     
     # Relationships
     favorites: Mapped[List["Favorite"]] = relationship(
         back_populates="vehicle",
         lazy='select'
     )
+
+    @validates('cost_in_credits', 'length', 'crew')
+    def fill_numeric(self, key, value):
+        setattr(self, f'{key}_num', parse_number(value))
+        return value
     
     def serialize(self):
         return {
@@ -143,6 +221,20 @@ class Vehicle(db.Model):
 
 class Favorite(db.Model):
     __tablename__ = 'favorite'
+    __table_args__ = (
+        UniqueConstraint('user_id', 'character_id', name='uq_favorite_user_character'),
+        UniqueConstraint('user_id', 'planet_id', name='uq_favorite_user_planet'),
+        UniqueConstraint('user_id', 'vehicle_id', name='uq_favorite_user_vehicle'),
+        # Listing a user's favorites in id order
+        Index('ix_favorite_user_id_id', 'user_id', 'id'),
+        # Cascading deletes from the catalog tables, each column is mostly NULL
+        Index('ix_favorite_character_id', 'character_id',
+              postgresql_where=text('character_id IS NOT NULL'), sqlite_where=text('character_id IS NOT NULL')),
+        Index('ix_favorite_planet_id', 'planet_id',
+              postgresql_where=text('planet_id IS NOT NULL'), sqlite_where=text('planet_id IS NOT NULL')),
+        Index('ix_favorite_vehicle_id', 'vehicle_id',
+              postgresql_where=text('vehicle_id IS NOT NULL'), sqlite_where=text('vehicle_id IS NOT NULL')),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     
@@ -158,6 +250,16 @@ class Favorite(db.Model):
     planet: Mapped[Optional["Planet"]] = relationship(back_populates="favorites")
     vehicle: Mapped[Optional["Vehicle"]] = relationship(back_populates="favorites")
     
+    @classmethod
+    def query_for_user(cls, user_id):
+        # serialize() reads the name of each favorite's target, so load them
+        # in the same query instead of one lazy load per favorite
+        return cls.query.filter_by(user_id=user_id).options(
+            joinedload(cls.character).load_only(Character.name),
+            joinedload(cls.planet).load_only(Planet.name),
+            joinedload(cls.vehicle).load_only(Vehicle.model)
+        ).order_by(cls.id)
+
     def serialize(self):
         result = {
             "id": self.id,
@@ -180,4 +282,26 @@ class Favorite(db.Model):
     
     def __repr__(self):
         fav_type = "Character" if self.character_id else "Planet" if self.planet_id else "Vehicle"
-        return f'<Favorite user={self.user_id} type={fav_type}>'
\ No newline at end of file
+        return f'<Favorite user={self.user_id} type={fav_type}>'
+
+
+# Case-insensitive prefix search on names. With text_pattern_ops Postgres can
+# use the index for LIKE 'abc%' whatever the database collation is.
+Index('ix_character_name_lower', func.lower(Character.name).label('name_lower'),
+      postgresql_ops={'name_lower': 'text_pattern_ops'})
+Index('ix_planet_name_lower', func.lower(Planet.name).label('name_lower'),
+      postgresql_ops={'name_lower': 'text_pattern_ops'})
+Index('ix_vehicle_model_lower', func.lower(Vehicle.model).label('model_lower'),
+      postgresql_ops={'model_lower': 'text_pattern_ops'})
+
+def sync_numeric_fields(mapper, connection, target):
+    # A *_num column always follows its text column, even when something
+    # (a form's populate_obj, say) assigned it directly after the validator ran
+    state = inspect(target)
+    for name in target.NUMERIC_FIELDS:
+        if state.attrs[name].history.has_changes() or state.attrs[f'{name}_num'].history.has_changes():
+            setattr(target, f'{name}_num', parse_number(getattr(target, name)))
+
+for numeric_model in (Character, Planet, Vehicle):
+    event.listen(numeric_model, 'before_insert', sync_numeric_fields)
+    event.listen(numeric_model, 'before_update', sync_numeric_fields)
@@ -0,0 +1,168 @@
+"""
+Engine and connection pool settings, read from the environment so every
+gunicorn worker can be sized against the database it talks to:
+
+    DB_POOL_SIZE=5               connections kept open per worker
+    DB_MAX_OVERFLOW=10           extra connections allowed under load
+    DB_POOL_TIMEOUT=30           seconds to wait for a free connection
+    DB_POOL_RECYCLE=1800         reopen connections older than this, in seconds
+    DB_POOL_PRE_PING=1           test each connection before handing it out
+    DB_STATEMENT_TIMEOUT=5000    Postgres statement_timeout, in milliseconds
+    DB_PGBOUNCER=1               safe for pgbouncer in transaction mode
+
+In pgbouncer mode the driver never prepares statements on the server, and the
+statement timeout is set per transaction with SET LOCAL instead of as a
+startup option, which pgbouncer rejects.
+
+Every engine gets a TimedQueuePool, which also records how long requests
+wait for a connection. /internal/pool reports it next to the pool counters.
+"""
+import os
+import threading
+import time
+import weakref
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+def env_flag(name, default=False):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def env_int(name):
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that keeps totals of the time spent waiting for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._wait_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._wait_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+    def stats(self):
+        with self._wait_lock:
+            return {
+                "size": self.size(),
+                "checked_in": self.checkedin(),
+                "checked_out": self.checkedout(),
+                "overflow": max(self.overflow(), 0),
+                "max_overflow": self._max_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_total * 1000, 3),
+                "wait_ms_avg": round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+            }
+
+
+def engine_options(database_url, pooled=True):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for database_url, from the DB_* variables.
+    pooled=False opens a connection per checkout and closes it on return.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # An in-memory database lives in one connection, leave its pool alone
+        return {}
+
+    if not pooled:
+        options = {"poolclass": NullPool}
+    else:
+        options = {"pool_pre_ping": env_flag('DB_POOL_PRE_PING', True)}
+        if not url.get_dialect().is_async:
+            # asyncio engines need their own adapted pool class
+            options["poolclass"] = TimedQueuePool
+        for option, name in (
+            ("pool_size", 'DB_POOL_SIZE'),
+            ("max_overflow", 'DB_MAX_OVERFLOW'),
+            ("pool_timeout", 'DB_POOL_TIMEOUT'),
+            ("pool_recycle", 'DB_POOL_RECYCLE'),
+        ):
+            value = env_int(name)
+            if value is not None:
+                options[option] = value
+    if url.get_backend_name() != 'postgresql':
+        return options
+
+    if pooled:
+        options.setdefault("pool_recycle", 1800)
+    connect_args = {}
+    timeout = env_int('DB_STATEMENT_TIMEOUT')
+    if env_flag('DB_PGBOUNCER'):
+        driver = url.get_driver_name()
+        if driver == 'psycopg':
+            connect_args["prepare_threshold"] = None
+        elif driver == 'asyncpg':
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+        # psycopg2 never prepares statements on the server
+    elif timeout and url.get_driver_name() == 'asyncpg':
+        connect_args["server_settings"] = {"statement_timeout": str(timeout)}
+    elif timeout:
+        connect_args["options"] = f"-c statement_timeout={timeout}"
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+# Every engine setup_engine() has seen, for as long as it is in use
+engines = weakref.WeakSet()
+
+def dispose_after_fork():
+    # A worker forked from a master that already connected (gunicorn
+    # --preload) must not share those sockets; it drops its copies of the
+    # pooled connections without closing them under the master
+    for engine in list(engines):
+        engine.dispose(close=False)
+
+# Once per process, fork hooks cannot be unregistered
+os.register_at_fork(after_in_child=dispose_after_fork)
+
+def setup_engine(engine):
+    """Per-transaction settings that cannot go into the connect arguments."""
+    engines.add(engine)
+
+    timeout = env_int('DB_STATEMENT_TIMEOUT')
+    if engine.dialect.name != 'postgresql' or not timeout or not env_flag('DB_PGBOUNCER'):
+        return
+
+    @event.listens_for(engine, 'begin')
+    def set_statement_timeout(conn):
+        # Straight on the driver connection, the first statement opens the
+        # transaction that the rest of this one then runs in
+        cursor = conn.connection.cursor()
+        cursor.execute(f'SET LOCAL statement_timeout = {timeout}')
+        cursor.close()
+
+def pool_stats(engine):
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        stats = pool.stats()
+    else:
+        stats = {"status": pool.status()}
+    stats["pool"] = type(pool).__name__
+    stats["pid"] = os.getpid()
+    return stats
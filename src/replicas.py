@@ -0,0 +1,117 @@
+"""
+Optional read replicas. With DATABASE_REPLICA_URLS set to a comma separated
+list of database URLs, the reads of GET and HEAD requests go to one of the
+replicas, picked round-robin per request. Everything else, and every write
+or flush whatever the request, goes to the primary DATABASE_URL.
+
+    DATABASE_REPLICA_URLS=postgresql://replica-1/db,postgresql://replica-2/db
+    REPLICA_HEALTH_INTERVAL=5    seconds between SELECT 1 checks of a replica
+    REPLICA_RETRY_AFTER=30       seconds a failed replica is left out
+    REPLICA_STICKY_SECONDS=5     how long reads stay on the primary after a write
+
+A replica lags behind the primary, so a cached response whose namespaces were
+written to in the last REPLICA_STICKY_SECONDS is built from the primary. That
+gives a user read-your-writes on their favorites, and keeps a stale replica
+read from being cached under the new version. The write times come from the
+cache counters, so with a shared CACHE_URL this holds across workers.
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+from pool import engine_options, setup_engine
+
+logger = logging.getLogger(__name__)
+
+REPLICA_HEALTH_INTERVAL = float(os.getenv('REPLICA_HEALTH_INTERVAL', 5))
+REPLICA_RETRY_AFTER = float(os.getenv('REPLICA_RETRY_AFTER', 30))
+REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))
+READ_METHODS = ('GET', 'HEAD')
+
+class ReplicaRouter:
+    """Round-robin over the replica engines, skipping the ones that fail a health check."""
+
+    def __init__(self):
+        self.engines = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._checked_at = {}
+        self._down_until = {}
+
+    def configure(self, urls):
+        self.engines = []
+        for url in filter(None, (url.strip() for url in (urls or '').split(','))):
+            url = url.replace("postgres://", "postgresql://")
+            engine = create_engine(url, **engine_options(url))
+            setup_engine(engine)
+            self.engines.append(engine)
+
+    def choose(self):
+        """A healthy replica engine, or None when there is none."""
+        if not self.engines:
+            return None
+        start = next(self._counter)
+        for offset in range(len(self.engines)):
+            engine = self.engines[(start + offset) % len(self.engines)]
+            if self._healthy(engine):
+                return engine
+        return None
+
+    def _healthy(self, engine):
+        now = time.monotonic()
+        with self._lock:
+            if self._down_until.get(engine, 0) > now:
+                return False
+            if now - self._checked_at.get(engine, -REPLICA_HEALTH_INTERVAL) < REPLICA_HEALTH_INTERVAL:
+                return True
+            # Claim the check so concurrent requests do not all run it
+            self._checked_at[engine] = now
+        try:
+            with engine.connect() as connection:
+                connection.exec_driver_sql('SELECT 1')
+        except DBAPIError:
+            logger.warning('Replica %s failed its health check', engine.url.render_as_string(hide_password=True))
+            with self._lock:
+                self._down_until[engine] = now + REPLICA_RETRY_AFTER
+            return False
+        return True
+
+    def stats(self):
+        now = time.monotonic()
+        return [{
+            "url": engine.url.render_as_string(hide_password=True),
+            "healthy": self._down_until.get(engine, 0) <= now,
+        } for engine in self.engines]
+
+
+replica_router = ReplicaRouter()
+
+def request_replica():
+    # Picked once per request, on its first read
+    if not replica_router.engines or not has_request_context() or request.method not in READ_METHODS:
+        return None
+    if 'replica' not in g:
+        g.replica = replica_router.choose()
+    return g.replica
+
+def pin_to_primary():
+    """Sends the rest of this request's reads to the primary."""
+    if has_request_context():
+        g.replica = None
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from request_replica() when it can."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase):
+            replica = request_replica()
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
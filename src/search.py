@@ -0,0 +1,215 @@
+"""
+Full-text search across the catalog, served at /search:
+
+    ?q=luke sky                    every word must match, the last one as a prefix
+                                   of at least MIN_PREFIX_LENGTH characters
+    ?q=desert&type=planets         only some types, repeat the parameter for more
+    ?q=tatooine&fields=id,name     sparse fields, id is always included
+
+Results come best match first, each with its "type" (people, planets or
+vehicles) and "rank", and are paginated with the same ?limit and ?after
+keyset cursor as the collections.
+
+On Postgres each catalog table has a weighted search_vector tsvector column,
+filled by a trigger and served by a GIN index. On SQLite each table has an
+external-content FTS5 table, <table>_search, kept in sync by triggers and
+ranked with bm25(). Either way the database maintains the index, so a row
+written from the admin panel, the bulk loader or another worker is
+searchable as soon as it commits. The migration creates these objects, and
+db.create_all() gets them through the DDL events registered below.
+"""
+import re
+import sqlalchemy as sa
+from sqlalchemy import DDL, Float, and_, cast, event, func, literal, literal_column, or_, select, tuple_, union_all
+from models import db, Character, Planet, Vehicle
+from serializers import get_serializer, serialized_fields
+from utils import APIException, encode_cursor, get_page_bounds, is_integer, is_number
+
+TYPES = {'people': Character, 'planets': Planet, 'vehicles': Vehicle}
+# Searched columns with their Postgres weight, A ranks highest
+SEARCH_FIELDS = {
+    Character: (('name', 'A'), ('description', 'B'), ('gender', 'C'), ('hair_color', 'C'),
+                ('skin_color', 'C'), ('eye_color', 'C')),
+    Planet: (('name', 'A'), ('description', 'B'), ('climate', 'C'), ('terrain', 'C')),
+    Vehicle: (('model', 'A'), ('manufacturer', 'B'), ('vehicle_class', 'B')),
+}
+# ts_rank's default weight of each class, reused as the bm25() column weights
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+TEXT_SEARCH_CONFIG = 'english'
+TERM = re.compile(r'\w+')
+MAX_TERMS = 8
+# A shorter prefix matches, and so ranks, most of the catalog
+MIN_PREFIX_LENGTH = 2
+
+def postgres_ddl(table, fields):
+    quoted = f'"{table}"'
+
+    def vector(row):
+        return ' || '.join(
+            f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce({row}{name}, '')), '{weight}')"
+            for name, weight in fields
+        )
+
+    columns = ', '.join(name for name, _ in fields)
+    return [
+        f'ALTER TABLE {quoted} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+        f'CREATE OR REPLACE FUNCTION {table}_search_vector() RETURNS trigger AS $$ '
+        f'BEGIN NEW.search_vector := {vector("NEW.")}; RETURN NEW; END $$ LANGUAGE plpgsql',
+        f'DROP TRIGGER IF EXISTS {table}_search_vector ON {quoted}',
+        f'CREATE TRIGGER {table}_search_vector BEFORE INSERT OR UPDATE OF {columns} ON {quoted} '
+        f'FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()',
+        f'UPDATE {quoted} SET search_vector = {vector("")}',
+        f'CREATE INDEX IF NOT EXISTS ix_{table}_search_vector ON {quoted} USING gin (search_vector)',
+    ]
+
+def sqlite_ddl(table, fields):
+    search = f'{table}_search'
+    names = [name for name, _ in fields]
+    columns = ', '.join(names)
+    new = ', '.join(f'new.{name}' for name in names)
+    old = ', '.join(f'old.{name}' for name in names)
+    insert_new = f'INSERT INTO {search}(rowid, {columns}) VALUES (new.id, {new});'
+    delete_old = f"INSERT INTO {search}({search}, rowid, {columns}) VALUES ('delete', old.id, {old});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {search} USING fts5({columns}, "
+        f"content='{table}', content_rowid='id', tokenize='porter unicode61')",
+        f'CREATE TRIGGER IF NOT EXISTS {search}_insert AFTER INSERT ON "{table}" BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS {search}_delete AFTER DELETE ON "{table}" BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS {search}_update AFTER UPDATE OF {columns} ON "{table}" '
+        f'BEGIN {delete_old} {insert_new} END',
+        f"INSERT INTO {search}({search}) VALUES ('rebuild')",
+    ]
+
+for search_model, search_fields in SEARCH_FIELDS.items():
+    search_table = search_model.__table__
+    for statement in postgres_ddl(search_table.name, search_fields):
+        event.listen(search_table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+    for statement in sqlite_ddl(search_table.name, search_fields):
+        event.listen(search_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+    # Dropping the table takes its triggers along, but not the FTS5 table
+    event.listen(search_table, 'after_drop',
+                 DDL(f'DROP TABLE IF EXISTS {search_table.name}_search').execute_if(dialect='sqlite'))
+
+def get_terms(args):
+    terms = TERM.findall(args.get('q', '').lower())[:MAX_TERMS]
+    if not terms:
+        raise APIException('q must contain at least one word.', status_code=400)
+    if len(terms[-1]) < MIN_PREFIX_LENGTH:
+        raise APIException(
+            f'The last word of q must have at least {MIN_PREFIX_LENGTH} characters.', status_code=400
+        )
+    return terms
+
+def get_types(args):
+    names = list(dict.fromkeys(args.getlist('type'))) or list(TYPES)
+    unknown = [name for name in names if name not in TYPES]
+    if unknown:
+        raise APIException(
+            f'Unknown type(s): {", ".join(unknown)}. Valid types: {", ".join(TYPES)}.',
+            status_code=400
+        )
+    return names
+
+def get_search_fields(args):
+    """Like serializers.get_fields, against the fields of every type."""
+    fields = args.get('fields')
+    if fields is None:
+        return None
+
+    requested = set(name.strip() for name in fields.split(',') if name.strip())
+    valid = sorted(set().union(*(serialized_fields(model) for model in TYPES.values())))
+    unknown = sorted(requested.difference(valid))
+    if not requested:
+        raise APIException('fields must name at least one field.', status_code=400)
+    if unknown:
+        raise APIException(
+            f'Unknown field(s): {", ".join(unknown)}. Valid fields: {", ".join(valid)}.',
+            status_code=400
+        )
+    return requested
+
+def model_fields(model, requested):
+    if requested is None:
+        return None
+    return tuple(sorted(requested.intersection(serialized_fields(model)) | {'id'}))
+
+def postgres_matches(model, kind, terms):
+    query = func.to_tsquery(TEXT_SEARCH_CONFIG, ' & '.join(terms[:-1] + [terms[-1] + ':*']))
+    table = sa.table(model.__tablename__, sa.column('id'), sa.column('search_vector'))
+    # double precision, so the rank round-trips through the cursor exactly
+    rank = cast(func.ts_rank_cd(table.c.search_vector, query), Float)
+    return select(literal(kind).label('kind'), table.c.id, rank.label('rank')).where(
+        table.c.search_vector.op('@@')(query)
+    )
+
+def sqlite_matches(model, kind, terms):
+    search = f'{model.__tablename__}_search'
+    table = sa.table(search, sa.column('rowid'))
+    phrase = ' '.join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+    weights = [WEIGHTS[weight] for _, weight in SEARCH_FIELDS[model]]
+    # bm25() is lower for better matches
+    rank = -func.bm25(literal_column(search), *weights)
+    return select(literal(kind).label('kind'), table.c.rowid.label('id'), rank.label('rank')).where(
+        literal_column(search).op('MATCH')(phrase)
+    )
+
+def get_search_cursor(args):
+    limit, cursor = get_page_bounds(args)
+    if cursor is not None and (
+        len(cursor) != 3 or not is_number(cursor[0]) or not is_integer(cursor[1])
+    ):
+        raise APIException('Invalid pagination cursor.', status_code=400)
+    return limit, cursor
+
+def search(args):
+    """One page of ranked results: {"next": <cursor>, "results": [...]}."""
+    terms = get_terms(args)
+    names = get_types(args)
+    requested = get_search_fields(args)
+    limit, cursor = get_search_cursor(args)
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        matches = postgres_matches
+        # The planner guesses hundreds of rows per prefix and starts parallel
+        # workers, which costs more than the index scans they would share
+        db.session.execute(sa.text('SET LOCAL max_parallel_workers_per_gather = 0'))
+    elif dialect == 'sqlite':
+        matches = sqlite_matches
+    else:
+        raise APIException('Search needs Postgres or SQLite.', status_code=501)
+
+    # kind is the position of the type in TYPES, a stable tie breaker
+    kinds = list(TYPES)
+    found = union_all(*(matches(TYPES[name], kinds.index(name), terms) for name in names)).subquery('matches')
+    statement = select(found.c.kind, found.c.id, found.c.rank)
+    if cursor is not None:
+        rank, kind, last_id = cursor
+        statement = statement.where(or_(
+            found.c.rank < rank,
+            and_(found.c.rank == rank, tuple_(found.c.kind, found.c.id) > tuple_(kind, last_id))
+        ))
+    hits = db.session.execute(
+        statement.order_by(found.c.rank.desc(), found.c.kind, found.c.id).limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_cursor(hits[-1].rank, hits[-1].kind, hits[-1].id)
+
+    # One query per type on the page, for just the requested columns
+    rows = {}
+    for kind in sorted({hit.kind for hit in hits}):
+        model = TYPES[kinds[kind]]
+        serializer = get_serializer(model, model_fields(model, requested))
+        ids = [hit.id for hit in hits if hit.kind == kind]
+        for row in db.session.execute(serializer.select().where(model.id.in_(ids))):
+            rows[kind, row[serializer._id_index]] = serializer.as_dict(row)
+
+    results = []
+    for hit in hits:
+        # A row deleted since the match is left out of the page
+        if (hit.kind, hit.id) in rows:
+            results.append(dict(rows[hit.kind, hit.id], type=kinds[hit.kind], rank=hit.rank))
+    return {"next": next_cursor, "results": results}
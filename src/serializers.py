@@ -0,0 +1,234 @@
+"""
+Column-projection serializers for the collection and entity endpoints.
+
+Instead of hydrating ORM objects and building a dict per row for jsonify to
+walk again, each Serializer selects only its columns, gets plain tuples back
+and writes them straight to JSON with an encoder compiled once per field set.
+The output is byte for byte what jsonify(model.serialize()) produces.
+
+Set JSON_ENCODER=orjson to encode with orjson when it is installed. It is
+faster still, but writes non-ASCII characters as UTF-8 instead of \\u escapes.
+"""
+import json
+import os
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+from flask import Response, current_app, jsonify, stream_with_context
+from sqlalchemy import nulls_last, select, tuple_
+from metrics import timed_serialization
+from models import db
+from utils import NDJSON_MIMETYPE, APIException, encode_cursor, get_page_bounds, is_number
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+USE_ORJSON = orjson is not None and os.getenv('JSON_ENCODER') == 'orjson'
+STREAM_BATCH_SIZE = 500
+
+def _encode_str(value):
+    return 'null' if value is None else encode_basestring_ascii(value)
+
+def _encode_int(value):
+    return 'null' if value is None else int.__repr__(value)
+
+def _encode_bool(value):
+    if value is None:
+        return 'null'
+    return 'true' if value else 'false'
+
+def _encode_any(value):
+    return json.dumps(value, sort_keys=True)
+
+ENCODERS = {str: _encode_str, int: _encode_int, bool: _encode_bool}
+
+@lru_cache(maxsize=None)
+def serialized_fields(model):
+    # A transient instance never touches the database, and reading the keys
+    # from serialize() keeps the projection in sync with the model
+    return tuple(model().serialize())
+
+def _column_encoder(column):
+    try:
+        return ENCODERS.get(column.type.python_type, _encode_any)
+    except NotImplementedError:
+        return _encode_any
+
+def _compact():
+    compact = current_app.json.compact
+    return not current_app.debug if compact is None else compact
+
+def compact_output():
+    # orjson output is always compact
+    return USE_ORJSON or _compact()
+
+
+class Serializer:
+    """
+    Encodes rows of model to JSON. Keys come out sorted, like jsonify, so
+    the object template is fixed and each row only formats its values.
+    """
+
+    def __init__(self, model, fields=None):
+        self.model = model
+        self.fields = tuple(sorted(fields or serialized_fields(model)))
+        self.columns = tuple(getattr(model, name) for name in self.fields)
+        if 'id' in self.fields:
+            self._id_index = self.fields.index('id')
+        else:
+            # Pagination needs the id even when the client did not ask for it,
+            # it goes last so the encoder never sees it
+            self._id_index = len(self.columns)
+            self.columns += (model.id,)
+        self.encode_row = self._compile()
+
+    def _compile(self):
+        template = '{' + ','.join(
+            encode_basestring_ascii(name).replace('%', '%%') + ':%s' for name in self.fields
+        ) + '}'
+        scope = {f'e{i}': _column_encoder(column) for i, column in enumerate(self.columns[:len(self.fields)])}
+        values = ''.join(f'e{i}(row[{i}]),' for i in range(len(self.fields)))
+        exec(f'def encode_row(row):\n    return {template!r} % ({values})', scope)
+        return scope['encode_row']
+
+    def as_dict(self, row):
+        return dict(zip(self.fields, row))
+
+    def select(self):
+        return select(*self.columns)
+
+    def one(self, entity_id):
+        """JSON body for one entity, or None if it does not exist."""
+        row = db.session.execute(self.select().where(self.model.id == entity_id)).first()
+        if row is None:
+            return None
+        with timed_serialization():
+            return self._encode_one(row)
+
+    def encode_compact(self, row):
+        """One row as compact JSON bytes, without the trailing newline."""
+        if USE_ORJSON:
+            return orjson.dumps(self.as_dict(row), option=orjson.OPT_SORT_KEYS)
+        return self.encode_row(row).encode('ascii')
+
+    def _encode_one(self, row):
+        if not compact_output():
+            return jsonify(self.as_dict(row)).get_data()
+        return self.encode_compact(row) + b'\n'
+
+    def page(self, args, statement=None, sort=None):
+        """
+        JSON body for one keyset page: {"next": <cursor>, "results": [...]}.
+        Only limit + 1 rows are read, no matter how big the table is.
+        sort is a (column, descending) pair from filters.get_sort.
+        """
+        limit, cursor = get_page_bounds(args)
+        statement = self.select() if statement is None else statement
+        if sort is not None:
+            rows, next_cursor = self._sorted_page(statement, sort, cursor, limit)
+        else:
+            if cursor is not None:
+                statement = statement.where(self.model.id > cursor[-1])
+            rows = db.session.execute(statement.order_by(self.model.id).limit(limit + 1)).all()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][self._id_index])
+
+        with timed_serialization():
+            return self._encode_page(rows, next_cursor)
+
+    def _encode_page(self, rows, next_cursor):
+        if USE_ORJSON:
+            return orjson.dumps(
+                {"next": next_cursor, "results": [self.as_dict(row) for row in rows]},
+                option=orjson.OPT_SORT_KEYS
+            ) + b'\n'
+        if not _compact():
+            return jsonify({"next": next_cursor, "results": [self.as_dict(row) for row in rows]}).get_data()
+        encode_row = self.encode_row
+        return ('{"next":%s,"results":[%s]}\n' % (
+            _encode_str(next_cursor),
+            ','.join([encode_row(row) for row in rows])
+        )).encode('ascii')
+
+    def _sorted_page(self, statement, sort, cursor, limit):
+        # Rows with a value come first, walked with a (value, id) row
+        # comparison so the (column, id) index serves every page. Rows
+        # without one follow in id order, whichever way the sort goes.
+        column, descending = sort
+        statement = statement.add_columns(column)
+        model_id = self.model.id
+        if cursor is not None and (len(cursor) != 2 or not (cursor[0] is None or is_number(cursor[0]))):
+            raise APIException('Invalid pagination cursor.', status_code=400)
+
+        rows = []
+        if cursor is None or cursor[0] is not None:
+            valued = statement.where(column.isnot(None))
+            if cursor is not None:
+                bound = tuple_(column, model_id)
+                valued = valued.where(bound < tuple_(*cursor) if descending else bound > tuple_(*cursor))
+            order = (column.desc(), model_id.desc()) if descending else (column, model_id)
+            rows = db.session.execute(valued.order_by(*order).limit(limit + 1)).all()
+        if len(rows) <= limit:
+            missing = statement.where(column.is_(None))
+            if cursor is not None and cursor[0] is None:
+                missing = missing.where(model_id > cursor[-1])
+            rows += db.session.execute(missing.order_by(model_id).limit(limit + 1 - len(rows))).all()
+
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1][len(self.columns)], rows[-1][self._id_index])
+
+    def stream(self, statement=None, sort=None):
+        """
+        Full export as newline delimited JSON. Rows are fetched from a server
+        side cursor in batches of STREAM_BATCH_SIZE and written one per line.
+        """
+        statement = self.select() if statement is None else statement
+        if sort is not None:
+            column, descending = sort
+            statement = statement.order_by(nulls_last(column.desc() if descending else column.asc()))
+        statement = statement.order_by(self.model.id).execution_options(yield_per=STREAM_BATCH_SIZE)
+
+        def generate():
+            encode_row = self.encode_row
+            for row in db.session.execute(statement):
+                if USE_ORJSON:
+                    yield orjson.dumps(self.as_dict(row), option=orjson.OPT_SORT_KEYS) + b'\n'
+                else:
+                    yield encode_row(row) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+@lru_cache(maxsize=256)
+def get_serializer(model, fields=None):
+    return Serializer(model, fields)
+
+def get_fields(model, args):
+    """
+    Reads a sparse fieldset (?fields=id,name). Only those columns are
+    selected, so large ones like description are never fetched.
+    """
+    fields = args.get('fields')
+    if fields is None:
+        return None
+
+    requested = tuple(sorted(set(name.strip() for name in fields.split(',') if name.strip())))
+    valid = serialized_fields(model)
+    unknown = [name for name in requested if name not in valid]
+    if not requested:
+        raise APIException('fields must name at least one field.', status_code=400)
+    if unknown:
+        raise APIException(
+            f'Unknown field(s): {", ".join(unknown)}. Valid fields: {", ".join(valid)}.',
+            status_code=400
+        )
+    return requested
+
+def serializer_from_args(model, args):
+    return get_serializer(model, get_fields(model, args))
@@ -0,0 +1,116 @@
+"""
+Opt-in slow query log. With SLOW_QUERY_MS set, every statement the engine
+runs for longer than that many milliseconds is logged and kept, newest
+first, in a ring buffer served at /internal/slow-queries:
+
+    SLOW_QUERY_MS=200               threshold, unset turns the recorder off
+    SLOW_QUERY_LOG_SIZE=100         entries kept per worker
+    SLOW_QUERY_EXPLAIN_RATE=0.1     share of slow SELECTs re-run under
+                                    EXPLAIN (ANALYZE, BUFFERS), Postgres only
+
+Each entry has the Flask endpoint that issued the statement, its duration
+and its parameters, with values of sensitive columns (passwords, emails,
+tokens) replaced by "[redacted]" and long strings cut short. The EXPLAIN
+runs on its own connection in a background thread, so the request that
+was already slow does not wait for it.
+"""
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from flask import has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS')) if os.getenv('SLOW_QUERY_MS') else None
+SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', 100))
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0))
+SENSITIVE_PARAMETER = re.compile(r'password|passwd|secret|token|email|username', re.IGNORECASE)
+MAX_PARAMETER_LENGTH = 64
+MAX_EXECUTEMANY_SHOWN = 3
+
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_lock = threading.Lock()
+
+def redact_value(name, value):
+    if name is not None and SENSITIVE_PARAMETER.search(str(name)):
+        return '[redacted]'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, str) and len(value) > MAX_PARAMETER_LENGTH:
+        return value[:MAX_PARAMETER_LENGTH] + '...'
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)[:MAX_PARAMETER_LENGTH]
+
+def redact(parameters, context):
+    """JSON-safe copy of one parameter set, named where the driver uses positions."""
+    if isinstance(parameters, dict):
+        return {name: redact_value(name, value) for name, value in parameters.items()}
+    compiled = getattr(context, 'compiled', None)
+    names = list(getattr(compiled, 'positiontup', None) or ())
+    return [redact_value(names[i] if i < len(names) else None, value) for i, value in enumerate(parameters or ())]
+
+def redacted_parameters(parameters, context, executemany):
+    if not executemany:
+        return redact(parameters, context)
+    return {
+        "sets": len(parameters),
+        "first": [redact(one, context) for one in parameters[:MAX_EXECUTEMANY_SHOWN]],
+    }
+
+def explainable(engine, statement):
+    # ANALYZE runs the statement again, never do that to a write
+    return engine.dialect.name == 'postgresql' and statement.lstrip()[:6].upper() in ('SELECT', 'WITH')
+
+def explain(engine, statement, parameters, entry):
+    try:
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(f'EXPLAIN (ANALYZE, BUFFERS) {statement}', parameters).all()
+        entry["explain"] = '\n'.join(row[0] for row in rows)
+    except Exception as error:
+        entry["explain"] = f'EXPLAIN failed: {error}'
+
+def setup_slow_queries(engine):
+    if SLOW_QUERY_MS is None:
+        return
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_start = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_slow_query(conn, cursor, statement, parameters, context, executemany):
+        duration = (time.perf_counter() - context._slow_query_start) * 1000
+        if duration < SLOW_QUERY_MS or statement.startswith('EXPLAIN'):
+            return
+
+        entry = {
+            "at": time.time(),
+            "duration_ms": round(duration, 2),
+            "endpoint": request.endpoint if has_request_context() else None,
+            "statement": statement,
+            "parameters": redacted_parameters(parameters, context, executemany),
+            "explain": None,
+        }
+        logger.warning('Slow query (%.1f ms) in %s: %s', duration, entry["endpoint"], statement)
+        with _lock:
+            slow_queries.appendleft(entry)
+
+        if not executemany and explainable(engine, statement) and random.random() < SLOW_QUERY_EXPLAIN_RATE:
+            threading.Thread(target=explain, args=(engine, statement, parameters, entry), daemon=True).start()
+
+def slow_query_report():
+    with _lock:
+        entries = list(slow_queries)
+    return {
+        "enabled": SLOW_QUERY_MS is not None,
+        "threshold_ms": SLOW_QUERY_MS,
+        "explain_rate": SLOW_QUERY_EXPLAIN_RATE,
+        "pid": os.getpid(),
+        "queries": entries,
+    }
@@ -0,0 +1,478 @@
+"""
+Opt-in snapshot mode. With CATALOG_SNAPSHOT=1 the characters, planets and
+vehicles are loaded once at startup into read-only, array-backed tables that
+hold every row already encoded as JSON. Plain pages of /people, /planets and
+/vehicles (only ?limit and ?after) and their /<id> routes are then answered
+from memory without touching the database. Anything with filters, sorting,
+sparse fields or streaming still goes to the database.
+
+Changes are detected with the response cache's version counters, which every
+ORM write and the bulk loader bump. A request that finds them moved on from
+the snapshot's starts a rebuild in a background thread and is served from
+the database, and so is every request until the new snapshot is swapped in.
+A reader therefore never sees rows older than the last write it could know
+about. A worker only notices the writes counted in its own cache backend,
+so with several workers (WEB_CONCURRENCY) and a per-process CACHE_URL such
+as the default memory://, snapshot mode stays off and logs a warning: set
+CACHE_URL to a backend every worker shares (mmap or redis).
+
+Set CATALOG_SNAPSHOT_FILE instead to share one snapshot between every
+worker on the host. `flask build-snapshot` writes the catalog to that path
+as one versioned binary file, and each worker maps it read-only and serves
+slices of it, so the catalog sits once in the page cache rather than once
+per worker. A rebuild writes a new file next to it and renames it over the
+old one; workers notice the new file within SNAPSHOT_FILE_CHECK_SECONDS and
+swap to it. When a worker finds the snapshot stale it rebuilds the file
+itself, under a lock so only one worker on the host does the work. This
+needs a CACHE_URL every worker shares (mmap or redis): the file records the
+versions of the worker that wrote it, and with per-process counters no other
+worker would ever find it current. Without one, snapshot mode stays off.
+
+Rows are sliced out of the map as memoryviews and joined into one bytes
+body per response. Building that body is the only copying, and it stays:
+WSGI bodies must be bytes (gunicorn raises on a memoryview), so passing the
+slices through would only turn it into one bytes() per row. Measured on 33k
+characters it takes about 1 us for a page of 20 rows and 5.5 us for 100
+rows (64 KB), against 0.4-0.5 ms for the whole request.
+
+/internal/snapshot reports rows, memory use and rebuild times per process.
+"""
+import click
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from flask import current_app, request
+from flask.cli import with_appcontext
+from sqlalchemy.exc import SQLAlchemyError
+from pool import env_flag
+from cache import WEB_CONCURRENCY, RedisError, response_cache
+from compression import accepted_encoding, encoding_etag
+from models import db, Character, Planet, Vehicle
+from serializers import compact_output, get_serializer
+from utils import APIException, encode_cursor, get_page_bounds, wants_stream
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SNAPSHOT_FILE = os.getenv('CATALOG_SNAPSHOT_FILE')
+CATALOG_SNAPSHOT = env_flag('CATALOG_SNAPSHOT') or CATALOG_SNAPSHOT_FILE is not None
+SNAPSHOT_FILE_CHECK_SECONDS = float(os.getenv('SNAPSHOT_FILE_CHECK_SECONDS', 1))
+SNAPSHOT_MODELS = (Character, Planet, Vehicle)
+SNAPSHOT_BATCH_SIZE = 1000
+SNAPSHOT_RETRY_SECONDS = 5
+PAGE_ARGS = {'limit', 'after'}
+
+# File layout: HEADER, then per table its encoded rows, ids and offsets
+# (int64, 8 byte aligned), then the JSON metadata and the TRAILER pointing
+# back at it. The metadata, written last, locates every section.
+FILE_MAGIC = b'SWCATSNP'
+FILE_FORMAT = 1
+HEADER = struct.Struct('<8sI4x')
+TRAILER = struct.Struct('<QQ8s')
+
+class TableSnapshot:
+    """
+    Rows of one table in id order. ids holds the sorted ids, and row i is
+    data[offsets[i]:offsets[i + 1]], so an id is found by bisecting ids.
+    """
+    __slots__ = ('ids', 'offsets', 'data')
+
+    def __init__(self, ids, offsets, data):
+        self.ids = ids
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.ids)
+
+    def find(self, entity_id):
+        index = bisect_right(self.ids, entity_id) - 1
+        return index if index >= 0 and self.ids[index] == entity_id else None
+
+    def row(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def page(self, after_id, limit):
+        """Encoded rows after after_id, and the id to continue from (or None)."""
+        start = 0 if after_id is None else bisect_right(self.ids, after_id)
+        end = min(start + limit, len(self.ids))
+        rows = [self.row(index) for index in range(start, end)]
+        return rows, self.ids[end - 1] if end < len(self.ids) else None
+
+    def nbytes(self):
+        # Works for bytes and arrays as well as memoryviews into a mapped file
+        return len(self.data) + self.ids.itemsize * len(self.ids) + self.offsets.itemsize * len(self.offsets)
+
+
+class CatalogSnapshot:
+    __slots__ = ('tables', 'versions', 'token', 'built_at', 'build_seconds', 'path')
+
+    def __init__(self, tables, versions, build_seconds, built_at=None, path=None):
+        self.tables = tables
+        self.versions = versions
+        self.token = hashlib.blake2b(f'{versions!r}|{built_at}'.encode('utf-8'), digest_size=8).hexdigest()
+        self.built_at = time.time() if built_at is None else built_at
+        self.build_seconds = build_seconds
+        self.path = path
+
+
+def current_versions():
+    """The cache epoch and catalog version counters, or None if the cache is unreachable."""
+    try:
+        counters = response_cache.get_counters([f'version:{model.__tablename__}' for model in SNAPSHOT_MODELS])
+        if counters is None:
+            return None
+        return (response_cache.epoch()[0],) + tuple(counters)
+    except RedisError:
+        return None
+
+def encoded_rows(model):
+    """(id, JSON bytes) of every row in id order, the bytes the database path sends."""
+    serializer = get_serializer(model)
+    statement = serializer.select().order_by(model.id).execution_options(yield_per=SNAPSHOT_BATCH_SIZE)
+    for row in db.session.execute(statement):
+        yield row[serializer._id_index], serializer.encode_compact(row)
+
+def build_table(model):
+    ids, offsets, data = array('q'), array('q', [0]), bytearray()
+    for entity_id, encoded in encoded_rows(model):
+        data += encoded
+        ids.append(entity_id)
+        offsets.append(len(data))
+    return TableSnapshot(ids, offsets, bytes(data))
+
+def snapshot_versions():
+    versions = current_versions()
+    if versions is None:
+        # A snapshot nobody can tell is current would only be rebuilt again
+        raise RedisError('cache unreachable, the snapshot cannot be versioned')
+    return versions
+
+def build_snapshot():
+    start = time.perf_counter()
+    # Read before the rows, so a write during the build makes it stale at once
+    versions = snapshot_versions()
+    tables = {model: build_table(model) for model in SNAPSHOT_MODELS}
+    db.session.rollback()
+    return CatalogSnapshot(tables, versions, time.perf_counter() - start)
+
+def _align(out):
+    out.write(b'\0' * (-out.tell() % 8))
+
+def write_table(out, model):
+    ids, offsets = array('q'), array('q', [0])
+    data_at = out.tell()
+    for entity_id, encoded in encoded_rows(model):
+        out.write(encoded)
+        ids.append(entity_id)
+        offsets.append(offsets[-1] + len(encoded))
+    _align(out)
+    ids_at = out.tell()
+    ids.tofile(out)
+    offsets_at = out.tell()
+    offsets.tofile(out)
+    return {"rows": len(ids), "data": data_at, "data_length": offsets[-1], "ids": ids_at, "offsets": offsets_at}
+
+def write_snapshot_file(path):
+    """
+    Writes the catalog to path, streaming each table so only its ids and
+    offsets are held in memory. The file is written next to path and renamed
+    over it, so a reader opens either the old file or the complete new one.
+    """
+    start = time.perf_counter()
+    versions = snapshot_versions()
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary, 'wb') as out:
+            out.write(HEADER.pack(FILE_MAGIC, FILE_FORMAT))
+            tables = {model.__tablename__: write_table(out, model) for model in SNAPSHOT_MODELS}
+            db.session.rollback()
+            metadata = json.dumps({
+                "format": FILE_FORMAT,
+                "byteorder": sys.byteorder,
+                "versions": versions,
+                "built_at": time.time(),
+                "build_seconds": time.perf_counter() - start,
+                "tables": tables,
+            }).encode('utf-8')
+            metadata_at = out.tell()
+            out.write(metadata)
+            out.write(TRAILER.pack(metadata_at, len(metadata), FILE_MAGIC))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+def open_snapshot_file(path):
+    """A CatalogSnapshot whose tables are memoryviews into path mapped read-only."""
+    with open(path, 'rb') as snapshot_file:
+        mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if len(view) < HEADER.size + TRAILER.size:
+        raise ValueError(f'{path} is not a catalog snapshot')
+    magic, file_format = HEADER.unpack_from(view, 0)
+    metadata_at, metadata_length, trailer_magic = TRAILER.unpack_from(view, len(view) - TRAILER.size)
+    if magic != FILE_MAGIC or trailer_magic != FILE_MAGIC:
+        raise ValueError(f'{path} is not a catalog snapshot')
+    if file_format != FILE_FORMAT:
+        raise ValueError(f'{path} has snapshot format {file_format}, expected {FILE_FORMAT}')
+    metadata = json.loads(bytes(view[metadata_at:metadata_at + metadata_length]))
+    if metadata["byteorder"] != sys.byteorder:
+        raise ValueError(f'{path} was written on a {metadata["byteorder"]} endian machine')
+
+    tables = {}
+    for model in SNAPSHOT_MODELS:
+        table = metadata["tables"][model.__tablename__]
+        rows = table["rows"]
+        tables[model] = TableSnapshot(
+            view[table["ids"]:table["ids"] + 8 * rows].cast('q'),
+            view[table["offsets"]:table["offsets"] + 8 * (rows + 1)].cast('q'),
+            view[table["data"]:table["data"] + table["data_length"]],
+        )
+    versions = tuple(metadata["versions"]) if metadata["versions"] is not None else None
+    return CatalogSnapshot(tables, versions, metadata["build_seconds"], metadata["built_at"], path)
+
+def file_identity(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def rebuild_snapshot_file(path, wait=True, missing_only=False):
+    """
+    Rewrites path under an exclusive lock on path.lock. Without wait, returns
+    False at once when another process already holds it. With missing_only,
+    a file written by whoever held the lock before is kept.
+    """
+    with open(f'{path}.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        try:
+            if not (missing_only and os.path.exists(path)):
+                write_snapshot_file(path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return True
+
+
+class SnapshotHolder:
+    """The current snapshot, swapped whole when a rebuild finishes."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.enabled = False
+        self.rebuilds = 0
+        self.failures = 0
+        self._app = None
+        self._lock = threading.Lock()
+        self._rebuilding = False
+        self._failed_at = 0.0
+        self.path = None
+        self._file_identity = None
+        self._checked_at = 0.0
+
+    def load(self, app, path=None):
+        self.enabled = True
+        self._app = app
+        self.path = path
+        try:
+            if path is not None:
+                self._load_file()
+            else:
+                with app.app_context():
+                    self.snapshot = build_snapshot()
+        except (SQLAlchemyError, RedisError, OSError, ValueError):
+            # Before the first migration there is nothing to load, the cache
+            # may be down and a file unreadable; the first request tries again
+            logger.warning('Catalog snapshot not built at startup', exc_info=True)
+            return
+        logger.info('Catalog snapshot built in %.2fs, %d bytes', self.snapshot.build_seconds, self.nbytes())
+
+    def _load_file(self):
+        if not os.path.exists(self.path):
+            with self._app.app_context():
+                # Workers starting together build it once
+                rebuild_snapshot_file(self.path, missing_only=True)
+        self._swap_file()
+
+    def _swap_file(self):
+        identity = file_identity(self.path)
+        if identity != self._file_identity:
+            # The old mapping is unmapped once no response refers to it
+            self.snapshot = open_snapshot_file(self.path)
+            self._file_identity = identity
+
+    def _check_file(self):
+        now = time.monotonic()
+        if now - self._checked_at < SNAPSHOT_FILE_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            self._swap_file()
+        except (OSError, ValueError):
+            logger.exception('Catalog snapshot file %s could not be opened', self.path)
+
+    def fresh(self):
+        """The snapshot if it is still current, else None after starting a rebuild."""
+        if not self.enabled:
+            return None
+        if self.path is not None:
+            self._check_file()
+        versions = current_versions()
+        if versions is None:
+            # The cache is down, a rebuild could not be versioned either
+            self._failed_at = time.monotonic()
+            return None
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.versions == versions:
+            return snapshot
+        self._start_rebuild()
+        return None
+
+    def _start_rebuild(self):
+        with self._lock:
+            if self._rebuilding or time.monotonic() - self._failed_at < SNAPSHOT_RETRY_SECONDS:
+                return
+            self._rebuilding = True
+        threading.Thread(target=self._rebuild, daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            start = time.perf_counter()
+            if self.path is not None:
+                with self._app.app_context():
+                    # Another worker already rebuilding will rename its file in place
+                    rebuilt = rebuild_snapshot_file(self.path, wait=False)
+                if rebuilt:
+                    self._swap_file()
+            else:
+                with self._app.app_context():
+                    snapshot = build_snapshot()
+                # One reference assignment, a request sees the old snapshot or the new one
+                self.snapshot = snapshot
+                rebuilt = True
+            if rebuilt:
+                self.rebuilds += 1
+                logger.info('Catalog snapshot rebuilt in %.2fs', time.perf_counter() - start)
+        except Exception:
+            self.failures += 1
+            self._failed_at = time.monotonic()
+            logger.exception('Catalog snapshot rebuild failed')
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _after_fork(self):
+        # A rebuild thread of the parent does not exist in the child
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def nbytes(self):
+        snapshot = self.snapshot
+        return sum(table.nbytes() for table in snapshot.tables.values()) if snapshot else 0
+
+    def stats(self):
+        snapshot = self.snapshot
+        stats = {
+            "enabled": self.enabled,
+            "pid": os.getpid(),
+            "rebuilds": self.rebuilds,
+            "failures": self.failures,
+            "rebuilding": self._rebuilding,
+        }
+        if snapshot is None:
+            return stats
+        stats.update({
+            "file": snapshot.path,
+            "built_at": snapshot.built_at,
+            "build_seconds": round(snapshot.build_seconds, 4),
+            "current": snapshot.versions is not None and current_versions() == snapshot.versions,
+            "bytes": self.nbytes(),
+            "tables": {
+                model.__tablename__: {"rows": len(table), "bytes": table.nbytes()}
+                for model, table in snapshot.tables.items()
+            },
+        })
+        return stats
+
+
+catalog_snapshot = SnapshotHolder()
+os.register_at_fork(after_in_child=catalog_snapshot._after_fork)
+
+def setup_snapshot(app):
+    if not CATALOG_SNAPSHOT:
+        return
+    if CATALOG_SNAPSHOT_FILE is not None and not response_cache.shared:
+        # Every worker would keep rewriting the file the others just wrote
+        logger.warning('CATALOG_SNAPSHOT_FILE needs a CACHE_URL shared by every worker (mmap or redis), '
+                       'not %s; serving the catalog from the database', type(response_cache).__name__)
+        return
+    if WEB_CONCURRENCY != 1 and not response_cache.shared:
+        # A worker would keep serving its snapshot after another worker's write
+        logger.warning('CATALOG_SNAPSHOT with %d workers needs a CACHE_URL shared by every worker (mmap or redis), '
+                       'not %s; serving the catalog from the database', WEB_CONCURRENCY, type(response_cache).__name__)
+        return
+    catalog_snapshot.load(app, CATALOG_SNAPSHOT_FILE)
+
+@click.command('build-snapshot')
+@click.argument('path', required=False)
+@with_appcontext
+def build_snapshot_command(path):
+    """Write the catalog snapshot file that workers map (CATALOG_SNAPSHOT_FILE)."""
+    path = path or CATALOG_SNAPSHOT_FILE
+    if path is None:
+        raise click.UsageError('Pass a path or set CATALOG_SNAPSHOT_FILE.')
+    start = time.perf_counter()
+    rebuild_snapshot_file(path)
+    snapshot = open_snapshot_file(path)
+    rows = ', '.join(f'{len(table)} {model.__tablename__}' for model, table in snapshot.tables.items())
+    click.echo(f'{path}: {rows}, {os.path.getsize(path)} bytes in {time.perf_counter() - start:.2f}s')
+
+def snapshot_response(snapshot, body):
+    response = current_app.response_class(body, mimetype='application/json')
+    etag = hashlib.blake2b(f'{snapshot.token}|{request.full_path}'.encode('utf-8'), digest_size=12).hexdigest()
+    # compress_response() runs after the 304 check, so tag the encoding it will use now
+    response.vary.add('Accept-Encoding')
+    response.set_etag(encoding_etag(etag, accepted_encoding()))
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def collection_from_snapshot(model, args):
+    """A plain page of model from the snapshot, or None to read the database."""
+    if not PAGE_ARGS.issuperset(args) or wants_stream(request) or not compact_output():
+        return None
+    snapshot = catalog_snapshot.fresh()
+    if snapshot is None:
+        return None
+
+    limit, cursor = get_page_bounds(args)
+    rows, next_id = snapshot.tables[model].page(None if cursor is None else cursor[-1], limit)
+    next_cursor = 'null' if next_id is None else f'"{encode_cursor(next_id)}"'
+    # The one copy out of the map, see the module docstring
+    body = b'{"next":%s,"results":[%s]}\n' % (next_cursor.encode('ascii'), b','.join(rows))
+    return snapshot_response(snapshot, body)
+
+def entity_from_snapshot(model, entity_id, args, label):
+    """One entity from the snapshot, or None to read the database."""
+    if args or not compact_output():
+        return None
+    snapshot = catalog_snapshot.fresh()
+    if snapshot is None:
+        return None
+
+    table = snapshot.tables[model]
+    index = table.find(entity_id)
+    if index is None:
+        raise APIException(f'{label} ID {entity_id} not found.', status_code=404)
+    return snapshot_response(snapshot, b''.join((table.row(index), b'\n')))
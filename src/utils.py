@@ -1,4 +1,17 @@
-from flask import jsonify, url_for
+import base64
+import json
+import math
+import re
+from flask import current_app, jsonify, url_for
+from werkzeug.routing import IntegerConverter
+from metrics import timed_serialization
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# What a BIGINT, or a SQLite INTEGER, can hold
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+DECIMAL = re.compile(r'-?[0-9]{1,19}')
 
 class APIException(Exception):
     status_code = 400
@@ -15,13 +28,90 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise APIException('Invalid pagination cursor.', status_code=400)
+    if not isinstance(values, list) or not values:
+        raise APIException('Invalid pagination cursor.', status_code=400)
+    return values
+
+def is_integer(value):
+    # bool is an int subclass, but true is not an id; past 64 bits the driver overflows
+    return type(value) is int and INT64_MIN <= value <= INT64_MAX
+
+def is_number(value):
+    return is_integer(value) or (type(value) is float and math.isfinite(value))
+
+def parse_integer(value):
+    """An integer, or a string of ASCII digits, as an int within 64 bits; None for anything else."""
+    if isinstance(value, str) and DECIMAL.fullmatch(value):
+        value = int(value)
+    return value if is_integer(value) else None
+
+class Int64Converter(IntegerConverter):
+    """<int:...> that stops matching past INT64_MAX, a 404 rather than a driver overflow."""
+
+    def __init__(self, map, *args, **kwargs):
+        kwargs.setdefault('max', INT64_MAX)
+        super().__init__(map, *args, **kwargs)
+
+def get_page_size(args):
+    limit = args.get('limit', DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise APIException('limit must be a valid integer.', status_code=400)
+    if limit < 1:
+        raise APIException('limit must be greater than 0.', status_code=400)
+    # Never let a client ask for more than one bounded page at a time
+    return min(limit, MAX_PAGE_SIZE)
+
+def get_page_bounds(args):
+    """
+    Reads keyset pagination parameters: ?limit=<n>&after=<cursor>.
+    Returns the page size and the decoded cursor values (None on the first
+    page). The last value is always the id of the last row seen.
+    """
+    limit = get_page_size(args)
+    after = args.get('after')
+    if not after:
+        return limit, None
+
+    values = decode_cursor(after)
+    if not is_integer(values[-1]):
+        raise APIException('Invalid pagination cursor.', status_code=400)
+    return limit, values
+
+def encode_body(value):
+    # Handlers return either an already encoded JSON body or data to jsonify
+    if isinstance(value, bytes):
+        return value
+    with timed_serialization():
+        return jsonify(value).get_data()
+
+def json_response(value):
+    return current_app.response_class(encode_body(value), mimetype='application/json')
+
+def wants_stream(request):
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = ['/admin/'] if 'admin' in app.blueprints else []
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
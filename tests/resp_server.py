@@ -0,0 +1,98 @@
+"""
+In-process stand-in for a Redis server, speaking just enough RESP2 for
+cache.RedisBackend: GET, SET (with PX and NX), MGET, INCR, FLUSHALL, AUTH,
+SELECT and PING, each connection on its own thread.
+"""
+import socketserver
+import threading
+import time
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.data = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.commands = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'redis://127.0.0.1:{self.server_address[1]}/0'
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, name, *args):
+        with self.lock:
+            self.commands.append(name)
+            if name in ('PING', 'AUTH', 'SELECT'):
+                return 'OK'
+            if name == 'FLUSHALL':
+                self.data.clear()
+                return 'OK'
+            if name == 'GET':
+                return self.get(args[0])
+            if name == 'MGET':
+                return [self.get(key) for key in args]
+            if name == 'INCR':
+                value = int(self.get(args[0]) or 0) + 1
+                self.data[args[0]] = (str(value).encode('ascii'), None)
+                return value
+            if name == 'SET':
+                key, value, options = args[0], args[1], [option.upper() for option in args[2:]]
+                if b'NX' in options and self.get(key) is not None:
+                    return None
+                expires_at = None
+                if b'PX' in options:
+                    expires_at = time.monotonic() + int(options[options.index(b'PX') + 1]) / 1000
+                self.data[key] = (value, expires_at)
+                return 'OK'
+            return Exception(f'ERR unknown command {name}')
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:])):
+                length = int(self.rfile.readline()[1:])
+                args.append(self.rfile.read(length + 2)[:-2])
+            reply = self.server.execute(args[0].decode('ascii').upper(), *args[1:])
+            self.wfile.write(encode(reply))
+
+
+def encode(reply):
+    if reply is None:
+        return b'$-1\r\n'
+    if isinstance(reply, Exception):
+        return b'-%s\r\n' % str(reply).encode('utf-8')
+    if isinstance(reply, str):
+        return b'+%s\r\n' % reply.encode('utf-8')
+    if isinstance(reply, int):
+        return b':%d\r\n' % reply
+    if isinstance(reply, list):
+        return b'*%d\r\n' % len(reply) + b''.join(encode(item) for item in reply)
+    return b'$%d\r\n%s\r\n' % (len(reply), reply)
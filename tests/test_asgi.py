@@ -0,0 +1,89 @@
+import asyncio
+import importlib
+import json
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.pool import NullPool
+from models import db, User, Character, Planet
+
+PEOPLE = 150
+
+
+@pytest.fixture
+def asgi(tmp_path, monkeypatch):
+    """asgi.py on an aiosqlite engine over a seeded SQLite file."""
+    url = f'sqlite:///{tmp_path}/asgi.db'
+    engine = create_engine(url)
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{"id": 1, "username": 'luke', "email": 'luke@example.com', "password": 'x'}])
+        connection.execute(insert(Planet), [{"id": 1, "name": 'Tatooine'}])
+        connection.execute(insert(Character), [{"id": i, "name": f'character {i}'} for i in range(1, PEOPLE + 1)])
+    engine.dispose()
+
+    monkeypatch.setenv('DATABASE_URL', url)
+    monkeypatch.delenv('ASYNC_DATABASE_URL', raising=False)
+    import asgi
+    asgi = importlib.reload(asgi)
+    yield asgi
+    asyncio.run(asgi.async_engine.dispose())
+
+
+def call(application, method, path, body=None):
+    """Runs one request through the ASGI app, returns (status, headers, body messages)."""
+    query = path.partition('?')[2]
+    payload = b'' if body is None else json.dumps(body).encode('utf-8')
+    scope = {
+        "type": 'http', "http_version": '1.1', "method": method, "scheme": 'http',
+        "path": path.partition('?')[0], "query_string": query.encode('ascii'), "root_path": '',
+        "headers": [(b'host', b'testserver')] + ([(b'content-type', b'application/json')] if body is not None else []),
+        "client": ('127.0.0.1', 1234), "server": ('testserver', 80),
+    }
+    sent = []
+    requests = [{"type": 'http.request', "body": payload, "more_body": False}]
+
+    async def receive():
+        return requests.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start, *bodies = sent
+    return start["status"], dict(start["headers"]), bodies
+
+
+def test_get(asgi):
+    status, headers, bodies = call(asgi.application, 'GET', '/planets/1')
+    assert status == 200
+    assert json.loads(b''.join(body["body"] for body in bodies))["name"] == 'Tatooine'
+
+
+def test_not_found_goes_through_the_api_error_handler(asgi):
+    status, _, bodies = call(asgi.application, 'GET', '/planets/999')
+    assert status == 404
+    assert 'message' in json.loads(b''.join(body["body"] for body in bodies))
+
+
+def test_post_is_committed(asgi):
+    status, _, bodies = call(asgi.application, 'POST', '/favorite/planet/1', {"user_id": 1})
+    assert status == 201
+    assert json.loads(bodies[0]["body"])["planet_name"] == 'Tatooine'
+
+    _, _, bodies = call(asgi.application, 'GET', '/users/1/favorites')
+    assert [favorite["planet_id"] for favorite in json.loads(bodies[0]["body"])] == [1]
+
+
+def test_streamed_response_arrives_in_several_messages(asgi, monkeypatch):
+    monkeypatch.setattr(asgi, 'STREAM_CHUNKS', 16)
+    status, headers, bodies = call(asgi.application, 'GET', '/people?stream=1')
+    assert status == 200
+    assert len(bodies) > 1
+    assert all(body["more_body"] for body in bodies[:-1]) and not bodies[-1].get("more_body")
+    rows = b''.join(body["body"] for body in bodies).decode('utf-8').splitlines()
+    assert [json.loads(row)["id"] for row in rows] == list(range(1, PEOPLE + 1))
+
+
+def test_the_app_keeps_no_pool_of_its_own(asgi):
+    with asgi.app.app_context():
+        assert isinstance(db.engine.pool, NullPool)
@@ -0,0 +1,171 @@
+import os
+import time
+import pytest
+from cache import MmapBackend, RedisBackend, RedisError
+from resp_server import RespServer
+
+
+@pytest.fixture
+def server():
+    server = RespServer().start()
+    yield server
+    server.stop()
+
+
+def test_redis_get_set(server):
+    backend = RedisBackend(server.url)
+    assert backend.get('missing') is None
+    backend.set('key', b'{"a":1}', 10)
+    assert backend.get('key') == b'{"a":1}'
+    assert (backend.hits, backend.misses) == (1, 1)
+
+
+def test_redis_set_expires(server):
+    backend = RedisBackend(server.url)
+    backend.set('key', b'value', 0.05)
+    time.sleep(0.1)
+    assert backend.get('key') is None
+
+
+def test_redis_incr_invalidates_other_instances(server):
+    writer, reader = RedisBackend(server.url), RedisBackend(server.url)
+    assert reader.get_counters(['version:planet', 'version:character']) == [0, 0]
+    writer.incr('version:planet')
+    writer.incr('version:planet')
+    assert reader.get_counters(['version:planet', 'version:character']) == [2, 0]
+    # Both processes agree on the epoch the counters belong to
+    assert reader.epoch() == writer.epoch()
+
+
+def test_redis_reconnects_after_fork(server):
+    backend = RedisBackend(server.url)
+    backend.set('key', b'parent', 10)
+    assert server.connections == 1
+
+    pid = os.fork()
+    if pid == 0:
+        # A child must not talk over the socket it inherited from its parent
+        ok = backend.get('key') == b'parent' and backend.incr('version:planet') == 1
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert server.connections == 2
+    # The parent's connection is still in step
+    assert backend.get('key') == b'parent'
+    assert backend.get_counters(['version:planet']) == [1]
+
+
+def test_redis_unreachable_falls_back(server):
+    backend = RedisBackend(server.url)
+    server.stop()
+    assert backend.get('key') is None
+    assert backend.get_counters(['version:planet']) is None
+    assert backend.incr('version:planet') is None
+
+
+def test_mmap_incr_invalidates_other_instances(tmp_path):
+    path = str(tmp_path / 'cache.mmap')
+    writer, reader = MmapBackend(path, slots=16, slot_size=4096), MmapBackend(path, slots=16, slot_size=4096)
+    writer.set('key', b'value', 10)
+    assert reader.get('key') == b'value'
+    assert reader.get_counters(['version:planet']) == [0]
+    writer.incr('version:planet')
+    assert reader.get_counters(['version:planet']) == [1]
+    assert reader.epoch() == writer.epoch()
+
+
+def test_redis_epoch_changes_after_flush(server):
+    backend = RedisBackend(server.url)
+    backend.incr('version:planet')
+    assert backend.get_counters(['version:planet']) == [1]
+    before = backend.epoch()
+
+    backend._execute('FLUSHALL')
+    backend.incr('version:planet')
+    # Version 1 again, so it must come under another epoch or ETags repeat
+    assert backend.get_counters(['version:planet']) == [1]
+    assert backend.epoch() != before
+
+
+def test_redis_epoch_evicted_before_it_is_read(server, monkeypatch):
+    backend = RedisBackend(server.url)
+    execute = server.execute
+
+    def evicting(name, *args):
+        # Someone else claims the epoch, and it is gone again before the GET
+        if name == 'SET' and b'NX' in args:
+            return None
+        return execute(name, *args)
+
+    monkeypatch.setattr(server, 'execute', evicting)
+    assert backend.get_counters(['version:planet']) is None
+    with pytest.raises(RedisError):
+        backend.epoch()
+
+
+def test_cached_response_after_flush_is_not_a_stale_304(client, server, monkeypatch):
+    import cache
+    monkeypatch.setattr(cache, 'response_cache', RedisBackend(server.url))
+    first = client.get('/planets?climate=arid')
+    etag, _ = first.get_etag()
+    assert client.get('/planets?climate=arid', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+    server.execute('FLUSHALL')
+    assert client.get('/planets?climate=arid', headers={'If-None-Match': f'"{etag}"'}).status_code == 200
+
+
+@pytest.mark.parametrize('workers, stale', [(1, True), (4, False)])
+def test_favorites_are_cached_only_when_every_worker_sees_the_writes(client, monkeypatch, workers, stale):
+    import cache
+    from sqlalchemy import insert
+    from models import db, Favorite, Planet, User
+    monkeypatch.setattr(cache, 'response_cache', cache.MemoryBackend())
+    monkeypatch.setattr(cache, 'CACHE_TTL', 300)
+    monkeypatch.setattr(cache, 'WEB_CONCURRENCY', workers)
+    db.session.execute(insert(User), [{"id": 1, "username": 'luke', "email": 'luke@example.com', "password": 'x'}])
+    db.session.execute(insert(Planet), [{"id": 1, "name": 'Tatooine'}])
+    db.session.commit()
+    assert client.get('/users/1/favorites').get_json() == []
+
+    # Another worker's write, which bumps only its own per-process counters
+    db.session.execute(insert(Favorite), [{"user_id": 1, "planet_id": 1}])
+    db.session.commit()
+    response = client.get('/users/1/favorites')
+    assert (response.get_json() == []) is stale
+    assert ('ETag' in response.headers) is stale
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    import cache
+    from types import SimpleNamespace
+    now = [1800000000.25]
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(time=lambda: now[0], monotonic=time.monotonic))
+    monkeypatch.setattr(cache, 'response_cache', cache.MemoryBackend())
+    return now
+
+
+def test_if_modified_since_waits_for_the_second_of_the_last_write(client, clock):
+    from cache import bump_version
+    from werkzeug.http import http_date
+    clock[0] += 5
+    bump_version('planet')
+    first = client.get('/planets')
+    # Another write could still come within this second under the same date
+    assert 'Last-Modified' not in first.headers
+
+    clock[0] += 0.5
+    bump_version('planet')
+    since = http_date(int(clock[0]))
+    assert client.get('/planets', headers={'If-Modified-Since': since}).status_code == 200
+
+    clock[0] += 1
+    second = client.get('/planets')
+    assert second.headers['Last-Modified'] == since
+    assert client.get('/planets', headers={'If-Modified-Since': since}).status_code == 304
+    # The ETag validates all along
+    assert client.get('/planets', headers={'If-None-Match': f'"{second.get_etag()[0]}"'}).status_code == 304
+
+    clock[0] += 0.2
+    bump_version('planet')
+    assert client.get('/planets', headers={'If-Modified-Since': since}).status_code == 200
@@ -0,0 +1,63 @@
+import gzip
+import json
+import pytest
+from sqlalchemy import event, insert
+import snapshot
+from cache import MmapBackend
+from models import db, Planet
+from snapshot import SnapshotHolder
+
+
+@pytest.fixture
+def planets(app):
+    db.session.execute(insert(Planet), [
+        {"id": i, "name": f'planet {i}', "climate": 'arid', "terrain": 'desert'} for i in range(1, 51)
+    ])
+    db.session.commit()
+
+
+@pytest.fixture
+def snapshot_mode(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'response_cache', MmapBackend(str(tmp_path / 'cache.mmap'), slots=16, slot_size=4096))
+    holder = SnapshotHolder()
+    monkeypatch.setattr(snapshot, 'catalog_snapshot', holder)
+    holder.load(app)
+
+
+def check_strong_etag_per_encoding(client, path):
+    plain = client.get(path)
+    compressed = client.get(path, headers={'Accept-Encoding': 'gzip'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    plain_etag, plain_weak = plain.get_etag()
+    compressed_etag, compressed_weak = compressed.get_etag()
+    assert not plain_weak and not compressed_weak
+    assert compressed_etag == f'{plain_etag}-gzip'
+
+    revalidated = client.get(path, headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{compressed_etag}"'})
+    assert revalidated.status_code == 304
+    # The plain body's tag does not validate the gzip one
+    changed = client.get(path, headers={'Accept-Encoding': 'gzip', 'If-None-Match': f'"{plain_etag}"'})
+    assert changed.status_code == 200
+
+
+def test_cached_responses_keep_strong_etags(client, planets):
+    check_strong_etag_per_encoding(client, '/planets?climate=arid')
+
+
+def test_snapshot_responses_keep_strong_etags(client, planets, snapshot_mode):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        client.get('/planets')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    # Answered from the snapshot
+    assert statements == []
+    check_strong_etag_per_encoding(client, '/planets')
@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import event, insert
+from models import db, User, Character, Planet, Vehicle, Favorite
+
+N = 20
+
+
+def seed_user(user_id, favorites):
+    """A user with favorites spread over characters, planets and vehicles."""
+    db.session.execute(insert(User), [{
+        "id": user_id, "username": f'user{user_id}', "email": f'user{user_id}@example.com', "password": 'x',
+    }])
+    rows = []
+    for index in range(favorites):
+        column = ('character_id', 'planet_id', 'vehicle_id')[index % 3]
+        rows.append({"user_id": user_id, column: index // 3 + 1})
+    db.session.execute(insert(Favorite), rows)
+    db.session.commit()
+
+
+@pytest.fixture
+def catalog(app):
+    size = 10 * N
+    db.session.execute(insert(Character), [{"id": i, "name": f'character {i}'} for i in range(1, size + 1)])
+    db.session.execute(insert(Planet), [{"id": i, "name": f'planet {i}'} for i in range(1, size + 1)])
+    db.session.execute(insert(Vehicle), [{"id": i, "model": f'vehicle {i}'} for i in range(1, size + 1)])
+    db.session.commit()
+    seed_user(1, N)
+    seed_user(2, 10 * N)
+
+
+def count_queries(client, path, method='get', **kwargs):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = getattr(client, method)(path, **kwargs)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return response, statements
+
+
+@pytest.mark.parametrize('path', ['/users/{}/favorites', '/users/favorites?user_id={}'])
+def test_favorites_query_count_does_not_grow(client, catalog, path):
+    small, small_queries = count_queries(client, path.format(1))
+    large, large_queries = count_queries(client, path.format(2))
+
+    assert small.status_code == 200 and large.status_code == 200
+    assert len(small.get_json()) == N
+    assert len(large.get_json()) == 10 * N
+    # The user, then the favorites with their targets' names joined in
+    assert len(small_queries) == len(large_queries) == 2
+
+
+def test_favorites_carry_target_names(client, catalog):
+    favorites = client.get('/users/1/favorites').get_json()
+    assert favorites[0]["character_name"] == 'character 1'
+    assert favorites[1]["planet_name"] == 'planet 1'
+    assert favorites[2]["vehicle_model"] == 'vehicle 1'
+
+
+@pytest.mark.parametrize('path, key, name', [
+    ('/favorite/people/50', 'character_name', 'character 50'),
+    ('/favorite/planet/50', 'planet_name', 'planet 50'),
+    ('/favorite/vehicles/50', 'vehicle_model', 'vehicle 50'),
+])
+def test_add_favorite_answers_from_the_insert(client, catalog, path, key, name):
+    response, queries = count_queries(client, path, 'post', json={"user_id": 1})
+
+    assert response.status_code == 201
+    assert response.get_json()[key] == name
+    assert len(queries) == 1 and queries[0].startswith('INSERT')
+    # The same body the favorites listing serializes
+    assert response.get_json() in client.get('/users/1/favorites').get_json()
+
+
+@pytest.mark.parametrize('user_id', [True, False, 1.0, '1.5', ' 1', '+1', '１', None, [1], {"id": 1}, 2 ** 63, -2 ** 63 - 1,
+                                     str(2 ** 63), '9' * 5000])
+@pytest.mark.parametrize('method', ['post', 'delete'])
+def test_favorite_user_id_must_be_a_64_bit_integer(client, catalog, method, user_id):
+    response = getattr(client, method)('/favorite/people/50', json={"user_id": user_id})
+    assert response.status_code == 400
+    assert response.get_json()["message"] == 'user_id must be a valid integer.'
+
+
+@pytest.mark.parametrize('user_id', [1, '1'])
+def test_favorite_user_id_as_integer_or_decimal_string(client, catalog, user_id):
+    response = client.post('/favorite/planet/50', json={"user_id": user_id})
+    assert response.status_code == 201
+    assert response.get_json()["user_id"] == 1
+
+
+@pytest.mark.parametrize('query', ['user_id=1.5', 'user_id=true', f'user_id={2 ** 63}', 'user_id=%EF%BC%91'])
+def test_current_user_favorites_rejects_invalid_ids(client, catalog, query):
+    response = client.get(f'/users/favorites?{query}')
+    assert response.status_code == 400
+    assert response.get_json()["message"] == 'user_id must be a valid integer.'
+
+
+def test_current_user_favorites_reads_a_json_body(client, catalog):
+    assert len(client.get('/users/favorites', json={"user_id": 1}).get_json()) == N
+    assert client.get('/users/favorites', json={"user_id": True}).status_code == 400
+    assert client.get('/users/favorites', json=[1]).status_code == 400
+
+
+@pytest.mark.parametrize('path', ['/users/{}/favorites', '/people/{}', '/favorite/people/{}'])
+def test_ids_past_64_bits_in_the_path_are_not_found(client, catalog, path):
+    method = client.post if path.startswith('/favorite') else client.get
+    response = method(path.format(2 ** 63), json={"user_id": 1})
+    assert response.status_code == 404
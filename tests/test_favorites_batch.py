@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import insert
+from models import db, User, Planet
+
+
+@pytest.fixture
+def user(app):
+    db.session.execute(insert(User), [{"id": 1, "username": 'luke', "email": 'luke@example.com', "password": 'x'}])
+    db.session.execute(insert(Planet), [{"id": 1, "name": 'Tatooine'}])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('body', [[{"type": 'planets', "id": 1}], 'items', 3, None])
+def test_batch_rejects_a_body_that_is_not_an_object(client, user, body):
+    response = client.post('/users/1/favorites:batch', json=body)
+    assert response.status_code == 400
+    assert 'items is required' in response.get_json()["message"]
+
+
+@pytest.mark.parametrize('body', [[1], 'user_id', 1])
+def test_single_favorite_rejects_a_body_that_is_not_an_object(client, user, body):
+    response = client.post('/favorite/planet/1', json=body)
+    assert response.status_code == 400
+    assert 'user_id is required' in response.get_json()["message"]
+
+
+def test_batch_adds_favorites(client, user):
+    response = client.post('/users/1/favorites:batch', json={"items": [{"type": 'planets', "id": 1}, {"type": 'x'}]})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.get_json()["results"]] == ['created', 'invalid']
@@ -0,0 +1,44 @@
+import sys
+import pytest
+from sqlalchemy import insert
+from filters import prefix_upper_bound
+from models import db, Character
+
+NAMES = ['Luke Skywalker', 'luminara Unduli', 'Leia Organa', 'Émile', 'Ziggy\U0010ffff']
+
+
+@pytest.fixture
+def characters(app):
+    db.session.execute(insert(Character), [{"id": i, "name": name} for i, name in enumerate(NAMES, 1)])
+    db.session.commit()
+
+
+def names(client, prefix):
+    response = client.get('/people', query_string={"name_prefix": prefix})
+    assert response.status_code == 200
+    return [row["name"] for row in response.get_json()["results"]]
+
+
+def test_prefix_ignores_ascii_case(client, characters):
+    assert names(client, 'LU') == ['Luke Skywalker', 'luminara Unduli']
+
+
+def test_non_ascii_prefix_matches_on_sqlite(client, characters):
+    # SQLite's lower() leaves É alone, the prefix has to as well
+    assert names(client, 'Émile') == ['Émile']
+
+
+@pytest.mark.parametrize('prefix', ['\U0010ffff', 'Ziggy\U0010ffff', 'a\U0010ffff\U0010ffff'])
+def test_prefix_ending_in_the_last_code_point(client, characters, prefix):
+    expected = ['Ziggy\U0010ffff'] if prefix.startswith('Ziggy') else []
+    assert names(client, prefix) == expected
+
+
+@pytest.mark.parametrize('prefix, bound', [
+    ('lu', 'lv'),
+    ('a' + chr(sys.maxunicode), 'b'),
+    (chr(sys.maxunicode) * 2, None),
+    ('x\ud7ff', 'x\ue000'),
+])
+def test_prefix_upper_bound(prefix, bound):
+    assert prefix_upper_bound(prefix) == bound
@@ -0,0 +1,124 @@
+import csv
+import json
+from sqlalchemy import func, select
+from cache import response_cache
+from loader import load_file
+from models import db, Character, Planet, Vehicle
+
+
+def write_json(path, data):
+    path.write_text(json.dumps(data), encoding='utf-8')
+    return str(path)
+
+
+def load(app, *args):
+    return app.test_cli_runner().invoke(args=['load-swapi', *args])
+
+
+def rows(model):
+    return db.session.execute(select(model).order_by(model.id)).scalars().all()
+
+
+def test_loads_json_array_with_parsed_numbers(app, tmp_path):
+    path = write_json(tmp_path / 'people.json', [
+        {"name": "Luke Skywalker", "height": "172", "mass": "77", "gender": "male"},
+        {"name": "Jabba Desilijic Tiure", "height": "175", "mass": "1,358"},
+        {"name": "Yoda", "height": "66", "mass": "unknown"},
+    ])
+    result = load(app, path)
+    assert result.exit_code == 0, result.output
+    assert '3 rows into character (3 inserted, 0 updated)' in result.output
+
+    luke, jabba, yoda = rows(Character)
+    assert (luke.name, luke.height, luke.height_num, luke.gender) == ('Luke Skywalker', '172', 172.0, 'male')
+    assert jabba.mass_num == 1358.0
+    assert yoda.mass == 'unknown' and yoda.mass_num is None
+
+
+def test_reload_upserts_on_the_natural_key(app, tmp_path):
+    first = write_json(tmp_path / 'planets.json', [
+        {"name": "Tatooine", "diameter": "10465", "population": "200000"},
+        {"name": "Hoth", "diameter": "7200"},
+    ])
+    second = write_json(tmp_path / 'planets-update.json', [
+        {"name": "Tatooine", "diameter": "10465", "population": "250000"},
+        {"name": "Dagobah", "diameter": "8900"},
+    ])
+    version = response_cache.get_counters(['version:planet'])[0]
+    assert load(app, first).exit_code == 0
+    result = load(app, second)
+    assert '2 rows into planet (1 inserted, 1 updated)' in result.output
+
+    planets = {planet.name: planet for planet in rows(Planet)}
+    assert sorted(planets) == ['Dagobah', 'Hoth', 'Tatooine']
+    assert planets['Tatooine'].population == '250000'
+    assert planets['Tatooine'].population_num == 250000.0
+    # Loading invalidates the cached planet responses
+    assert response_cache.get_counters(['version:planet'])[0] > version
+
+
+def test_last_duplicate_in_a_file_wins(app, tmp_path):
+    path = tmp_path / 'people.jsonl'
+    path.write_text(
+        '{"name": "Han Solo", "height": "180"}\n'
+        '\n'
+        '{"name": "Han Solo", "height": "181"}\n',
+        encoding='utf-8'
+    )
+    report = load_file(str(path), Character)
+    assert (report["rows"], report["inserted"], report["updated"]) == (2, 1, 0)
+    han, = rows(Character)
+    assert han.height == '181' and han.height_num == 181.0
+
+
+def test_reads_swapi_pages_and_nested_fixtures(app, tmp_path):
+    page = write_json(tmp_path / 'vehicles.json', {
+        "count": 2, "next": None,
+        "results": [
+            {"name": "Sand Crawler", "model": "Digger Crawler", "cost_in_credits": "150000", "crew": "46"},
+            # No model, falls back to the SWAPI name
+            {"name": "Snowspeeder", "vehicle_class": "airspeeder"},
+        ],
+    })
+    fixture = write_json(tmp_path / 'characters.json', [
+        {"uid": "1", "properties": {"name": "Leia Organa", "height": "150"}},
+        {"pk": 2, "model": "resources.people", "fields": {"name": "Owen Lars", "mass": "120"}},
+    ])
+    assert load(app, page, fixture).exit_code == 0
+
+    crawler, speeder = rows(Vehicle)
+    assert (crawler.model, crawler.cost_in_credits_num, crawler.crew_num) == ('Digger Crawler', 150000.0, 46.0)
+    assert (speeder.model, speeder.vehicle_class) == ('Snowspeeder', 'airspeeder')
+    leia, owen = rows(Character)
+    assert (leia.name, leia.height_num) == ('Leia Organa', 150.0)
+    assert (owen.name, owen.mass_num) == ('Owen Lars', 120.0)
+
+
+def test_reads_csv_and_skips_records_without_a_key(app, tmp_path):
+    path = tmp_path / 'dump.csv'
+    with open(path, 'w', newline='', encoding='utf-8') as stream:
+        writer = csv.writer(stream)
+        writer.writerow(['name', 'rotation_period', 'population'])
+        writer.writerow(['Naboo', '26', '4500000000'])
+        writer.writerow(['', '24', '1000'])
+    result = load(app, str(path), '--kind', 'planets', '--batch-size', '1')
+    assert result.exit_code == 0, result.output
+
+    naboo, = rows(Planet)
+    assert (naboo.rotation_period_num, naboo.population_num) == (26.0, 4500000000.0)
+
+
+def test_kind_must_be_guessable_or_given(app, tmp_path):
+    path = write_json(tmp_path / 'dump.json', [{"name": "Luke Skywalker"}])
+    result = load(app, path)
+    assert result.exit_code != 0
+    assert 'pass --kind' in result.output
+    assert db.session.scalar(select(func.count()).select_from(Character)) == 0
+
+
+def test_malformed_json_fails_without_partial_rows(app, tmp_path):
+    path = tmp_path / 'people.json'
+    path.write_text('[{"name": "Luke Skywalker"}, {"name": "Ob', encoding='utf-8')
+    result = load(app, str(path))
+    assert result.exit_code != 0
+    assert db.session.scalar(select(func.count()).select_from(Character)) == 0
@@ -0,0 +1,33 @@
+import os
+import shutil
+from metrics import MmapStore
+
+
+def test_mmap_store_sums_every_file(tmp_path):
+    store = MmapStore(str(tmp_path))
+    store.inc('requests', 1)
+    store.inc('requests', 2)
+    store.inc('bytes', 512)
+    # Another worker's file with the same counts
+    shutil.copy(tmp_path / f'metrics_{os.getpid()}.db', tmp_path / 'metrics_1.db')
+    assert store.collect() == {"requests": 6.0, "bytes": 1024.0}
+
+
+def test_reused_pid_keeps_the_earlier_workers_counts(tmp_path):
+    # A worker that died and one that later got its pid write the same file
+    earlier = MmapStore(str(tmp_path))
+    earlier.inc('requests', 3)
+    for key in range(2000):
+        earlier.inc(f'key_{key}', 1)
+
+    later = MmapStore(str(tmp_path))
+    later.inc('requests', 1)
+    later.inc('key_1999', 1)
+    later.inc('new_key', 1)
+
+    values = later.collect()
+    assert len(list(tmp_path.iterdir())) == 1
+    assert values["requests"] == 4.0
+    assert values["key_0"] == 1.0
+    assert values["key_1999"] == 2.0
+    assert values["new_key"] == 1.0
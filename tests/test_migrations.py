@@ -0,0 +1,69 @@
+import logging
+import os
+import sqlite3
+import pytest
+from app import create_app
+from models import db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'migrations')
+PREFIX_INDEXES = {
+    'character': 'ix_character_name_lower',
+    'planet': 'ix_planet_name_lower',
+    'vehicle': 'ix_vehicle_model_lower',
+}
+
+
+@pytest.fixture
+def database(monkeypatch, tmp_path):
+    path = tmp_path / 'migrations.db'
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{path}')
+    app = create_app()
+    # env.py's fileConfig() disables every logger already created
+    enabled = [logger for logger in logging.root.manager.loggerDict.values()
+               if isinstance(logger, logging.Logger) and not logger.disabled]
+    yield app, path
+    with app.app_context():
+        db.engine.dispose()
+    for logger in enabled:
+        logger.disabled = False
+
+
+def migrate(database, command, revision):
+    app, path = database
+    result = app.test_cli_runner().invoke(args=['db', command, '-d', MIGRATIONS, revision])
+    assert result.exit_code == 0, result.output
+
+
+def schema(database, kind, table=None):
+    # sqlite_master also lists the expression indexes SQLAlchemy's inspector skips
+    app, path = database
+    with sqlite3.connect(path) as connection:
+        rows = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = ? AND tbl_name = coalesce(?, tbl_name)", (kind, table)
+        )
+        return {name for name, in rows}
+
+
+def columns(database, table):
+    app, path = database
+    with sqlite3.connect(path) as connection:
+        return {row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')}
+
+
+def test_upgrade_head_downgrade_base_and_back(database):
+    migrate(database, 'upgrade', 'head')
+    assert {'user', 'character', 'planet', 'vehicle', 'favorite', 'character_search'} <= schema(database, 'table')
+
+    migrate(database, 'downgrade', 'base')
+    assert schema(database, 'table') == {'alembic_version'}
+
+    migrate(database, 'upgrade', 'head')
+    assert 'height_num' in columns(database, 'character')
+
+
+def test_dropping_shadow_columns_keeps_the_prefix_indexes(database):
+    migrate(database, 'upgrade', 'head')
+    migrate(database, 'downgrade', 'c4e9a1f7b2d5')
+    for table, index in PREFIX_INDEXES.items():
+        assert not any(name.endswith('_num') for name in columns(database, table))
+        assert index in schema(database, 'index', table)
@@ -0,0 +1,87 @@
+import base64
+import json
+import pytest
+from models import db, Character
+from utils import MAX_PAGE_SIZE, encode_cursor
+
+PEOPLE = 45
+
+
+@pytest.fixture
+def people(app):
+    # Every fifth character has no height, to walk past the NULLs too
+    db.session.add_all(Character(
+        id=i, name=f'character {i}', height=None if i % 5 == 0 else str(100 + (i * 7) % 30)
+    ) for i in range(1, PEOPLE + 1))
+    db.session.commit()
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def walk(client, path, limit):
+    pages, after = [], None
+    while True:
+        separator = '&' if '?' in path else '?'
+        url = f'{path}{separator}limit={limit}' + (f'&after={after}' if after else '')
+        response = client.get(url)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        pages.append(body["results"])
+        after = body["next"]
+        if after is None:
+            return pages
+
+
+def test_after_walks_every_row_once_in_id_order(client, people):
+    pages = walk(client, '/people', 10)
+    assert [len(page) for page in pages] == [10, 10, 10, 10, 5]
+    assert [row["id"] for page in pages for row in page] == list(range(1, PEOPLE + 1))
+
+
+def test_sorted_walk_puts_missing_values_last(client, people):
+    pages = walk(client, '/people?sort=-height', 7)
+    rows = [row for page in pages for row in page]
+    assert sorted(row["id"] for row in rows) == list(range(1, PEOPLE + 1))
+    heights = [int(row["height"]) for row in rows if row["height"] is not None]
+    assert heights == sorted(heights, reverse=True)
+    missing = [row["id"] for row in rows if row["height"] is None]
+    assert [row["id"] for row in rows[-len(missing):]] == missing == sorted(missing)
+
+
+@pytest.mark.parametrize('limit, status', [('0', 400), ('-3', 400), ('ten', 400), ('1', 200)])
+def test_limit_bounds(client, people, limit, status):
+    assert client.get(f'/people?limit={limit}').status_code == status
+
+
+def test_limit_is_capped(client, app):
+    db.session.add_all(Character(id=i, name=f'character {i}') for i in range(1, MAX_PAGE_SIZE + 11))
+    db.session.commit()
+    assert len(client.get(f'/people?limit={MAX_PAGE_SIZE * 10}').get_json()["results"]) == MAX_PAGE_SIZE
+
+
+@pytest.mark.parametrize('after', [
+    'not a cursor!',
+    raw_cursor({"id": 3}),
+    raw_cursor([]),
+    raw_cursor(['3']),
+    raw_cursor([True]),
+    raw_cursor([2 ** 63]),
+    raw_cursor([3.5]),
+])
+def test_invalid_cursor_is_a_400(client, people, after):
+    response = client.get(f'/people?after={after}')
+    assert response.status_code == 400
+    assert response.get_json()["message"] == 'Invalid pagination cursor.'
+
+
+@pytest.mark.parametrize('after', [
+    encode_cursor(3),
+    raw_cursor([True, 3]),
+    raw_cursor(['tall', 3]),
+    raw_cursor([float('nan'), 3]),
+    raw_cursor([120, True]),
+])
+def test_invalid_sorted_cursor_is_a_400(client, people, after):
+    assert client.get(f'/people?sort=-height&after={after}').status_code == 400
@@ -0,0 +1,39 @@
+import gc
+import os
+import weakref
+from sqlalchemy import create_engine
+import pool
+from pool import engine_options, setup_engine
+
+
+def file_engine(tmp_path, name='pool.db'):
+    url = f'sqlite:///{tmp_path}/{name}'
+    return create_engine(url, **engine_options(url))
+
+
+def test_forked_child_drops_the_pooled_connections(tmp_path):
+    engine = file_engine(tmp_path)
+    setup_engine(engine)
+    setup_engine(engine)
+    with engine.connect() as connection:
+        connection.exec_driver_sql('SELECT 1')
+    inherited = engine.pool
+
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if engine.pool is not inherited and engine.pool.checkedin() == 0 else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    # The parent keeps its own
+    assert engine.pool is inherited and inherited.checkedin() == 1
+
+
+def test_setup_engine_does_not_keep_the_engine_alive(tmp_path):
+    engine = file_engine(tmp_path)
+    setup_engine(engine)
+    assert engine in pool.engines
+    disposed = weakref.ref(engine)
+    engine.dispose()
+    del engine
+    gc.collect()
+    assert disposed() is None
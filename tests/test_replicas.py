@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine, insert, select
+import cache
+from app import create_app
+from cache import MemoryBackend
+from models import db, User, Planet, Favorite
+from replicas import replica_router
+
+
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    """A primary and a replica SQLite file, told apart by their planet's name."""
+    primary, replica = f'sqlite:///{tmp_path}/primary.db', f'sqlite:///{tmp_path}/replica.db'
+    for url, name in ((primary, 'Tatooine (primary)'), (replica, 'Tatooine (replica)')):
+        engine = create_engine(url)
+        db.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(insert(User), [{"id": 1, "username": 'luke', "email": 'luke@example.com', "password": 'x'}])
+            connection.execute(insert(Planet), [{"id": 1, "name": name}])
+        engine.dispose()
+
+    monkeypatch.setenv('DATABASE_URL', primary)
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', replica)
+    # Fresh counters, so no write from another test makes reads sticky
+    monkeypatch.setattr(cache, 'response_cache', MemoryBackend())
+    # No app context held open: g, and with it the replica choice, is per request
+    yield create_app().test_client(), create_engine(primary), create_engine(replica)
+    replica_router.configure(None)
+
+
+def test_reads_go_to_the_replica(databases):
+    client, _, _ = databases
+    assert client.get('/planets/1').get_json()["name"] == 'Tatooine (replica)'
+    assert client.get('/planets?climate=x').status_code == 200
+
+
+def test_writes_go_to_the_primary(databases):
+    client, primary, replica = databases
+    response = client.post('/favorite/planet/1', json={"user_id": 1})
+    assert response.status_code == 201
+
+    for engine, planet_ids in ((primary, [1]), (replica, [])):
+        with engine.connect() as connection:
+            assert connection.execute(select(Favorite.planet_id)).scalars().all() == planet_ids
+
+
+def test_reads_stay_on_the_primary_right_after_a_write(databases, monkeypatch):
+    client, _, _ = databases
+    assert client.get('/users/1/favorites').get_json() == []
+    client.post('/favorite/planet/1', json={"user_id": 1})
+
+    # Read-your-writes: the replica has not seen the favorite yet
+    favorites = client.get('/users/1/favorites').get_json()
+    assert [favorite["planet_name"] for favorite in favorites] == ['Tatooine (primary)']
+
+    # Once the sticky window is over, reads are back on the replica
+    monkeypatch.setattr(cache, 'REPLICA_STICKY_SECONDS', 0)
+    assert client.get('/users/1/favorites').get_json() == []
@@ -0,0 +1,115 @@
+import pytest
+from models import db, Character, Planet, Vehicle
+from utils import encode_cursor
+
+CLONES = 7
+
+
+@pytest.fixture
+def catalog(app):
+    db.session.add_all([
+        Planet(id=1, name='Tatooine', climate='arid', terrain='desert',
+               description='A desert world orbiting twin suns'),
+        Character(id=1, name='Luke Skywalker', gender='male', description='Farm boy raised on Tatooine'),
+        Character(id=2, name='Tatooine Jawa', description='Scavenger of the dunes'),
+        Vehicle(id=1, model='Sand Crawler', manufacturer='Corellia Mining Corporation', vehicle_class='wheeled'),
+        Vehicle(id=2, model='Clone Turbo Tank', manufacturer='Kuat Drive Yards', vehicle_class='wheeled'),
+    ])
+    db.session.add_all(Character(id=10 + i, name=f'Clone trooper {i}') for i in range(CLONES))
+    db.session.commit()
+
+
+def search(client, query):
+    response = client.get(f'/search?{query}')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def hits(body):
+    return [(result["type"], result["id"]) for result in body["results"]]
+
+
+def test_results_come_best_match_first(client, catalog):
+    body = search(client, 'q=tatooine')
+    assert sorted(hits(body)) == [('people', 1), ('people', 2), ('planets', 1)]
+    ranks = [result["rank"] for result in body["results"]]
+    assert ranks == sorted(ranks, reverse=True) and body["next"] is None
+    # A name match outranks the same word in a description
+    people = [result["id"] for result in body["results"] if result["type"] == 'people']
+    assert people == [2, 1]
+
+
+def test_every_word_matches_and_the_last_is_a_prefix(client, catalog):
+    assert hits(search(client, 'q=luke+sky')) == [('people', 1)]
+    assert hits(search(client, 'q=sky+luke')) == []
+    assert hits(search(client, 'q=crawl')) == [('vehicles', 1)]
+
+
+def test_type_filters_the_kinds_searched(client, catalog):
+    assert hits(search(client, 'q=tatooine&type=people')) == [('people', 2), ('people', 1)]
+    assert hits(search(client, 'q=tatooine&type=planets&type=vehicles')) == [('planets', 1)]
+    assert {kind for kind, _ in hits(search(client, 'q=clone'))} == {'people', 'vehicles'}
+
+    response = client.get('/search?q=tatooine&type=droids')
+    assert response.status_code == 400
+    assert 'droids' in response.get_json()["message"]
+
+
+def test_sparse_fields(client, catalog):
+    result, = search(client, 'q=crawler&fields=model')["results"]
+    assert set(result) == {'id', 'model', 'type', 'rank'}
+
+
+def test_cursor_walks_every_match_once(client, catalog):
+    everything = hits(search(client, 'q=clone&limit=100'))
+    assert len(everything) == CLONES + 1
+
+    walked, after = [], None
+    while True:
+        body = search(client, 'q=clone&limit=3' + (f'&after={after}' if after else ''))
+        assert len(body["results"]) <= 3
+        walked += hits(body)
+        after = body["next"]
+        if after is None:
+            break
+    # The clones tie on rank, kind and id break the tie
+    assert walked == everything
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    encode_cursor(3),
+    encode_cursor(1.5, 0),
+    encode_cursor('1.5', 0, 12),
+    encode_cursor(1.5, 0, 12.5),
+    encode_cursor(1.5, 0, True),
+    encode_cursor(None, 0, 12),
+])
+def test_invalid_cursor_is_a_400(client, catalog, cursor):
+    response = client.get(f'/search?q=clone&after={cursor}')
+    assert response.status_code == 400
+    assert response.get_json()["message"] == 'Invalid pagination cursor.'
+
+
+@pytest.mark.parametrize('query', ['', 'q=', 'q=+++', 'q=%21%3F', 'q=l', 'q=luke+s'])
+def test_empty_or_too_short_q_is_a_400(client, catalog, query):
+    assert client.get(f'/search?{query}').status_code == 400
+
+
+def test_orm_writes_keep_the_index_in_sync(client, catalog):
+    ahsoka = Character(id=100, name='Ahsoka Tano', description='Former Jedi')
+    db.session.add(ahsoka)
+    db.session.commit()
+    assert hits(search(client, 'q=ahsoka')) == [('people', 100)]
+
+    ahsoka.name = 'Fulcrum'
+    db.session.commit()
+    assert hits(search(client, 'q=ahsoka')) == []
+    assert hits(search(client, 'q=fulcrum')) == [('people', 100)]
+    # Columns left alone by the update stay searchable
+    assert hits(search(client, 'q=former+jedi')) == [('people', 100)]
+
+    db.session.delete(ahsoka)
+    db.session.commit()
+    assert hits(search(client, 'q=fulcrum')) == []
+    assert hits(search(client, 'q=jedi')) == []
@@ -0,0 +1,67 @@
+import pytest
+from flask import jsonify
+from sqlalchemy import event
+from models import db, Character, Planet, Vehicle
+
+# Quotes, escapes, a format character and non-ASCII, next to plain values and NULLs
+AWKWARD = 'Padmé "Amidala" 100% \\ \n \U0001f680'
+
+
+@pytest.fixture
+def catalog(app):
+    db.session.add_all([
+        Character(id=1, name=AWKWARD, height='165', mass=None, gender='female', description=AWKWARD),
+        Character(id=2, name='R2-D2', height='96', mass='32'),
+        Planet(id=1, name='Naboo', population='4,500,000,000', climate=AWKWARD),
+        Vehicle(id=1, model='Speeder', manufacturer=AWKWARD, crew='1'),
+    ])
+    db.session.commit()
+
+
+def count_statements(client, path):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return response, statements
+
+
+@pytest.mark.parametrize('compact', [True, False])
+@pytest.mark.parametrize('path, model', [('/people', Character), ('/planets', Planet), ('/vehicles', Vehicle)])
+def test_output_is_byte_for_byte_jsonify_of_serialize(app, client, catalog, compact, path, model):
+    app.json.compact = compact
+    objects = db.session.scalars(db.select(model).order_by(model.id)).all()
+    expected_page = jsonify({"next": None, "results": [item.serialize() for item in objects]}).get_data()
+    expected_one = jsonify(objects[0].serialize()).get_data()
+
+    assert client.get(path).get_data() == expected_page
+    assert client.get(f'{path}/1').get_data() == expected_one
+
+
+@pytest.mark.parametrize('path', ['/people?fields=id,name', '/people/1?fields=name,id'])
+def test_fields_are_pushed_into_the_select(client, catalog, path):
+    response, statements = count_statements(client, path)
+    assert response.status_code == 200
+    body = response.get_json()
+    for row in body.get("results", [body]):
+        assert set(row) == {"id", "name"}
+    assert not any('description' in statement for statement in statements)
+
+
+def test_fields_without_id_still_paginate(client, catalog):
+    body = client.get('/people?fields=name&limit=1').get_json()
+    assert body["results"] == [{"name": AWKWARD}]
+    assert client.get(f'/people?fields=name&limit=1&after={body["next"]}').get_json()["results"] == [{"name": 'R2-D2'}]
+
+
+@pytest.mark.parametrize('path', ['/people?fields=id,secret', '/people/1?fields=password', '/vehicles?fields=,'])
+def test_unknown_or_empty_fields_are_a_400(client, catalog, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert 'message' in response.get_json()
@@ -0,0 +1,73 @@
+from collections import deque
+import pytest
+from sqlalchemy import insert
+import slow_queries
+from app import create_app
+from models import db, User
+
+
+def recording_app(monkeypatch, threshold_ms, size=100):
+    monkeypatch.setattr(slow_queries, 'SLOW_QUERY_MS', threshold_ms)
+    monkeypatch.setattr(slow_queries, 'slow_queries', deque(maxlen=size))
+    return create_app()
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    # Every statement counts as slow
+    app = recording_app(monkeypatch, 0, size=5)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User).values(
+            id=1, username='luke', email='luke@example.com', password='hunter2', is_active=True
+        ))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_records_endpoint_duration_and_redacted_parameters(recorded):
+    report = recorded.test_client().get('/internal/slow-queries').get_json()
+    assert report["enabled"] and report["threshold_ms"] == 0
+
+    insert_entry = next(entry for entry in report["queries"] if entry["statement"].startswith('INSERT INTO user'))
+    assert insert_entry["endpoint"] is None
+    assert insert_entry["duration_ms"] >= 0
+    # SQLite binds by position, the names come from the compiled statement
+    parameters = insert_entry["parameters"]
+    assert parameters.count('[redacted]') == 3
+    assert not {'luke', 'luke@example.com', 'hunter2'} & set(parameters)
+
+
+def test_entries_carry_the_endpoint_newest_first(recorded):
+    client = recorded.test_client()
+    client.get('/users/1/favorites')
+    entries = client.get('/internal/slow-queries').get_json()["queries"]
+    assert entries[0]["endpoint"] == 'get_single_user_favorites'
+    assert entries[0]["at"] >= entries[-1]["at"]
+
+
+def test_ring_buffer_is_bounded(recorded):
+    client = recorded.test_client()
+    for _ in range(5):
+        client.get('/users/1/favorites')
+    assert len(client.get('/internal/slow-queries').get_json()["queries"]) == 5
+
+
+def test_fast_statements_are_not_recorded(monkeypatch):
+    app = recording_app(monkeypatch, 60_000)
+    with app.app_context():
+        db.create_all()
+        assert app.test_client().get('/users').status_code == 200
+        assert slow_queries.slow_query_report()["queries"] == []
+        db.drop_all()
+
+
+def test_long_values_are_cut_short():
+    assert slow_queries.redact_value('description', 'x' * 100) == 'x' * 64 + '...'
+    assert slow_queries.redact_value(None, b'\x00' * 10) == '<10 bytes>'
+
+
+def test_explain_only_reruns_postgres_reads(recorded):
+    assert not slow_queries.explainable(db.engine, 'SELECT 1')
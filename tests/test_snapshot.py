@@ -0,0 +1,92 @@
+from sqlalchemy import event, insert
+import snapshot
+from cache import MemoryBackend, MmapBackend
+from models import db, Planet
+from snapshot import SnapshotHolder
+
+
+def run_counting_queries(call, *args):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        return call(*args), statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+
+def test_snapshot_file_needs_a_shared_cache(app, tmp_path, monkeypatch):
+    holder = SnapshotHolder()
+    monkeypatch.setattr(snapshot, 'catalog_snapshot', holder)
+    monkeypatch.setattr(snapshot, 'CATALOG_SNAPSHOT', True)
+    monkeypatch.setattr(snapshot, 'CATALOG_SNAPSHOT_FILE', str(tmp_path / 'catalog.snap'))
+    monkeypatch.setattr(snapshot, 'response_cache', MemoryBackend())
+
+    snapshot.setup_snapshot(app)
+    assert not holder.enabled
+    assert not (tmp_path / 'catalog.snap').exists()
+
+
+def test_memory_snapshot_needs_a_shared_cache_with_several_workers(app, monkeypatch, caplog):
+    holder = SnapshotHolder()
+    monkeypatch.setattr(snapshot, 'catalog_snapshot', holder)
+    monkeypatch.setattr(snapshot, 'CATALOG_SNAPSHOT', True)
+    monkeypatch.setattr(snapshot, 'WEB_CONCURRENCY', 4)
+    monkeypatch.setattr(snapshot, 'response_cache', MemoryBackend())
+
+    snapshot.setup_snapshot(app)
+    assert not holder.enabled
+    assert 'CATALOG_SNAPSHOT with 4 workers' in caplog.text
+
+
+def test_memory_snapshot_serves_one_worker_or_a_shared_cache(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'CATALOG_SNAPSHOT', True)
+    for workers, backend in ((1, MemoryBackend()),
+                             (4, MmapBackend(str(tmp_path / 'cache.mmap'), slots=16, slot_size=4096))):
+        holder = SnapshotHolder()
+        monkeypatch.setattr(snapshot, 'catalog_snapshot', holder)
+        monkeypatch.setattr(snapshot, 'WEB_CONCURRENCY', workers)
+        monkeypatch.setattr(snapshot, 'response_cache', backend)
+        snapshot.setup_snapshot(app)
+        assert holder.enabled
+
+
+def test_snapshot_file_serves_with_a_shared_cache(app, client, tmp_path, monkeypatch):
+    db.session.execute(insert(Planet), [{"id": 1, "name": 'Tatooine'}])
+    db.session.commit()
+    holder = SnapshotHolder()
+    monkeypatch.setattr(snapshot, 'catalog_snapshot', holder)
+    monkeypatch.setattr(snapshot, 'CATALOG_SNAPSHOT', True)
+    monkeypatch.setattr(snapshot, 'CATALOG_SNAPSHOT_FILE', str(tmp_path / 'catalog.snap'))
+    monkeypatch.setattr(snapshot, 'response_cache', MmapBackend(str(tmp_path / 'cache.mmap'), slots=16, slot_size=4096))
+
+    snapshot.setup_snapshot(app)
+    assert holder.enabled and holder.fresh() is not None
+    response, statements = run_counting_queries(client.get, '/planets/1')
+    assert response.get_json()["name"] == 'Tatooine'
+    # Answered from the file
+    assert statements == []
+
+
+def test_unreachable_cache_does_not_loop_rebuilds(app, monkeypatch):
+    holder = SnapshotHolder()
+    holder.load(app)
+    assert holder.fresh() is not None
+    started = []
+    monkeypatch.setattr(holder, '_start_rebuild', lambda: started.append(True))
+    monkeypatch.setattr(snapshot, 'current_versions', lambda: None)
+
+    assert holder.fresh() is None
+    assert holder.fresh() is None
+    assert started == []
+    assert holder._failed_at > 0
+
+
+def test_snapshot_is_not_built_without_versions(app, monkeypatch):
+    monkeypatch.setattr(snapshot, 'current_versions', lambda: None)
+    holder = SnapshotHolder()
+    holder.load(app)
+    assert holder.enabled and holder.snapshot is None
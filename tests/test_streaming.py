@@ -0,0 +1,50 @@
+import json
+import pytest
+import serializers
+from models import db, Character
+
+PEOPLE = 23
+
+
+@pytest.fixture
+def people(app, monkeypatch):
+    # Several server side batches for a handful of rows
+    monkeypatch.setattr(serializers, 'STREAM_BATCH_SIZE', 5)
+    db.session.add_all(Character(
+        id=i, name=f'character {i}', gender='female' if i % 2 else 'male',
+        height=None if i % 4 == 0 else str(150 + i % 7), description='x' * 50,
+    ) for i in range(1, PEOPLE + 1))
+    db.session.commit()
+
+
+def rows(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.mark.parametrize('path, headers', [
+    ('/people?stream=1', {}),
+    ('/people', {"Accept": 'application/x-ndjson'}),
+])
+def test_stream_sends_every_row_as_a_line(client, people, path, headers):
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    streamed = rows(response)
+    assert [row["id"] for row in streamed] == list(range(1, PEOPLE + 1))
+    assert streamed[0] == db.session.get(Character, 1).serialize()
+
+
+def test_stream_applies_filters_sort_and_fields(client, people):
+    streamed = rows(client.get('/people?stream=1&gender=female&sort=-height&fields=id,height'))
+    assert all(set(row) == {"id", "height"} for row in streamed)
+    assert sorted(row["id"] for row in streamed) == [i for i in range(1, PEOPLE + 1) if i % 2]
+    heights = [row["height"] for row in streamed]
+    present = [height for height in heights if height is not None]
+    assert present == sorted(present, reverse=True)
+    # Rows without a height come last
+    assert heights[len(present):] == [None] * (len(heights) - len(present))
+
+
+def test_stream_ignores_pagination(client, people):
+    assert len(rows(client.get('/people?stream=1&limit=2'))) == PEOPLE